@@ -1,14 +1,36 @@
 # -*- coding: utf-8 -*-
 import json
 import time
+import hashlib
 import logging
+from datetime import timezone
 from functools import wraps
 
 from odoo import http
 from odoo.http import request, Response
 
+from ..models.student_api_mixin import ApiPasswordBusy
+from .rate_limit import check_rate_limit
+
 _logger = logging.getLogger(__name__)
 
+API_VERSION = '1.0.0'
+
+# Sous-requêtes autorisées dans /api/v1/batch (lecture seule): chemin -> handler
+BATCH_HANDLERS = {
+    '/me': '_api_profile',
+    '/notes': '_api_notes',
+    '/notes/summary': '_api_notes_summary',
+    '/absences': '_api_absences',
+    '/absences/summary': '_api_absences_summary',
+    '/emploi-temps': '_api_emploi_temps',
+    '/inscriptions': '_api_inscriptions',
+    '/stages': '_api_stages',
+    '/annees': '_api_annees',
+    '/modules': '_api_modules',
+}
+BATCH_MAX_REQUESTS = 10
+
 
 def json_response(data, status=200):
     """Helper pour créer une réponse JSON"""
@@ -30,6 +52,82 @@ def api_error(message, status=400, code=None):
     }, status=status)
 
 
+def get_pagination_params(params):
+    """
+    Lit les paramètres de pagination communs: after, limit, fields.
+    Lève ValueError si limit n'est pas un entier positif.
+    """
+    limit = params.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or int(limit) <= 0:
+            raise ValueError("limit doit être un entier positif")
+        limit = int(limit)
+    fields = params.get('fields')
+    return {
+        'after': params.get('after') or None,
+        'limit': limit,
+        'fields': [f.strip() for f in fields.split(',') if f.strip()] if fields else None,
+    }
+
+
+def page_response(page):
+    """Réponse JSON d'une page de résultats"""
+    return json_response({
+        'success': True,
+        'data': page['data'],
+        'count': len(page['data']),
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+    })
+
+
+def conditional_response(version, build):
+    """
+    Réponse conditionnelle (ETag / Last-Modified).
+
+    `version` est le couple (nombre, dernière modification) des données
+    demandées. Si le client présente l'ETag courant dans If-None-Match, une
+    réponse 304 est renvoyée sans appeler `build`, qui construit la réponse
+    complète. If-Modified-Since seul n'est pas pris en compte: une
+    suppression ne change pas la date de dernière modification.
+    """
+    if getattr(request, 'api_batch', False):
+        # Sous-requête d'un /batch: pas de validation conditionnelle
+        return build()
+
+    count, last_modified = version
+    student = getattr(request, 'student', None)
+    httprequest = request.httprequest
+
+    etag = hashlib.sha1('|'.join([
+        API_VERSION,
+        str(student.id if student else ''),
+        httprequest.full_path,
+        str(count),
+        str(last_modified),
+    ]).encode()).hexdigest()
+
+    if httprequest.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = build()
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def password_busy_error():
+    """Réponse 503 quand la file de vérification des mots de passe est pleine"""
+    response = api_error('Service surchargé, réessayez plus tard', 503, 'BUSY')
+    response.headers['Retry-After'] = '5'
+    return response
+
+
 def require_api_key(func):
     """Décorateur pour vérifier la clé API"""
     @wraps(func)
@@ -39,9 +137,7 @@ def require_api_key(func):
         if not api_key:
             return api_error('Clé API manquante', 401, 'MISSING_API_KEY')
         
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        
-        if api_key != config.api_key:
+        if not request.env['ensiasd.api.config'].sudo().check_api_key(api_key):
             return api_error('Clé API invalide', 401, 'INVALID_API_KEY')
         
         return func(*args, **kwargs)
@@ -71,6 +167,72 @@ def require_token(func):
     return wrapper
 
 
+def rate_limit(endpoint, method='GET', cost=None):
+    """
+    Décorateur de limitation du débit (réponse 429 avec Retry-After).
+
+    Un seul compteur est vérifié: par étudiant authentifié (limite
+    max_requests_per_minute), ou à défaut par client (clé API + IP, limite
+    max_requests_per_minute_client) pour les routes sans token comme
+    /auth/login et /info. À placer après require_token.
+
+    `cost`, si donné, retourne le nombre de requêtes comptées pour la
+    requête courante (1 par défaut), par exemple une par sous-requête d'un
+    /batch.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            config = request.env['ensiasd.api.config'].sudo().get_config_values()
+            dbname = request.env.cr.dbname
+            ip_address = request.httprequest.remote_addr
+            student = getattr(request, 'student', None)
+            hits = cost() if cost else 1
+
+            # Les étudiants authentifiés derrière une même IP (NAT, proxy,
+            # frontal) ne partagent pas le budget du client
+            if student:
+                checks = [(f"student:{student.id}", config['max_requests_per_minute'])]
+            else:
+                checks = [(
+                    f"client:{config['id']}:{ip_address}",
+                    config['max_requests_per_minute_client'],
+                )]
+
+            for key, limit in checks:
+                retry_after = check_rate_limit(dbname, key, limit, config['rate_limit_backend'], hits)
+                if retry_after:
+                    request.env['ensiasd.api.log'].sudo().log_request(
+                        endpoint=endpoint,
+                        method=method,
+                        student_id=student.id if student else None,
+                        ip_address=ip_address,
+                        response_code=429,
+                        status='rate_limited',
+                        error_message=f'Limite atteinte ({key})'
+                    )
+                    response = api_error('Trop de requêtes', 429, 'RATE_LIMITED')
+                    response.headers['Retry-After'] = str(retry_after)
+                    response.headers['X-RateLimit-Limit'] = str(limit)
+                    return response
+
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _batch_cost():
+    """Nombre de sous-requêtes d'un /batch (au moins 1, au plus BATCH_MAX_REQUESTS)"""
+    try:
+        data = json.loads(request.httprequest.data.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return 1
+    sub_requests = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(sub_requests, list):
+        return 1
+    return max(1, min(len(sub_requests), BATCH_MAX_REQUESTS))
+
+
 def log_request(endpoint, method='GET'):
     """Décorateur pour logger les requêtes"""
     def decorator(func):
@@ -130,24 +292,25 @@ class EnsiasdApiController(http.Controller):
         return json_response({
             'status': 'ok',
             'service': 'ENSIASD API',
-            'version': '1.0.0'
+            'version': API_VERSION
         })
 
     @http.route('/api/v1/info', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
+    @rate_limit('/info', 'GET')
     def api_info(self):
         """Informations sur l'API"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
         return json_response({
             'success': True,
             'data': {
                 'name': 'ENSIASD Student API',
-                'version': '1.0.0',
+                'version': API_VERSION,
                 'features': {
-                    'notes': config.enable_notes,
-                    'absences': config.enable_absences,
-                    'emploi_temps': config.enable_emploi_temps,
-                    'stages': config.enable_stages,
+                    'notes': config['enable_notes'],
+                    'absences': config['enable_absences'],
+                    'emploi_temps': config['enable_emploi_temps'],
+                    'stages': config['enable_stages'],
                 }
             }
         })
@@ -156,6 +319,7 @@ class EnsiasdApiController(http.Controller):
 
     @http.route('/api/v1/auth/login', type='http', auth='none', methods=['POST'], csrf=False)
     @require_api_key
+    @rate_limit('/auth/login', 'POST')
     @log_request('/auth/login', 'POST')
     def login(self):
         """Authentification d'un étudiant"""
@@ -170,7 +334,10 @@ class EnsiasdApiController(http.Controller):
         if not cne or not password:
             return api_error('CNE et mot de passe requis', 400, 'MISSING_CREDENTIALS')
         
-        student = request.env['ensiasd.student'].sudo().authenticate_api(cne, password)
+        try:
+            student = request.env['ensiasd.student'].sudo().authenticate_api(cne, password)
+        except ApiPasswordBusy:
+            return password_busy_error()
         
         if not student:
             request.env['ensiasd.api.log'].sudo().log_request(
@@ -201,6 +368,7 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/auth/logout', type='http', auth='none', methods=['POST'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/auth/logout', 'POST')
     @log_request('/auth/logout', 'POST')
     def logout(self):
         """Déconnexion - révoque le token"""
@@ -224,6 +392,7 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/auth/refresh', type='http', auth='none', methods=['POST'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/auth/refresh', 'POST')
     @log_request('/auth/refresh', 'POST')
     def refresh_token(self):
         """Rafraîchit le token"""
@@ -248,9 +417,13 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/me', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/me', 'GET')
     @log_request('/me', 'GET')
     def get_profile(self):
         """Récupère le profil de l'étudiant connecté"""
+        return self._api_profile(request.params)
+
+    def _api_profile(self, params):
         student = request.student
         return json_response({
             'success': True,
@@ -260,6 +433,7 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/me/password', type='http', auth='none', methods=['PUT'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/me/password', 'PUT')
     @log_request('/me/password', 'PUT')
     def change_password(self):
         """Change le mot de passe API de l'étudiant"""
@@ -279,8 +453,11 @@ class EnsiasdApiController(http.Controller):
         
         student = request.student.sudo()
         
-        if not student.check_api_password(old_password):
-            return api_error('Ancien mot de passe incorrect', 400)
+        try:
+            if not student.check_api_password(old_password):
+                return api_error('Ancien mot de passe incorrect', 400)
+        except ApiPasswordBusy:
+            return password_busy_error()
         
         student.set_api_password(new_password)
         
@@ -294,175 +471,194 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/notes', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/notes', 'GET')
     @log_request('/notes', 'GET')
     def get_notes(self):
         """Récupère les notes de l'étudiant"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_notes:
+        return self._api_notes(request.params)
+
+    def _api_notes(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_notes']:
             return api_error('API Notes désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
         
         # Paramètres optionnels
-        annee_id = request.params.get('annee_id')
-        module_id = request.params.get('module_id')
+        annee_id = params.get('annee_id')
+        module_id = params.get('module_id')
         
         if annee_id:
             annee_id = int(annee_id)
         if module_id:
             module_id = int(module_id)
         
-        notes = student.get_notes_api(annee_id=annee_id, module_id=module_id)
+        def build():
+            try:
+                page = student.get_notes_page_api(
+                    annee_id=annee_id,
+                    module_id=module_id,
+                    **get_pagination_params(params)
+                )
+            except ValueError as e:
+                return api_error(str(e), 400, 'INVALID_PARAMS')
+            return page_response(page)
         
-        return json_response({
-            'success': True,
-            'data': notes,
-            'count': len(notes)
-        })
+        return conditional_response(
+            student.get_notes_api_version(annee_id=annee_id, module_id=module_id),
+            build
+        )
 
     @http.route('/api/v1/notes/summary', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/notes/summary', 'GET')
     @log_request('/notes/summary', 'GET')
     def get_notes_summary(self):
         """Récupère un résumé des notes (moyennes par module)"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_notes:
+        return self._api_notes_summary(request.params)
+
+    def _api_notes_summary(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_notes']:
             return api_error('API Notes désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
-        annee_id = request.params.get('annee_id')
-        
-        notes = student.get_notes_api(annee_id=int(annee_id) if annee_id else None)
-        
-        # Calculer les moyennes par module
-        modules = {}
-        for note in notes:
-            if note['module']:
-                mod_id = note['module']['id']
-                if mod_id not in modules:
-                    modules[mod_id] = {
-                        'module': note['module'],
-                        'notes': [],
-                        'total_coef': 0,
-                        'total_weighted': 0
-                    }
-                modules[mod_id]['notes'].append(note)
-                modules[mod_id]['total_coef'] += note['coefficient']
-                modules[mod_id]['total_weighted'] += note['valeur'] * note['coefficient']
-        
-        summary = []
-        for mod_id, data in modules.items():
-            moyenne = data['total_weighted'] / data['total_coef'] if data['total_coef'] > 0 else 0
-            summary.append({
-                'module': data['module'],
-                'moyenne': round(moyenne, 2),
-                'nb_notes': len(data['notes']),
-                'notes': data['notes']
+        annee_id = params.get('annee_id')
+        annee_id = int(annee_id) if annee_id else None
+        
+        version = student.get_notes_api_version(annee_id=annee_id)
+        return conditional_response(
+            version,
+            lambda: json_response({
+                'success': True,
+                'data': student.get_notes_summary_api(annee_id=annee_id, version=version)
             })
-        
-        return json_response({
-            'success': True,
-            'data': summary
-        })
+        )
 
     # ========== ABSENCES ==========
 
     @http.route('/api/v1/absences', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/absences', 'GET')
     @log_request('/absences', 'GET')
     def get_absences(self):
         """Récupère les absences de l'étudiant"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_absences:
+        return self._api_absences(request.params)
+
+    def _api_absences(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_absences']:
             return api_error('API Absences désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
         
         # Paramètres optionnels
-        annee_id = request.params.get('annee_id')
-        date_from = request.params.get('date_from')
-        date_to = request.params.get('date_to')
+        annee_id = params.get('annee_id')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         
         if annee_id:
             annee_id = int(annee_id)
         
-        absences = student.get_absences_api(
-            annee_id=annee_id,
-            date_from=date_from,
-            date_to=date_to
+        def build():
+            try:
+                page = student.get_absences_page_api(
+                    annee_id=annee_id,
+                    date_from=date_from,
+                    date_to=date_to,
+                    **get_pagination_params(params)
+                )
+            except ValueError as e:
+                return api_error(str(e), 400, 'INVALID_PARAMS')
+            return page_response(page)
+        
+        return conditional_response(
+            student.get_absences_api_version(
+                annee_id=annee_id,
+                date_from=date_from,
+                date_to=date_to
+            ),
+            build
         )
-        
-        return json_response({
-            'success': True,
-            'data': absences,
-            'count': len(absences)
-        })
 
     @http.route('/api/v1/absences/summary', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/absences/summary', 'GET')
     @log_request('/absences/summary', 'GET')
     def get_absences_summary(self):
         """Récupère un résumé des absences"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_absences:
+        return self._api_absences_summary(request.params)
+
+    def _api_absences_summary(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_absences']:
             return api_error('API Absences désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
-        absences = student.get_absences_api()
-        
-        total = len(absences)
-        justifiees = sum(1 for a in absences if a.get('justifiee'))
-        non_justifiees = total - justifiees
-        
-        return json_response({
-            'success': True,
-            'data': {
-                'total': total,
-                'justifiees': justifiees,
-                'non_justifiees': non_justifiees
-            }
-        })
+        return conditional_response(
+            student.get_absences_api_version(),
+            lambda: json_response({
+                'success': True,
+                'data': student.get_absences_summary_api()
+            })
+        )
 
     # ========== EMPLOI DU TEMPS ==========
 
     @http.route('/api/v1/emploi-temps', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/emploi-temps', 'GET')
     @log_request('/emploi-temps', 'GET')
     def get_emploi_temps(self):
         """Récupère l'emploi du temps de l'étudiant"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_emploi_temps:
+        return self._api_emploi_temps(request.params)
+
+    def _api_emploi_temps(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_emploi_temps']:
             return api_error('API Emploi du temps désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
         
         # Paramètres optionnels
-        date_from = request.params.get('date_from')
-        date_to = request.params.get('date_to')
+        date_from = params.get('date_from')
+        date_to = params.get('date_to')
         
-        seances = student.get_emploi_temps_api(date_from=date_from, date_to=date_to)
+        def build():
+            try:
+                page = student.get_emploi_temps_page_api(
+                    date_from=date_from,
+                    date_to=date_to,
+                    **get_pagination_params(params)
+                )
+            except ValueError as e:
+                return api_error(str(e), 400, 'INVALID_PARAMS')
+            return page_response(page)
         
-        return json_response({
-            'success': True,
-            'data': seances,
-            'count': len(seances)
-        })
+        return conditional_response(
+            student.get_emploi_temps_api_version(date_from=date_from, date_to=date_to),
+            build
+        )
 
     # ========== INSCRIPTIONS ==========
 
     @http.route('/api/v1/inscriptions', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/inscriptions', 'GET')
     @log_request('/inscriptions', 'GET')
     def get_inscriptions(self):
         """Récupère les inscriptions aux modules"""
+        return self._api_inscriptions(request.params)
+
+    def _api_inscriptions(self, params):
         student = request.student.sudo()
         
-        annee_id = request.params.get('annee_id')
+        annee_id = params.get('annee_id')
         if annee_id:
             annee_id = int(annee_id)
         
@@ -479,11 +675,15 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/stages', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/stages', 'GET')
     @log_request('/stages', 'GET')
     def get_stages(self):
         """Récupère les stages de l'étudiant"""
-        config = request.env['ensiasd.api.config'].sudo().get_config()
-        if not config.enable_stages:
+        return self._api_stages(request.params)
+
+    def _api_stages(self, params):
+        config = request.env['ensiasd.api.config'].sudo().get_config_values()
+        if not config['enable_stages']:
             return api_error('API Stages désactivée', 403, 'FEATURE_DISABLED')
         
         student = request.student.sudo()
@@ -500,9 +700,13 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/annees', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/annees', 'GET')
     @log_request('/annees', 'GET')
     def get_annees(self):
         """Liste des années universitaires"""
+        return self._api_annees(request.params)
+
+    def _api_annees(self, params):
         annees = request.env['ensiasd.annee'].sudo().search([])
         
         data = [{
@@ -521,9 +725,13 @@ class EnsiasdApiController(http.Controller):
     @http.route('/api/v1/modules', type='http', auth='none', methods=['GET'], csrf=False)
     @require_api_key
     @require_token
+    @rate_limit('/modules', 'GET')
     @log_request('/modules', 'GET')
     def get_modules(self):
         """Liste des modules disponibles"""
+        return self._api_modules(request.params)
+
+    def _api_modules(self, params):
         student = request.student.sudo()
         
         # Récupérer les modules via les inscriptions
@@ -534,3 +742,73 @@ class EnsiasdApiController(http.Controller):
             'success': True,
             'data': modules
         })
+
+    # ========== BATCH ==========
+
+    @http.route('/api/v1/batch', type='http', auth='none', methods=['POST'], csrf=False)
+    @require_api_key
+    @require_token
+    @rate_limit('/batch', 'POST', cost=_batch_cost)
+    @log_request('/batch', 'POST')
+    def batch(self):
+        """
+        Exécute plusieurs lectures en un seul aller-retour.
+
+        Corps: {"requests": [{"id": "profil", "path": "/me"},
+                             {"path": "/notes/summary", "params": {"annee_id": 3}}]}
+
+        L'authentification et le log sont faits une seule fois; la limitation
+        compte une requête par sous-requête. Les sous-requêtes partagent le
+        même environnement (et donc les mêmes caches ORM), chacune dans son
+        propre savepoint: une erreur SQL n'interrompt pas les suivantes.
+        Chaque résultat porte son propre statut.
+        """
+        try:
+            data = json.loads(request.httprequest.data.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return api_error('JSON invalide', 400, 'INVALID_JSON')
+        
+        sub_requests = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return api_error('Liste "requests" requise', 400, 'INVALID_PARAMS')
+        if len(sub_requests) > BATCH_MAX_REQUESTS:
+            return api_error(
+                f'Au plus {BATCH_MAX_REQUESTS} sous-requêtes par batch', 400, 'INVALID_PARAMS')
+        
+        request.api_batch = True
+        results = []
+        for index, sub in enumerate(sub_requests):
+            sub = sub if isinstance(sub, dict) else {}
+            path = sub.get('path')
+            result = {'id': sub.get('id', index), 'path': path}
+            params = sub.get('params') or {}
+            
+            handler = BATCH_HANDLERS.get(path)
+            if not handler:
+                result.update(status=404, body={
+                    'success': False,
+                    'error': {'message': 'Chemin non autorisé en batch', 'code': 'NOT_FOUND'}
+                })
+            elif not isinstance(params, dict):
+                result.update(status=400, body={
+                    'success': False,
+                    'error': {'message': 'params doit être un objet', 'code': 'INVALID_PARAMS'}
+                })
+            else:
+                params = {key: str(value) for key, value in params.items() if value is not None}
+                try:
+                    with request.env.cr.savepoint():
+                        response = getattr(self, handler)(params)
+                    result.update(status=response.status_code, body=json.loads(response.get_data()))
+                except Exception:
+                    _logger.exception("API Error: /batch %s", path)
+                    result.update(status=500, body={
+                        'success': False,
+                        'error': {'message': 'Erreur interne du serveur', 'code': 'INTERNAL_ERROR'}
+                    })
+            results.append(result)
+        
+        return json_response({
+            'success': True,
+            'data': results
+        })
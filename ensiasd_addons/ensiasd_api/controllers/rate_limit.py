@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Limitation du débit de l'API (fenêtre glissante approximée).
+
+Chaque clé (étudiant, client) dispose d'un compteur par fenêtre d'une
+minute. Le débit estimé est la somme des requêtes de la fenêtre courante et
+de la part encore « visible » de la fenêtre précédente:
+
+    estimation = précédente * (1 - écoulé / 60) + courante
+
+Les backends sont interchangeables via RATE_LIMIT_BACKENDS:
+- memory: compteurs dans la mémoire du worker (une limite par worker)
+- database: table UNLOGGED partagée par tous les workers; chaque worker
+  cumule ses requêtes en mémoire et les écrit par lots (au plus une
+  écriture toutes les DB_SYNC_INTERVAL secondes, ou après DB_SYNC_BATCH
+  requêtes d'une même clé), en relisant au passage les totaux partagés
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+
+# Probabilité de purger les anciennes fenêtres à chaque appel (backend database)
+CLEANUP_PROBABILITY = 0.01
+
+# Backend database: délai maximal entre deux écritures des compteurs d'un
+# worker, et nombre de requêtes d'une clé déclenchant une écriture anticipée
+DB_SYNC_INTERVAL = 2
+DB_SYNC_BATCH = 10
+
+
+class MemoryRateLimitBackend:
+    """Compteurs en mémoire, propres à chaque worker"""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def hit(self, dbname, key, window, hits=1):
+        """Ajoute `hits` à la fenêtre courante et retourne (précédente, courante)"""
+        with self._lock:
+            current = self._counters.get((dbname, key, window), 0) + hits
+            self._counters[(dbname, key, window)] = current
+            previous = self._counters.get((dbname, key, window - 1), 0)
+            if random.random() < CLEANUP_PROBABILITY:
+                for counter_key in [k for k in self._counters if k[2] < window - 1]:
+                    del self._counters[counter_key]
+        return previous, current
+
+
+class DatabaseRateLimitBackend:
+    """
+    Compteurs dans la table ensiasd_api_rate_limit, partagés entre workers.
+
+    Les requêtes sont d'abord comptées en mémoire; les compteurs en attente
+    du worker sont écrits par un seul upsert, dans un curseur séparé validé
+    immédiatement, qui relit aussi les totaux de tous les workers. Entre deux
+    écritures, l'estimation est le dernier total lu plus les requêtes en
+    attente du worker: les requêtes des autres workers sont vues avec au plus
+    DB_SYNC_INTERVAL secondes de retard.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._shared = {}
+        self._last_sync = {}
+        self._lock = threading.Lock()
+
+    def hit(self, dbname, key, window, hits=1):
+        counter = (dbname, key, window)
+        with self._lock:
+            self._pending[counter] = self._pending.get(counter, 0) + hits
+            sync_due = (
+                self._pending[counter] >= DB_SYNC_BATCH
+                or time.monotonic() - self._last_sync.get(dbname, 0) >= DB_SYNC_INTERVAL
+            )
+        if sync_due:
+            self._sync(dbname, window)
+
+        previous_counter = (dbname, key, window - 1)
+        with self._lock:
+            current = self._shared.get(counter, 0) + self._pending.get(counter, 0)
+            previous = self._shared.get(previous_counter, 0) + self._pending.get(previous_counter, 0)
+        return previous, current
+
+    def _sync(self, dbname, window):
+        """Écrit les compteurs en attente du worker et relit les totaux partagés"""
+        with self._lock:
+            pending = {
+                counter: hits for counter, hits in self._pending.items()
+                if counter[0] == dbname
+            }
+            for counter in pending:
+                del self._pending[counter]
+            self._last_sync[dbname] = time.monotonic()
+        if not pending:
+            return
+
+        keys = tuple({key for (_db, key, _window) in pending})
+        try:
+            with Registry(dbname).cursor() as cr:
+                values = ', '.join(['(%s, %s, %s)'] * len(pending))
+                params = [
+                    item
+                    for (_db, key, counter_window), hits in pending.items()
+                    for item in (key, counter_window, hits)
+                ]
+                cr.execute(
+                    "INSERT INTO ensiasd_api_rate_limit (key, window_start, hits) "
+                    "VALUES " + values + " "
+                    "ON CONFLICT (key, window_start) "
+                    "DO UPDATE SET hits = ensiasd_api_rate_limit.hits + EXCLUDED.hits",
+                    params
+                )
+                cr.execute(
+                    "SELECT key, window_start, hits FROM ensiasd_api_rate_limit "
+                    "WHERE key IN %s AND window_start >= %s",
+                    (keys, window - 1)
+                )
+                totals = cr.fetchall()
+                if random.random() < CLEANUP_PROBABILITY:
+                    cr.execute(
+                        "DELETE FROM ensiasd_api_rate_limit WHERE window_start < %s",
+                        (window - 1,)
+                    )
+        except Exception:
+            # Conserver les requêtes non écrites pour la prochaine tentative
+            with self._lock:
+                for counter, hits in pending.items():
+                    self._pending[counter] = self._pending.get(counter, 0) + hits
+            raise
+
+        with self._lock:
+            for key, counter_window, hits in totals:
+                self._shared[(dbname, key, counter_window)] = hits
+            for counter in [c for c in self._shared if c[0] == dbname and c[2] < window - 1]:
+                del self._shared[counter]
+
+
+RATE_LIMIT_BACKENDS = {
+    'memory': MemoryRateLimitBackend(),
+    'database': DatabaseRateLimitBackend(),
+}
+
+
+def check_rate_limit(dbname, key, limit, backend='database', hits=1):
+    """
+    Comptabilise `hits` requêtes pour `key` et vérifie la limite par minute.
+
+    Retourne 0 si la requête est autorisée, sinon le nombre de secondes à
+    attendre (valeur de l'en-tête Retry-After). Une limite <= 0 désactive le
+    contrôle. En cas d'erreur du backend, la requête est autorisée.
+    """
+    if not limit or limit <= 0:
+        return 0
+
+    now = time.time()
+    window = int(now // WINDOW_SECONDS)
+    elapsed = (now % WINDOW_SECONDS) / WINDOW_SECONDS
+
+    try:
+        previous, current = RATE_LIMIT_BACKENDS[backend].hit(dbname, key, window, hits)
+    except Exception:
+        _logger.exception("Rate limiter indisponible (backend %s)", backend)
+        return 0
+
+    estimated = previous * (1 - elapsed) + current
+    if estimated <= limit:
+        return 0
+
+    # Attendre que la fenêtre précédente ne pèse plus assez
+    if current > limit:
+        wait = WINDOW_SECONDS - now % WINDOW_SECONDS
+    else:
+        excess = estimated - limit
+        wait = excess / previous * WINDOW_SECONDS if previous else 1
+    return max(1, math.ceil(wait))
@@ -3,3 +3,4 @@ from . import api_config
 from . import api_token
 from . import api_log
 from . import student_api_mixin
+from . import note_extend
@@ -1,6 +1,23 @@
 # -*- coding: utf-8 -*-
+import hmac
 import secrets
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+
+# Champs recopiés dans l'instantané mis en cache par worker
+CACHED_CONFIG_FIELDS = (
+    'api_key',
+    'token_expiry_hours',
+    'max_requests_per_minute',
+    'max_requests_per_minute_client',
+    'rate_limit_backend',
+    'password_kdf_rounds',
+    'enable_notes',
+    'enable_absences',
+    'enable_emploi_temps',
+    'enable_stages',
+    'enable_logging',
+    'log_retention_days',
+)
 
 
 class EnsiasdApiConfig(models.Model):
@@ -26,6 +43,22 @@ class EnsiasdApiConfig(models.Model):
         default=60,
         help="Limite de requêtes par minute par utilisateur"
     )
+    max_requests_per_minute_client = fields.Integer(
+        string='Requêtes max/minute par client',
+        default=120,
+        help="Limite de requêtes par minute par clé API et adresse IP des routes "
+             "sans token, comme la connexion et /info (0 = illimité)"
+    )
+    rate_limit_backend = fields.Selection([
+        ('database', 'Base de données (partagé entre workers)'),
+        ('memory', 'Mémoire (par worker)'),
+    ], string='Stockage des compteurs', default='database', required=True)
+    password_kdf_rounds = fields.Integer(
+        string='Itérations PBKDF2 (mots de passe)',
+        default=210000,
+        help="Coût du hachage des mots de passe API. Les hachages existants "
+             "sont mis à niveau à la prochaine connexion réussie."
+    )
     
     # Fonctionnalités activées
     enable_notes = fields.Boolean(string='API Notes', default=True)
@@ -43,6 +76,17 @@ class EnsiasdApiConfig(models.Model):
     
     active = fields.Boolean(default=True)
 
+    def init(self):
+        """Table des compteurs du rate limiter (non journalisée)"""
+        self.env.cr.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS ensiasd_api_rate_limit (
+                key VARCHAR NOT NULL,
+                window_start BIGINT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (key, window_start)
+            )
+        """)
+
     @api.model_create_multi
     def create(self, vals_list):
         """Génère automatiquement les clés API à la création"""
@@ -51,7 +95,45 @@ class EnsiasdApiConfig(models.Model):
                 vals['api_key'] = f"ensiasd_{secrets.token_hex(16)}"
             if not vals.get('api_secret'):
                 vals['api_secret'] = secrets.token_hex(32)
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        """Invalide l'instantané de configuration de tous les workers"""
+        res = super().write(vals)
+        # Le compteur de requêtes ne fait pas partie de l'instantané
+        if set(vals) - {'total_requests'}:
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def get_config_values(self):
+        """
+        Instantané de la configuration active, mis en cache par worker.
+
+        Le cache est vidé via le registre (signalé à tous les workers) à chaque
+        création, modification ou suppression d'une configuration. Le
+        dictionnaire retourné est partagé: il ne doit pas être modifié.
+        """
+        config = self.sudo().get_config()
+        values = {name: config[name] for name in CACHED_CONFIG_FIELDS}
+        values['id'] = config.id
+        return values
+
+    @api.model
+    def check_api_key(self, api_key):
+        """Vérifie la clé API en temps constant sans accès à la base"""
+        expected = self.get_config_values()['api_key']
+        if not api_key or not expected:
+            return False
+        return hmac.compare_digest(api_key.encode(), expected.encode())
 
     @api.model
     def get_config(self):
@@ -92,6 +174,8 @@ class EnsiasdApiConfig(models.Model):
 
     def action_view_logs(self):
         """Action pour voir les logs"""
+        # Écrire d'abord les logs encore en attente dans ce worker
+        self.env['ensiasd.api.log'].action_flush_buffer()
         return {
             'type': 'ir.actions.act_window',
             'name': 'Logs API',
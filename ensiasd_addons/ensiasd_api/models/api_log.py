@@ -1,5 +1,131 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+import atexit
+import logging
+import os
+import threading
+import time
+
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# Tampon de logs par worker: vidé en un seul INSERT multi-lignes par un
+# thread d'arrière-plan toutes les LOG_FLUSH_INTERVAL secondes, ou plus tôt
+# dès que LOG_BUFFER_SIZE entrées sont en attente. Les requêtes ne font
+# jamais l'écriture elles-mêmes.
+LOG_BUFFER_SIZE = 100
+LOG_FLUSH_INTERVAL = 10
+
+_log_buffers = {}
+_log_buffers_lock = threading.Lock()
+_flush_lock = threading.Lock()
+
+# Thread de vidage du processus courant (un par worker, recréé après fork)
+_flusher = {'thread': None, 'pid': None, 'wakeup': threading.Event()}
+
+
+def _write_log_records(cr, records):
+    """
+    Insère les logs en un seul create(); si le lot échoue (une clé étrangère
+    invalide, par exemple), réessaie ligne par ligne pour ne perdre que les
+    lignes en erreur. Retourne le nombre de logs écrits.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Log = env['ensiasd.api.log']
+    try:
+        with cr.savepoint():
+            Log.create(records)
+        return len(records)
+    except Exception:
+        _logger.warning("Écriture groupée de %s logs API impossible, écriture ligne par ligne",
+                        len(records), exc_info=True)
+
+    written = 0
+    for vals in records:
+        try:
+            with cr.savepoint():
+                Log.create(vals)
+            written += 1
+        except Exception:
+            _logger.exception("Log API ignoré: %s %s", vals.get('method'), vals.get('endpoint'))
+    return written
+
+
+def _flush_log_buffer(dbname):
+    """
+    Écrit les logs en attente pour une base dans une transaction séparée.
+
+    La transaction de la requête n'est jamais impliquée: un échec ici est
+    journalisé puis ignoré. Retourne le nombre de logs écrits.
+    """
+    if not _flush_lock.acquire(blocking=False):
+        # Un autre thread est déjà en train de vider le tampon
+        return 0
+    try:
+        with _log_buffers_lock:
+            buffer = _log_buffers.get(dbname)
+            if not buffer or not buffer['records']:
+                return 0
+            records, buffer['records'] = buffer['records'], []
+            buffer['last_flush'] = time.monotonic()
+
+        try:
+            with Registry(dbname).cursor() as cr:
+                written = _write_log_records(cr, records)
+                if written:
+                    # Compteur agrégé: un seul UPDATE par lot, sans lecture préalable
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    config_id = env['ensiasd.api.config'].get_config_values()['id']
+                    cr.execute(
+                        "UPDATE ensiasd_api_config "
+                        "SET total_requests = COALESCE(total_requests, 0) + %s "
+                        "WHERE id = %s",
+                        (written, config_id)
+                    )
+        except Exception:
+            _logger.exception("Impossible d'écrire %s logs API", len(records))
+            return 0
+        return written
+    finally:
+        _flush_lock.release()
+
+
+def _flush_all_log_buffers():
+    """Vide les tampons de toutes les bases"""
+    for dbname in list(_log_buffers):
+        _flush_log_buffer(dbname)
+
+
+def _flusher_loop():
+    """Boucle du thread de vidage: réveillé par le minuteur ou un tampon plein"""
+    wakeup = _flusher['wakeup']
+    while True:
+        wakeup.wait(LOG_FLUSH_INTERVAL)
+        wakeup.clear()
+        try:
+            _flush_all_log_buffers()
+        except Exception:
+            _logger.exception("Erreur lors du vidage des logs API")
+
+
+def _ensure_flusher():
+    """Démarre le thread de vidage du processus courant s'il n'existe pas"""
+    pid = os.getpid()
+    if _flusher['pid'] == pid and _flusher['thread'].is_alive():
+        return
+    with _log_buffers_lock:
+        if _flusher['pid'] == pid and _flusher['thread'].is_alive():
+            return
+        thread = threading.Thread(target=_flusher_loop, name='ensiasd.api.log.flusher', daemon=True)
+        thread.start()
+        _flusher.update(thread=thread, pid=pid)
+
+
+@atexit.register
+def _flush_at_exit():
+    """Vide les tampons restants à l'arrêt du worker"""
+    _flush_all_log_buffers()
 
 
 class EnsiasdApiLog(models.Model):
@@ -48,18 +174,20 @@ class EnsiasdApiLog(models.Model):
     def log_request(self, endpoint, method, student_id=None, ip_address=None,
                     user_agent=None, request_data=None, response_code=200,
                     response_time_ms=0, status='success', error_message=None):
-        """Enregistre une requête API"""
-        config = self.env['ensiasd.api.config'].get_config()
-        
-        if not config.enable_logging:
+        """
+        Enregistre une requête API dans le tampon du worker.
+
+        Aucune écriture n'est faite dans la requête: les logs et le compteur
+        total_requests sont écrits par lots par le thread de vidage du worker
+        (voir _flush_log_buffer).
+        """
+        config = self.env['ensiasd.api.config'].get_config_values()
+
+        if not config['enable_logging']:
             return False
-        
-        # Incrémenter le compteur total
-        config.sudo().write({
-            'total_requests': config.total_requests + 1
-        })
-        
-        return self.create({
+
+        vals = {
+            'timestamp': fields.Datetime.now(),
             'endpoint': endpoint,
             'method': method,
             'student_id': student_id,
@@ -70,4 +198,24 @@ class EnsiasdApiLog(models.Model):
             'response_time_ms': response_time_ms,
             'status': status,
             'error_message': error_message,
-        })
+        }
+
+        dbname = self.env.cr.dbname
+        with _log_buffers_lock:
+            buffer = _log_buffers.setdefault(dbname, {
+                'records': [],
+                'last_flush': time.monotonic(),
+            })
+            buffer['records'].append(vals)
+            buffer_full = len(buffer['records']) >= LOG_BUFFER_SIZE
+
+        _ensure_flusher()
+        if buffer_full:
+            # Réveille le thread de vidage sans attendre la fin du délai
+            _flusher['wakeup'].set()
+        return True
+
+    @api.model
+    def action_flush_buffer(self):
+        """Force l'écriture des logs en attente dans ce worker"""
+        return _flush_log_buffer(self.env.cr.dbname)
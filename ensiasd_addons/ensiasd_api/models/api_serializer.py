@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Sérialiseurs déclaratifs pour l'API.
+
+Un sérialiseur décrit la forme JSON d'un modèle:
+
+    ApiSerializer('ensiasd.note', {
+        'id': 'id',
+        'valeur': 'note_finale',
+        'module': Many2one('module_id', MODULE_REF),
+        'coefficient': Related('module_id', 'coefficient', default=1.0),
+    })
+
+La sérialisation d'un recordset fait un seul read() par modèle traversé,
+quel que soit le nombre d'enregistrements: pas de N+1 sur les relations.
+Les champs absents du modèle (module optionnel non installé) prennent leur
+valeur par défaut, sans test par enregistrement.
+"""
+
+
+class Field:
+    """Valeur d'un champ du modèle"""
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+
+class Many2one:
+    """Objet imbriqué sérialisé par `serializer`, ou None si vide"""
+
+    def __init__(self, name, serializer):
+        self.name = name
+        self.serializer = serializer
+
+
+class Related:
+    """
+    Valeur d'un champ de l'enregistrement lié par `relation`. Si `serializer`
+    est donné, ce champ est un Many2one sérialisé comme objet imbriqué.
+    """
+
+    def __init__(self, relation, name, default=None, serializer=None):
+        self.relation = relation
+        self.name = name
+        self.default = default
+        self.serializer = serializer
+
+
+def _convert(model, name, value):
+    """Convertit une valeur lue par read() en valeur JSON"""
+    field_type = model._fields[name].type
+    if field_type in ('date', 'datetime'):
+        return value.isoformat() if value else None
+    return value
+
+
+class ApiSerializer:
+
+    def __init__(self, model_name, spec):
+        self.model_name = model_name
+        self.spec = [
+            (key, Field(item) if isinstance(item, str) else item)
+            for key, item in spec.items()
+        ]
+
+    def serialize(self, records, keys=None, extra_fields=()):
+        """
+        Sérialise un recordset en liste de dictionnaires, dans l'ordre.
+
+        `keys` restreint la sortie à ces clés (l'id est toujours inclus): seuls
+        les champs et relations correspondants sont lus. `extra_fields` sont
+        lus en plus, pour le cache de l'ORM, sans être sérialisés.
+        """
+        if not records:
+            return []
+        serializer = self.project(keys) if keys is not None else self
+        return serializer._build(records.env, serializer._read(records, extra_fields))
+
+    def project(self, keys):
+        """Sérialiseur limité aux clés `keys` (et à l'id)"""
+        wanted = set(keys) | {'id'}
+        projected = ApiSerializer(self.model_name, {})
+        projected.spec = [(key, item) for key, item in self.spec if key in wanted]
+        return projected
+
+    def serialize_one(self, record):
+        record.ensure_one()
+        return self.serialize(record)[0]
+
+    def _read(self, records, extra_fields=()):
+        model = records.env[self.model_name]
+        names = {'id'}
+        for _key, item in self.spec:
+            name = item.relation if isinstance(item, Related) else item.name
+            names.add(name)
+        names.update(extra_fields)
+        names = [name for name in names if name in model._fields]
+        return records.read(names, load=None)
+
+    def _build(self, env, rows):
+        model = env[self.model_name]
+
+        # Un seul read() par relation: objets imbriqués et champs liés
+        relations = {}
+        for _key, item in self.spec:
+            if isinstance(item, Many2one) and item.name in model._fields:
+                relations.setdefault(item.name, [None, set()])[0] = item.serializer
+            elif isinstance(item, Related) and item.relation in model._fields:
+                relations.setdefault(item.relation, [None, set()])[1].add(item.name)
+
+        targets = {}
+        for name, (serializer, extra_fields) in relations.items():
+            comodel_name = model._fields[name].comodel_name
+            ids = list({row[name] for row in rows if row[name]})
+            sub = serializer or ApiSerializer(comodel_name, {})
+            sub_rows = sub._read(env[comodel_name].browse(ids), extra_fields) if ids else []
+            outputs = sub._build(env, sub_rows) if serializer else [None] * len(sub_rows)
+            targets[name] = {
+                sub_row['id']: (sub_row, output)
+                for sub_row, output in zip(sub_rows, outputs)
+            }
+
+        # Many2one de second niveau (ex. séance -> élément -> module)
+        nested = {}
+        for key, item in self.spec:
+            if isinstance(item, Related) and item.serializer and item.relation in targets:
+                ids = list({
+                    target_row.get(item.name)
+                    for target_row, _output in targets[item.relation].values()
+                    if target_row.get(item.name)
+                })
+                records = env[item.serializer.model_name].browse(ids)
+                nested[key] = dict(zip(ids, item.serializer.serialize(records)))
+
+        result = []
+        for row in rows:
+            data = {}
+            for key, item in self.spec:
+                if isinstance(item, Field):
+                    if item.name in row:
+                        data[key] = _convert(model, item.name, row[item.name])
+                    else:
+                        data[key] = item.default
+                elif isinstance(item, Many2one):
+                    target_id = row.get(item.name)
+                    data[key] = targets[item.name][target_id][1] if target_id else None
+                else:
+                    target_id = row.get(item.relation)
+                    target_row = targets[item.relation][target_id][0] if target_id else {}
+                    if key in nested:
+                        value = target_row.get(item.name)
+                        data[key] = nested[key][value] if value else None
+                    elif item.name in target_row:
+                        comodel = env[model._fields[item.relation].comodel_name]
+                        data[key] = _convert(comodel, item.name, target_row[item.name])
+                    else:
+                        data[key] = item.default
+            result.append(data)
+        return result
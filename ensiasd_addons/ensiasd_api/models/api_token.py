@@ -1,8 +1,131 @@
 # -*- coding: utf-8 -*-
+import atexit
+import logging
 import secrets
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from odoo import models, fields, api
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# Cache LRU des tokens validés, par worker: (base, hash) -> (token, étudiant,
+# expiration, date de mise en cache). Une révocation (ou une modification)
+# ajoute le hash du token à la table ensiasd_api_token_revocation dans la
+# même transaction; chaque validation vérifie que son token n'y figure pas
+# (une requête indexée), si bien qu'une révocation faite dans n'importe quel
+# worker est prise en compte dès la requête suivante sans vider le cache des
+# autres tokens. Les hashes y restent REVOCATION_RETENTION secondes, plus
+# longtemps que les entrées du cache (TOKEN_CACHE_TTL).
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+REVOCATION_RETENTION = 2 * TOKEN_CACHE_TTL
+
+# Verrou consultatif: un seul worker à la fois purge la table des révocations
+REVOCATION_PRUNE_LOCK = 0x0e51a5d1
+
+# Clé des données du postcommit: hashes des tokens révoqués dans la transaction
+POSTCOMMIT_KEY = 'ensiasd.api.token.revoked'
+
+# Les dates de dernière utilisation sont regroupées et écrites au plus une
+# fois toutes les LAST_USED_FLUSH_INTERVAL secondes par worker.
+LAST_USED_FLUSH_INTERVAL = 60
+
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_pending_last_used = {}
+_last_used_flushed_at = {}
+_revocations_pruned_at = {}
+
+
+def _token_cache_get(dbname, token_hash):
+    key = (dbname, token_hash)
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[3] > TOKEN_CACHE_TTL:
+            del _token_cache[key]
+            return None
+        _token_cache.move_to_end(key)
+        return entry
+
+
+def _token_cache_put(dbname, token_hash, token_id, student_id, expires_at):
+    with _token_cache_lock:
+        _token_cache[(dbname, token_hash)] = (token_id, student_id, expires_at, time.monotonic())
+        _token_cache.move_to_end((dbname, token_hash))
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _token_cache_invalidate(dbname, token_hashes):
+    with _token_cache_lock:
+        for token_hash in token_hashes:
+            _token_cache.pop((dbname, token_hash), None)
+
+
+def _is_revoked(cr, token_hash):
+    """Le token a-t-il été révoqué ou modifié récemment (tous workers confondus)"""
+    cr.execute("SELECT 1 FROM ensiasd_api_token_revocation WHERE token_hash = %s LIMIT 1", (token_hash,))
+    return bool(cr.fetchone())
+
+
+def _signal_revocation(dbname, token_hashes):
+    """
+    Après le commit d'une révocation: retire les tokens du cache de ce worker
+    et purge au besoin les révocations plus anciennes que REVOCATION_RETENTION
+    """
+    _token_cache_invalidate(dbname, token_hashes)
+    with _token_cache_lock:
+        last_prune = _revocations_pruned_at.get(dbname, 0)
+        if time.monotonic() - last_prune < REVOCATION_RETENTION:
+            return
+        _revocations_pruned_at[dbname] = time.monotonic()
+    try:
+        with Registry(dbname).cursor() as cr:
+            cr.execute("SELECT pg_try_advisory_xact_lock(%s)", (REVOCATION_PRUNE_LOCK,))
+            if cr.fetchone()[0]:
+                cr.execute("""
+                    DELETE FROM ensiasd_api_token_revocation
+                     WHERE revoked_at < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => %s)
+                """, (REVOCATION_RETENTION,))
+    except Exception:
+        # Purge reprise à la prochaine révocation
+        _logger.exception("Impossible de purger les révocations de tokens")
+
+
+def _flush_last_used(dbname):
+    """Écrit les dates de dernière utilisation en attente en un seul UPDATE"""
+    with _token_cache_lock:
+        pending = _pending_last_used.pop(dbname, None)
+        _last_used_flushed_at[dbname] = time.monotonic()
+    if not pending:
+        return 0
+    try:
+        with Registry(dbname).cursor() as cr:
+            values = ', '.join(['(%s, %s::timestamp)'] * len(pending))
+            params = [item for pair in pending.items() for item in pair]
+            cr.execute(
+                "UPDATE ensiasd_api_token AS t SET last_used = v.last_used "
+                "FROM (VALUES " + values + ") AS v(id, last_used) "
+                "WHERE t.id = v.id",
+                params
+            )
+    except Exception:
+        _logger.exception("Impossible de mettre à jour last_used de %s tokens", len(pending))
+        return 0
+    return len(pending)
+
+
+@atexit.register
+def _flush_all_last_used():
+    """Écrit les dates en attente à l'arrêt du worker"""
+    for dbname in list(_pending_last_used):
+        _flush_last_used(dbname)
 
 
 class EnsiasdApiToken(models.Model):
@@ -36,6 +159,20 @@ class EnsiasdApiToken(models.Model):
     revoked = fields.Boolean(string='Révoqué', default=False)
     revoked_at = fields.Datetime(string='Révoqué le')
 
+    def init(self):
+        """Hashes des tokens révoqués récemment, partagés par les workers (voir _is_revoked)"""
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS ensiasd_api_token_revocation (
+                token_hash VARCHAR NOT NULL,
+                revoked_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC')
+            )
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS ensiasd_api_token_revocation_hash_index
+                ON ensiasd_api_token_revocation (token_hash)
+        """)
+        self.env.cr.execute("DROP SEQUENCE IF EXISTS ensiasd_api_token_revocation_seq")
+
     @api.depends('expires_at', 'revoked')
     def _compute_is_valid(self):
         now = fields.Datetime.now()
@@ -49,23 +186,20 @@ class EnsiasdApiToken(models.Model):
     @api.model
     def create_token(self, student_id, ip_address=None, user_agent=None):
         """Crée un nouveau token pour un étudiant"""
-        config = self.env['ensiasd.api.config'].get_config()
+        config = self.env['ensiasd.api.config'].get_config_values()
         
         # Générer le token
         raw_token = secrets.token_hex(32)
         token_hash = hashlib.sha256(raw_token.encode()).hexdigest()
         
         # Calculer l'expiration
-        expires_at = datetime.now() + timedelta(hours=config.token_expiry_hours)
+        expires_at = datetime.now() + timedelta(hours=config['token_expiry_hours'])
         
         # Révoquer les anciens tokens de cet étudiant
         self.search([
             ('student_id', '=', student_id),
             ('revoked', '=', False)
-        ]).write({
-            'revoked': True,
-            'revoked_at': fields.Datetime.now()
-        })
+        ]).action_revoke()
         
         # Créer le nouveau token
         token = self.create({
@@ -85,23 +219,84 @@ class EnsiasdApiToken(models.Model):
 
     @api.model
     def validate_token(self, token):
-        """Valide un token et retourne l'étudiant associé"""
+        """
+        Valide un token et retourne l'étudiant associé.
+
+        Les tokens valides sont servis depuis le cache du worker: seule la
+        table des révocations est lue pour ce token, sans accès à la table
+        des tokens; la date de dernière utilisation est écrite en différé.
+        Un token révoqué ou modifié récemment n'est pas mis en cache.
+        """
         if not token:
             return False
-        
+
+        dbname = self.env.cr.dbname
         token_hash = hashlib.sha256(token.encode()).hexdigest()
-        token_record = self.search([
-            ('token_hash', '=', token_hash),
-            ('revoked', '=', False),
-        ], limit=1)
-        
-        if not token_record or not token_record.is_valid:
+        revoked = _is_revoked(self.env.cr, token_hash)
+        entry = None if revoked else _token_cache_get(dbname, token_hash)
+
+        if entry is None:
+            _token_cache_invalidate(dbname, [token_hash])
+            token_record = self.search([
+                ('token_hash', '=', token_hash),
+                ('revoked', '=', False),
+            ], limit=1)
+
+            if not token_record or not token_record.is_valid:
+                return False
+
+            entry = (token_record.id, token_record.student_id.id, token_record.expires_at)
+            if not revoked:
+                _token_cache_put(dbname, token_hash, *entry)
+
+        token_id, student_id, expires_at = entry[:3]
+        if not expires_at or expires_at <= fields.Datetime.now():
+            _token_cache_invalidate(dbname, [token_hash])
             return False
-        
-        # Mettre à jour la dernière utilisation
-        token_record.write({'last_used': fields.Datetime.now()})
-        
-        return token_record.student_id
+
+        self._mark_used(token_id)
+        return self.env['ensiasd.student'].browse(student_id)
+
+    @api.model
+    def _mark_used(self, token_id):
+        """Enregistre l'utilisation du token pour une écriture groupée"""
+        dbname = self.env.cr.dbname
+        with _token_cache_lock:
+            _pending_last_used.setdefault(dbname, {})[token_id] = fields.Datetime.now()
+            last_flush = _last_used_flushed_at.setdefault(dbname, time.monotonic())
+        if time.monotonic() - last_flush >= LAST_USED_FLUSH_INTERVAL:
+            _flush_last_used(dbname)
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'revoked', 'expires_at', 'token_hash', 'student_id'} & set(vals):
+            self._invalidate_token_cache()
+        return res
+
+    def unlink(self):
+        self._invalidate_token_cache()
+        return super().unlink()
+
+    def _invalidate_token_cache(self):
+        """
+        Invalide ces tokens dans le cache de validation de tous les workers:
+        leurs hashes sont ajoutés à la table des révocations dans la
+        transaction, et retirés du cache de ce worker après le commit
+        """
+        token_hashes = {token_hash for token_hash in self.mapped('token_hash') if token_hash}
+        if not token_hashes:
+            return
+        self.env.cr.execute(
+            "INSERT INTO ensiasd_api_token_revocation (token_hash) VALUES "
+            + ", ".join(["(%s)"] * len(token_hashes)),
+            list(token_hashes),
+        )
+        postcommit = self.env.cr.postcommit
+        if POSTCOMMIT_KEY not in postcommit.data:
+            postcommit.data[POSTCOMMIT_KEY] = set()
+            dbname = self.env.cr.dbname
+            postcommit.add(lambda: _signal_revocation(dbname, postcommit.data.pop(POSTCOMMIT_KEY, set())))
+        postcommit.data[POSTCOMMIT_KEY] |= token_hashes
 
     def action_revoke(self):
         """Révoque le token"""
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from .student_api_mixin import invalidate_notes_summary_cache
+
+
+class EnsiasdNote(models.Model):
+    """Invalidation du cache des résumés de notes de l'API"""
+    _inherit = 'ensiasd.note'
+
+    def _invalidate_api_summary(self):
+        student_ids = set(self.mapped('student_id').ids)
+        if student_ids:
+            invalidate_notes_summary_cache(self.env.cr.dbname, student_ids)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._invalidate_api_summary()
+        return records
+
+    def write(self, vals):
+        # Avant l'écriture aussi: l'inscription (donc l'étudiant) peut changer
+        self._invalidate_api_summary()
+        result = super().write(vals)
+        self._invalidate_api_summary()
+        return result
+
+    def unlink(self):
+        self._invalidate_api_summary()
+        return super().unlink()
@@ -1,6 +1,272 @@
 # -*- coding: utf-8 -*-
+import base64
 import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from passlib.context import CryptContext
+
 from odoo import models, fields, api
+from odoo.osv import expression
+
+from .api_serializer import ApiSerializer, Field, Many2one, Related
+
+# Pagination des listes de l'API
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 500
+
+
+def encode_api_cursor(values):
+    """Encode les valeurs de tri du dernier élément en curseur opaque"""
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_api_cursor(cursor):
+    """Décode un curseur; lève ValueError s'il est invalide"""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Curseur invalide")
+    if not isinstance(values, list):
+        raise ValueError("Curseur invalide")
+    return values
+
+
+# Cache LRU des résumés de notes, par worker: (base, étudiant) ->
+# {année: (version, résumé, date de mise en cache)}. Une entrée n'est servie
+# que si la version des notes (nombre, dernière modification) n'a pas changé;
+# les modifications de notes faites dans ce worker l'évincent immédiatement.
+# Le TTL borne la durée de vie des résumés dont les coefficients de module
+# auraient changé sans toucher les notes.
+NOTES_SUMMARY_CACHE_SIZE = 5000
+NOTES_SUMMARY_CACHE_TTL = 600
+
+_notes_summary_cache = OrderedDict()
+_notes_summary_lock = threading.Lock()
+
+
+def _notes_summary_cache_get(dbname, student_id, annee_id, version):
+    key = (dbname, student_id)
+    with _notes_summary_lock:
+        entry = _notes_summary_cache.get(key, {}).get(annee_id)
+        if entry is None:
+            return None
+        if entry[0] != version or time.monotonic() - entry[2] > NOTES_SUMMARY_CACHE_TTL:
+            del _notes_summary_cache[key][annee_id]
+            return None
+        _notes_summary_cache.move_to_end(key)
+        return entry[1]
+
+
+def _notes_summary_cache_put(dbname, student_id, annee_id, version, summary):
+    key = (dbname, student_id)
+    with _notes_summary_lock:
+        _notes_summary_cache.setdefault(key, {})[annee_id] = (version, summary, time.monotonic())
+        _notes_summary_cache.move_to_end(key)
+        while len(_notes_summary_cache) > NOTES_SUMMARY_CACHE_SIZE:
+            _notes_summary_cache.popitem(last=False)
+
+
+def invalidate_notes_summary_cache(dbname, student_ids):
+    """Évince les résumés de notes mis en cache pour ces étudiants"""
+    with _notes_summary_lock:
+        for student_id in student_ids:
+            _notes_summary_cache.pop((dbname, student_id), None)
+
+
+# Mots de passe API: PBKDF2-SHA512 (coût réglable dans la configuration).
+# Les anciens hachages SHA-256 non salés sont reconnus puis remplacés à la
+# première vérification réussie.
+PASSWORD_SCHEMES = ['pbkdf2_sha512', 'hex_sha256']
+
+# Nombre de vérifications KDF simultanées pour toute la base, tous processus
+# confondus (prefork comme threaded), et attente maximale d'une place:
+# au-delà, la connexion est refusée (503) plutôt que mise en file. Chaque place
+# est un verrou consultatif PostgreSQL (KDF_LOCK_KEY, numéro de place), libéré
+# à la fin de la transaction de la connexion.
+KDF_MAX_CONCURRENCY = 4
+KDF_ACQUIRE_TIMEOUT = 5
+KDF_LOCK_KEY = 0x0e51a0df
+KDF_RETRY_DELAY = 0.05
+
+# Vérifications réussies récentes, par worker. La clé est un HMAC (secret
+# propre au processus) de l'étudiant, du hachage et du mot de passe: le mot
+# de passe n'est pas conservé et tout changement de hachage l'invalide.
+PASSWORD_CACHE_SIZE = 10000
+PASSWORD_CACHE_TTL = 300
+
+_password_contexts = {}
+_password_cache = OrderedDict()
+_password_cache_lock = threading.Lock()
+_password_cache_secret = secrets.token_bytes(32)
+
+
+class ApiPasswordBusy(Exception):
+    """Trop de vérifications de mot de passe en cours"""
+
+
+def _acquire_kdf_slot(cr):
+    """
+    Réserve une place de calcul KDF parmi KDF_MAX_CONCURRENCY, partagées par
+    tous les processus; lève ApiPasswordBusy si aucune ne se libère dans
+    KDF_ACQUIRE_TIMEOUT. La place est rendue à la fin de la transaction.
+    """
+    deadline = time.monotonic() + KDF_ACQUIRE_TIMEOUT
+    first = secrets.randbelow(KDF_MAX_CONCURRENCY)
+    while True:
+        for offset in range(KDF_MAX_CONCURRENCY):
+            slot = (first + offset) % KDF_MAX_CONCURRENCY
+            cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (KDF_LOCK_KEY, slot))
+            if cr.fetchone()[0]:
+                return
+        if time.monotonic() >= deadline:
+            raise ApiPasswordBusy()
+        time.sleep(KDF_RETRY_DELAY)
+
+
+def _get_password_context(rounds):
+    context = _password_contexts.get(rounds)
+    if context is None:
+        context = _password_contexts[rounds] = CryptContext(
+            PASSWORD_SCHEMES,
+            deprecated=['hex_sha256'],
+            pbkdf2_sha512__default_rounds=rounds,
+            pbkdf2_sha512__min_rounds=rounds,
+        )
+    return context
+
+
+def _password_cache_key(dbname, student_id, password_hash, password):
+    message = f"{dbname}\0{student_id}\0{password_hash}\0{password}".encode()
+    return hmac.new(_password_cache_secret, message, hashlib.sha256).digest()
+
+
+def _password_cache_check(key):
+    with _password_cache_lock:
+        cached_at = _password_cache.get(key)
+        if cached_at is None:
+            return False
+        if time.monotonic() - cached_at > PASSWORD_CACHE_TTL:
+            del _password_cache[key]
+            return False
+        return True
+
+
+def _password_cache_put(key):
+    with _password_cache_lock:
+        _password_cache[key] = time.monotonic()
+        _password_cache.move_to_end(key)
+        while len(_password_cache) > PASSWORD_CACHE_SIZE:
+            _password_cache.popitem(last=False)
+
+
+# ========== SÉRIALISEURS ==========
+
+REF = {'id': 'id', 'name': 'name'}
+MODULE_REF = ApiSerializer('ensiasd.module', {'id': 'id', 'code': 'code', 'name': 'name'})
+
+STUDENT_SERIALIZER = ApiSerializer('ensiasd.student', {
+    'id': 'id',
+    'matricule': 'matricule',
+    'name': 'name',
+    'cne': 'cne',
+    'email': 'email',
+    'niveau': 'niveau',
+    'groupe': Many2one('groupe_id', ApiSerializer('ensiasd.groupe', REF)),
+    'state': 'state',
+})
+
+STUDENT_DETAILS_SERIALIZER = ApiSerializer('ensiasd.student', {
+    **dict(STUDENT_SERIALIZER.spec),
+    'cin': 'cin',
+    'phone': 'phone',
+    'mobile': 'mobile',
+    'address': 'address',
+    'city': 'city',
+    'date_naissance': 'date_naissance',
+    'lieu_naissance': 'lieu_naissance',
+    'sexe': 'sexe',
+    'nationalite': 'nationalite',
+    'annee_courante': Many2one('annee_courante_id', ApiSerializer('ensiasd.annee', REF)),
+})
+
+NOTE_SERIALIZER = ApiSerializer('ensiasd.note', {
+    'id': 'id',
+    'module': Many2one('module_id', MODULE_REF),
+    'type_eval': 'type_eval',
+    'valeur': 'note_finale',
+    'coefficient': Related('module_id', 'coefficient', default=1.0),
+    'date_eval': 'date',
+    'state': 'state',
+    'observations': 'observations',
+})
+
+ABSENCE_SERIALIZER = ApiSerializer('ensiasd.absence', {
+    'id': 'id',
+    'date': 'date',
+    'seance': Many2one('seance_id', ApiSerializer('ensiasd.seance', REF)),
+    'module': Many2one('module_id', MODULE_REF),
+    'justifiee': Field('justifiee', default=False),
+    'motif': 'motif',
+    'state': Field('state', default='absent'),
+})
+
+SEANCE_SERIALIZER = ApiSerializer('ensiasd.seance', {
+    'id': 'id',
+    'date': 'date',
+    'heure_debut': 'heure_debut',
+    'heure_fin': 'heure_fin',
+    'element': Many2one('element_id', ApiSerializer('ensiasd.element', {
+        'id': 'id',
+        'name': 'name',
+        'type': 'type_element',
+    })),
+    'module': Related('element_id', 'module_id', serializer=MODULE_REF),
+    'salle': Many2one('salle_id', ApiSerializer('ensiasd.salle', {
+        'id': 'id',
+        'code': 'code',
+        'name': 'name',
+    })),
+    'enseignant': Many2one('enseignant_id', ApiSerializer('hr.employee', REF)),
+    'state': 'state',
+})
+
+INSCRIPTION_SERIALIZER = ApiSerializer('ensiasd.inscription', {
+    'id': 'id',
+    'module': Many2one('module_id', ApiSerializer('ensiasd.module', {
+        'id': 'id',
+        'code': 'code',
+        'name': 'name',
+        'credits_ects': Field('credits_ects', default=0),
+    })),
+    'annee': Many2one('annee_id', ApiSerializer('ensiasd.annee', REF)),
+    'state': 'state',
+})
+
+STAGE_SERIALIZER = ApiSerializer('ensiasd.stage', {
+    'id': 'id',
+    'name': 'name',
+    'sujet': 'sujet',
+    'type_stage': 'type_stage',
+    'entreprise': Many2one('entreprise_id', ApiSerializer('ensiasd.entreprise', {
+        'id': 'id',
+        'name': 'name',
+        'city': 'city',
+    })),
+    'date_debut': 'date_debut',
+    'date_fin': 'date_fin',
+    'encadrant_interne': Many2one('encadrant_interne_id', ApiSerializer('hr.employee', REF)),
+    'encadrant_externe': 'encadrant_externe',
+    'state': 'state',
+    'note_finale': 'note_finale',
+    'mention': 'mention',
+})
 
 
 class EnsiasdStudentApiMixin(models.Model):
@@ -9,53 +275,60 @@ class EnsiasdStudentApiMixin(models.Model):
 
     # Champ mot de passe pour l'authentification API
     api_password_hash = fields.Char(string='Hash mot de passe API', readonly=True)
+    api_password_auto = fields.Boolean(
+        string='Mot de passe par défaut (CNE+CIN)',
+        readonly=True,
+        help="Le mot de passe est CNE+CIN; il est haché à la première connexion "
+             "réussie, pas à la création de l'étudiant"
+    )
     api_enabled = fields.Boolean(string='Accès API activé', default=True)
     last_api_login = fields.Datetime(string='Dernière connexion API')
 
     @api.model_create_multi
     def create(self, vals_list):
         """
-        Surcharge de create pour générer automatiquement le mot de passe API
-        si api_enabled est True et que CNE + CIN sont fournis
+        Surcharge de create pour activer le mot de passe API par défaut
+        (CNE+CIN) si api_enabled est True et que CNE + CIN sont fournis.
+        Aucun hachage ici: voir check_api_password.
         """
-        records = super().create(vals_list)
+        for vals in vals_list:
+            if vals.get('api_enabled', True) and vals.get('cne') and vals.get('cin') \
+                    and not vals.get('api_password_hash'):
+                vals['api_password_auto'] = True
 
-        for record in records:
-            # Générer le mot de passe API automatiquement si activé
-            if record.api_enabled and record.cne and record.cin:
-                auto_password = self._generate_auto_password(record.cne, record.cin)
-                record.set_api_password(auto_password)
+        records = super().create(vals_list)
 
-                # Logger l'événement
-                record.message_post(
-                    body=f"Mot de passe API généré automatiquement (CNE+CIN)",
-                    subject="Activation API"
-                )
+        for record in records.filtered('api_password_auto'):
+            # Logger l'événement
+            record.message_post(
+                body=f"Mot de passe API par défaut activé (CNE+CIN)",
+                subject="Activation API"
+            )
 
         return records
 
     def write(self, vals):
         """
-        Surcharge de write pour régénérer le mot de passe si CNE ou CIN change
+        Surcharge de write pour activer le mot de passe par défaut si CNE ou
+        CIN change, ou si l'API est activée, sans mot de passe défini
         """
         res = super().write(vals)
 
-        # Si CNE ou CIN change et que l'API est activée
-        if ('cne' in vals or 'cin' in vals) and self.api_enabled:
-            for record in self:
-                if record.cne and record.cin and not record.api_password_hash:
-                    auto_password = self._generate_auto_password(record.cne, record.cin)
-                    record.set_api_password(auto_password)
-
-        # Si api_enabled passe à True et pas encore de mot de passe
-        if vals.get('api_enabled') and not self.api_password_hash:
-            for record in self:
-                if record.cne and record.cin:
-                    auto_password = self._generate_auto_password(record.cne, record.cin)
-                    record.set_api_password(auto_password)
+        if {'cne', 'cin', 'api_enabled'} & set(vals):
+            self.filtered(
+                lambda s: s.api_enabled and s.cne and s.cin
+                and not s.api_password_hash and not s.api_password_auto
+            ).write({'api_password_auto': True})
 
         return res
 
+    def unlink(self):
+        """Les tokens sont supprimés en cascade par la base: les invalider ici"""
+        self.env['ensiasd.api.token'].sudo().search([
+            ('student_id', 'in', self.ids),
+        ])._invalidate_token_cache()
+        return super().unlink()
+
     @api.model
     def _generate_auto_password(self, cne, cin):
         """
@@ -78,18 +351,78 @@ class EnsiasdStudentApiMixin(models.Model):
 
         return password
 
+    @api.model
+    def _get_api_password_context(self):
+        rounds = self.env['ensiasd.api.config'].sudo().get_config_values()['password_kdf_rounds']
+        return _get_password_context(rounds or 210000)
+
     def set_api_password(self, password):
         """Définit le mot de passe API de l'étudiant"""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        self.write({'api_password_hash': password_hash})
+        password_hash = self._get_api_password_context().hash(password)
+        self.write({'api_password_hash': password_hash, 'api_password_auto': False})
+        return True
+
+    def reset_api_password(self):
+        """
+        Rétablit le mot de passe par défaut (CNE+CIN) sans le hacher: le
+        calcul KDF est fait à la première connexion (voir check_api_password)
+        """
+        self.write({'api_password_hash': False, 'api_password_auto': True})
         return True
 
     def check_api_password(self, password):
-        """Vérifie le mot de passe API"""
+        """
+        Vérifie le mot de passe API.
+
+        Une vérification réussie récente est servie depuis le cache du worker.
+        Sinon le calcul KDF attend une place parmi KDF_MAX_CONCURRENCY,
+        partagées par tous les workers; lève ApiPasswordBusy si aucune ne se
+        libère à temps. Un hachage obsolète
+        (SHA-256 ou coût inférieur à la configuration) est remplacé. Le mot
+        de passe par défaut (CNE+CIN) est comparé en clair, puis haché à la
+        première connexion réussie.
+        """
+        self.ensure_one()
+        if not password:
+            return False
         if not self.api_password_hash:
+            return self._check_auto_api_password(password)
+
+        dbname = self.env.cr.dbname
+        cache_key = _password_cache_key(dbname, self.id, self.api_password_hash, password)
+        if _password_cache_check(cache_key):
+            return True
+
+        _acquire_kdf_slot(self.env.cr)
+        try:
+            valid, new_hash = self._get_api_password_context().verify_and_update(
+                password, self.api_password_hash)
+        except ValueError:
+            # Hachage non reconnu
+            return False
+
+        if not valid:
             return False
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        return password_hash == self.api_password_hash
+        if new_hash:
+            self.sudo().write({'api_password_hash': new_hash})
+            cache_key = _password_cache_key(dbname, self.id, new_hash, password)
+        _password_cache_put(cache_key)
+        return True
+
+    def _check_auto_api_password(self, password):
+        """Vérifie le mot de passe par défaut et enregistre son hachage"""
+        if not self.api_password_auto or not self.cne or not self.cin:
+            return False
+        expected = self._generate_auto_password(self.cne, self.cin)
+        if not hmac.compare_digest(password.encode(), expected.encode()):
+            return False
+
+        _acquire_kdf_slot(self.env.cr)
+        password_hash = self._get_api_password_context().hash(password)
+
+        self.sudo().write({'api_password_hash': password_hash, 'api_password_auto': False})
+        _password_cache_put(_password_cache_key(self.env.cr.dbname, self.id, password_hash, password))
+        return True
 
     def action_set_api_password(self):
         """Ouvre le wizard pour définir le mot de passe API"""
@@ -123,9 +456,9 @@ class EnsiasdStudentApiMixin(models.Model):
                 }
             }
 
-        # Générer le nouveau mot de passe
+        # Rétablir le mot de passe par défaut (haché à la première connexion)
         new_password = self._generate_auto_password(self.cne, self.cin)
-        self.set_api_password(new_password)
+        self.reset_api_password()
 
         # Message de confirmation avec le mot de passe (ATTENTION: à ne montrer qu'une fois!)
         return {
@@ -148,7 +481,7 @@ class EnsiasdStudentApiMixin(models.Model):
 
         if not self.api_enabled:
             message = "L'accès API n'est pas activé pour cet étudiant"
-        elif not self.api_password_hash:
+        elif not self.api_password_hash and not self.api_password_auto:
             message = "Aucun mot de passe API défini. Utilisez 'Régénérer mot de passe API'"
         else:
             # Ne jamais afficher le vrai mot de passe!
@@ -194,83 +527,96 @@ class EnsiasdStudentApiMixin(models.Model):
     def to_api_dict(self, include_details=False):
         """Convertit l'étudiant en dictionnaire pour l'API"""
         self.ensure_one()
-
-        data = {
-            'id': self.id,
-            'matricule': self.matricule,
-            'name': self.name,
-            'cne': self.cne,
-            'email': self.email,
-            'niveau': self.niveau,
-            'groupe': {
-                'id': self.groupe_id.id,
-                'name': self.groupe_id.name,
-            } if self.groupe_id else None,
-            'state': self.state,
-        }
-
         if include_details:
-            data.update({
-                'cin': self.cin,
-                'phone': self.phone,
-                'mobile': self.mobile,
-                'address': self.address,
-                'city': self.city,
-                'date_naissance': self.date_naissance.isoformat() if self.date_naissance else None,
-                'lieu_naissance': self.lieu_naissance,
-                'sexe': self.sexe,
-                'nationalite': self.nationalite,
-                'annee_courante': {
-                    'id': self.annee_courante_id.id,
-                    'name': self.annee_courante_id.name,
-                } if self.annee_courante_id else None,
-            })
+            return STUDENT_DETAILS_SERIALIZER.serialize_one(self)
+        return STUDENT_SERIALIZER.serialize_one(self)
 
-        return data
+    def _get_notes_api_domain(self, annee_id=None, module_id=None):
+        domain = [('student_id', '=', self.id)]
+        if annee_id:
+            domain.append(('annee_id', '=', annee_id))
+        if module_id:
+            domain.append(('module_id', '=', module_id))
+        return domain
+
+    def _serialize_notes_api(self, notes, keys=None, extra_fields=()):
+        return NOTE_SERIALIZER.serialize(notes, keys=keys, extra_fields=extra_fields)
 
     def get_notes_api(self, annee_id=None, module_id=None):
-        """Récupère les notes de l'étudiant pour l'API"""
+        """Récupère toutes les notes de l'étudiant pour l'API"""
         self.ensure_one()
 
         # Vérifier si le module grades est installé
         if 'ensiasd.note' not in self.env:
             return []
 
-        domain = [('student_id', '=', self.id)]
-        if annee_id:
-            domain.append(('annee_id', '=', annee_id))
-        if module_id:
-            domain.append(('module_id', '=', module_id))
+        notes = self.env['ensiasd.note'].search(
+            self._get_notes_api_domain(annee_id, module_id))
+        return self._serialize_notes_api(notes)
 
-        notes = self.env['ensiasd.note'].search(domain)
-
-        result = []
-        for note in notes:
-            result.append({
-                'id': note.id,
-                'module': {
-                    'id': note.module_id.id,
-                    'code': note.module_id.code,
-                    'name': note.module_id.name,
-                } if note.module_id else None,
-                'type_eval': note.type_eval if hasattr(note, 'type_eval') else None,
-                'valeur': note.note_finale,
-                'coefficient': note.module_id.coefficient if hasattr(note.module_id, 'coefficient') else 1.0,
-                'date_eval': note.date.isoformat() if hasattr(note, 'date') and note.date else None,
-                'state': note.state,
-                'observations': note.observations if hasattr(note, 'observations') else None,
-            })
+    def get_notes_summary_api(self, annee_id=None, version=None):
+        """
+        Résumé des notes par module (moyenne pondérée), servi depuis le cache
+        du worker tant que la version des notes de l'étudiant est inchangée.
+        `version` évite de recalculer une version déjà connue de l'appelant.
+        """
+        self.ensure_one()
+        if 'ensiasd.note' not in self.env:
+            return []
 
-        return result
+        if version is None:
+            version = self.get_notes_api_version(annee_id=annee_id)
+        dbname = self.env.cr.dbname
+        summary = _notes_summary_cache_get(dbname, self.id, annee_id, version)
+        if summary is None:
+            summary = self._compute_notes_summary_api(annee_id)
+            _notes_summary_cache_put(dbname, self.id, annee_id, version, summary)
+        return summary
+
+    def _compute_notes_summary_api(self, annee_id=None):
+        """Calcule les moyennes par module à partir des notes sérialisées"""
+        modules = {}
+        for note in self.get_notes_api(annee_id=annee_id):
+            if note['module']:
+                mod_id = note['module']['id']
+                if mod_id not in modules:
+                    modules[mod_id] = {
+                        'module': note['module'],
+                        'notes': [],
+                        'total_coef': 0,
+                        'total_weighted': 0
+                    }
+                modules[mod_id]['notes'].append(note)
+                modules[mod_id]['total_coef'] += note['coefficient']
+                modules[mod_id]['total_weighted'] += note['valeur'] * note['coefficient']
+
+        summary = []
+        for data in modules.values():
+            moyenne = data['total_weighted'] / data['total_coef'] if data['total_coef'] > 0 else 0
+            summary.append({
+                'module': data['module'],
+                'moyenne': round(moyenne, 2),
+                'nb_notes': len(data['notes']),
+                'notes': data['notes']
+            })
+        return summary
 
-    def get_absences_api(self, annee_id=None, date_from=None, date_to=None):
-        """Récupère les absences de l'étudiant pour l'API"""
+    def get_notes_page_api(self, annee_id=None, module_id=None, after=None, limit=None, fields=None):
+        """Récupère une page de notes (pagination par curseur)"""
         self.ensure_one()
 
-        # Vérifier si le module absence est installé
-        if 'ensiasd.absence' not in self.env:
-            return []
+        if 'ensiasd.note' not in self.env:
+            return self._empty_api_page()
+
+        return self._paginate_api(
+            'ensiasd.note',
+            self._get_notes_api_domain(annee_id, module_id),
+            [('id', 'asc')],
+            self._serialize_notes_api,
+            after=after, limit=limit, fields=fields,
+        )
 
+    def _get_absences_api_domain(self, annee_id=None, date_from=None, date_to=None):
         domain = [('student_id', '=', self.id)]
         if annee_id:
             # Filtrer par année via les séances
@@ -279,32 +625,69 @@ class EnsiasdStudentApiMixin(models.Model):
             domain.append(('date', '>=', date_from))
         if date_to:
             domain.append(('date', '<=', date_to))
+        return domain
 
-        absences = self.env['ensiasd.absence'].search(domain)
-
-        result = []
-        for absence in absences:
-            result.append({
-                'id': absence.id,
-                'date': absence.date.isoformat() if absence.date else None,
-                'seance': {
-                    'id': absence.seance_id.id,
-                    'name': absence.seance_id.name,
-                } if absence.seance_id else None,
-                'module': {
-                    'id': absence.module_id.id,
-                    'code': absence.module_id.code,
-                    'name': absence.module_id.name,
-                } if absence.module_id else None,
-                'justifiee': absence.justifiee if hasattr(absence, 'justifiee') else False,
-                'motif': absence.motif if hasattr(absence, 'motif') else None,
-                'state': absence.state if hasattr(absence, 'state') else 'absent',
-            })
+    def _serialize_absences_api(self, absences, keys=None, extra_fields=()):
+        return ABSENCE_SERIALIZER.serialize(absences, keys=keys, extra_fields=extra_fields)
 
-        return result
+    def get_absences_api(self, annee_id=None, date_from=None, date_to=None):
+        """Récupère toutes les absences de l'étudiant pour l'API"""
+        self.ensure_one()
+
+        # Vérifier si le module absence est installé
+        if 'ensiasd.absence' not in self.env:
+            return []
+
+        absences = self.env['ensiasd.absence'].search(
+            self._get_absences_api_domain(annee_id, date_from, date_to))
+        return self._serialize_absences_api(absences)
+
+    def get_absences_summary_api(self):
+        """Compte les absences sans les charger"""
+        self.ensure_one()
+
+        if 'ensiasd.absence' not in self.env:
+            return {'total': 0, 'justifiees': 0, 'non_justifiees': 0}
+
+        Absence = self.env['ensiasd.absence']
+        domain = self._get_absences_api_domain()
+        total = Absence.search_count(domain)
+        justifiees = Absence.search_count(domain + [('justifiee', '=', True)])
+        return {
+            'total': total,
+            'justifiees': justifiees,
+            'non_justifiees': total - justifiees,
+        }
+
+    def get_absences_page_api(self, annee_id=None, date_from=None, date_to=None,
+                              after=None, limit=None, fields=None):
+        """Récupère une page d'absences, des plus récentes aux plus anciennes"""
+        self.ensure_one()
+
+        if 'ensiasd.absence' not in self.env:
+            return self._empty_api_page()
+
+        return self._paginate_api(
+            'ensiasd.absence',
+            self._get_absences_api_domain(annee_id, date_from, date_to),
+            [('date', 'desc'), ('id', 'desc')],
+            self._serialize_absences_api,
+            after=after, limit=limit, fields=fields,
+        )
+
+    def _get_emploi_temps_api_domain(self, date_from=None, date_to=None):
+        domain = [('groupe_ids', 'in', [self.groupe_id.id])]
+        if date_from:
+            domain.append(('date', '>=', date_from))
+        if date_to:
+            domain.append(('date', '<=', date_to))
+        return domain
+
+    def _serialize_emploi_temps_api(self, seances, keys=None, extra_fields=()):
+        return SEANCE_SERIALIZER.serialize(seances, keys=keys, extra_fields=extra_fields)
 
     def get_emploi_temps_api(self, date_from=None, date_to=None):
-        """Récupère l'emploi du temps de l'étudiant pour l'API"""
+        """Récupère l'emploi du temps complet de l'étudiant pour l'API"""
         self.ensure_one()
 
         # Vérifier si le module timetable est installé
@@ -314,44 +697,27 @@ class EnsiasdStudentApiMixin(models.Model):
         if not self.groupe_id:
             return []
 
-        domain = [('groupe_ids', 'in', [self.groupe_id.id])]
-        if date_from:
-            domain.append(('date', '>=', date_from))
-        if date_to:
-            domain.append(('date', '<=', date_to))
+        seances = self.env['ensiasd.seance'].search(
+            self._get_emploi_temps_api_domain(date_from, date_to),
+            order='date, heure_debut'
+        )
+        return self._serialize_emploi_temps_api(seances)
 
-        seances = self.env['ensiasd.seance'].search(domain, order='date, heure_debut')
-
-        result = []
-        for seance in seances:
-            result.append({
-                'id': seance.id,
-                'date': seance.date.isoformat() if seance.date else None,
-                'heure_debut': seance.heure_debut,
-                'heure_fin': seance.heure_fin,
-                'element': {
-                    'id': seance.element_id.id,
-                    'name': seance.element_id.name,
-                    'type': seance.element_id.type_element,
-                } if seance.element_id else None,
-                'module': {
-                    'id': seance.element_id.module_id.id,
-                    'code': seance.element_id.module_id.code,
-                    'name': seance.element_id.module_id.name,
-                } if seance.element_id and seance.element_id.module_id else None,
-                'salle': {
-                    'id': seance.salle_id.id,
-                    'code': seance.salle_id.code,
-                    'name': seance.salle_id.name,
-                } if seance.salle_id else None,
-                'enseignant': {
-                    'id': seance.enseignant_id.id,
-                    'name': seance.enseignant_id.name,
-                } if seance.enseignant_id else None,
-                'state': seance.state,
-            })
+    def get_emploi_temps_page_api(self, date_from=None, date_to=None,
+                                  after=None, limit=None, fields=None):
+        """Récupère une page de l'emploi du temps, dans l'ordre chronologique"""
+        self.ensure_one()
 
-        return result
+        if 'ensiasd.seance' not in self.env or not self.groupe_id:
+            return self._empty_api_page()
+
+        return self._paginate_api(
+            'ensiasd.seance',
+            self._get_emploi_temps_api_domain(date_from, date_to),
+            [('date', 'asc'), ('heure_debut', 'asc'), ('id', 'asc')],
+            self._serialize_emploi_temps_api,
+            after=after, limit=limit, fields=fields,
+        )
 
     def get_inscriptions_api(self, annee_id=None):
         """Récupère les inscriptions aux modules"""
@@ -362,25 +728,7 @@ class EnsiasdStudentApiMixin(models.Model):
             domain.append(('annee_id', '=', annee_id))
 
         inscriptions = self.env['ensiasd.inscription'].search(domain)
-
-        result = []
-        for insc in inscriptions:
-            result.append({
-                'id': insc.id,
-                'module': {
-                    'id': insc.module_id.id,
-                    'code': insc.module_id.code,
-                    'name': insc.module_id.name,
-                    'credits_ects': insc.module_id.credits_ects if hasattr(insc.module_id, 'credits_ects') else 0,
-                } if insc.module_id else None,
-                'annee': {
-                    'id': insc.annee_id.id,
-                    'name': insc.annee_id.name,
-                } if insc.annee_id else None,
-                'state': insc.state if hasattr(insc, 'state') else None,
-            })
-
-        return result
+        return INSCRIPTION_SERIALIZER.serialize(inscriptions)
 
     def get_stages_api(self):
         """Récupère les stages de l'étudiant"""
@@ -391,30 +739,99 @@ class EnsiasdStudentApiMixin(models.Model):
             return []
 
         stages = self.env['ensiasd.stage'].search([('student_id', '=', self.id)])
+        return STAGE_SERIALIZER.serialize(stages)
 
-        result = []
-        for stage in stages:
-            result.append({
-                'id': stage.id,
-                'name': stage.name,
-                'sujet': stage.sujet if hasattr(stage, 'sujet') else None,
-                'type_stage': stage.type_stage if hasattr(stage, 'type_stage') else None,
-                'entreprise': {
-                    'id': stage.entreprise_id.id,
-                    'name': stage.entreprise_id.name,
-                    'city': stage.entreprise_id.city,
-                } if hasattr(stage, 'entreprise_id') and stage.entreprise_id else None,
-                'date_debut': stage.date_debut.isoformat() if hasattr(stage,
-                                                                      'date_debut') and stage.date_debut else None,
-                'date_fin': stage.date_fin.isoformat() if hasattr(stage, 'date_fin') and stage.date_fin else None,
-                'encadrant_interne': {
-                    'id': stage.encadrant_interne_id.id,
-                    'name': stage.encadrant_interne_id.name,
-                } if hasattr(stage, 'encadrant_interne_id') and stage.encadrant_interne_id else None,
-                'encadrant_externe': stage.encadrant_externe if hasattr(stage, 'encadrant_externe') else None,
-                'state': stage.state if hasattr(stage, 'state') else None,
-                'note_finale': stage.note_finale if hasattr(stage, 'note_finale') else None,
-                'mention': stage.mention if hasattr(stage, 'mention') else None,
-            })
+    # ========== VERSIONS (requêtes conditionnelles) ==========
 
-        return result
\ No newline at end of file
+    @api.model
+    def _get_api_version(self, model_name, domain):
+        """
+        Empreinte bon marché des données d'un domaine: (nombre de lignes,
+        dernière date de modification), calculée en une requête agrégée.
+        """
+        [(count, last_modified)] = self.env[model_name]._read_group(
+            domain, aggregates=['__count', 'write_date:max'])
+        return count, last_modified or None
+
+    def get_notes_api_version(self, annee_id=None, module_id=None):
+        self.ensure_one()
+        if 'ensiasd.note' not in self.env:
+            return 0, None
+        return self._get_api_version('ensiasd.note', self._get_notes_api_domain(annee_id, module_id))
+
+    def get_absences_api_version(self, annee_id=None, date_from=None, date_to=None):
+        self.ensure_one()
+        if 'ensiasd.absence' not in self.env:
+            return 0, None
+        return self._get_api_version(
+            'ensiasd.absence', self._get_absences_api_domain(annee_id, date_from, date_to))
+
+    def get_emploi_temps_api_version(self, date_from=None, date_to=None):
+        self.ensure_one()
+        if 'ensiasd.seance' not in self.env or not self.groupe_id:
+            return 0, None
+        return self._get_api_version(
+            'ensiasd.seance', self._get_emploi_temps_api_domain(date_from, date_to))
+
+    # ========== PAGINATION ==========
+
+    @api.model
+    def _empty_api_page(self):
+        return {'data': [], 'total': 0, 'next_cursor': None}
+
+    @api.model
+    def _paginate_api(self, model_name, domain, order, serializer,
+                      after=None, limit=None, fields=None):
+        """
+        Pagination par clé (keyset) sur `order`, liste de (champ, 'asc'|'desc')
+        se terminant par 'id' pour garantir un ordre total.
+
+        `after` est le curseur renvoyé par la page précédente, `fields` la liste
+        des clés à sérialiser (l'id est toujours inclus): les autres champs ne
+        sont pas lus. `serializer(records, keys, extra_fields)` produit les
+        éléments.
+        Retourne {'data', 'total', 'next_cursor'}; lève ValueError si le
+        curseur est invalide.
+        """
+        Model = self.env[model_name]
+        limit = min(max(int(limit or API_PAGE_SIZE), 1), API_MAX_PAGE_SIZE)
+
+        total = Model.search_count(domain)
+
+        page_domain = domain
+        if after:
+            values = decode_api_cursor(after)
+            if len(values) != len(order):
+                raise ValueError("Curseur invalide")
+            page_domain = expression.AND([domain, self._keyset_domain(order, values)])
+
+        order_by = ', '.join(f"{name} {direction}" for name, direction in order)
+        records = Model.search(page_domain, order=order_by, limit=limit + 1)
+
+        has_more = len(records) > limit
+        records = records[:limit]
+        # Seules les clés demandées sont lues; les champs de tri le sont aussi
+        # pour construire le curseur sans requête supplémentaire
+        data = serializer(records, keys=fields or None,
+                          extra_fields=[name for name, _direction in order])
+
+        next_cursor = None
+        if has_more:
+            last = records[-1]
+            next_cursor = encode_api_cursor([
+                None if last[name] is False else last[name]
+                for name, _direction in order
+            ])
+
+        return {'data': data, 'total': total, 'next_cursor': next_cursor}
+
+    @api.model
+    def _keyset_domain(self, order, values):
+        """Domaine « strictement après `values` » pour l'ordre donné"""
+        branches = []
+        for index, (name, direction) in enumerate(order):
+            operator = '>' if direction == 'asc' else '<'
+            branch = [(prev_name, '=', values[i]) for i, (prev_name, _d) in enumerate(order[:index])]
+            branch.append((name, operator, values[index]))
+            branches.append(expression.AND([branch]))
+        return expression.OR(branches)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import test_api_query_count
+from . import test_api_batch
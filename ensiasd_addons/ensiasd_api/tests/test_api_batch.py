@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import date
+from unittest.mock import patch
+
+from odoo.http import request
+from odoo.tests import HttpCase, tagged
+
+from ..controllers.main import EnsiasdApiController
+
+
+@tagged('post_install', '-at_install')
+class TestApiBatch(HttpCase):
+    """/api/v1/batch de bout en bout: handlers, savepoints et limitation"""
+
+    def setUp(self):
+        super().setUp()
+        annee = self.env['ensiasd.annee'].create({
+            'name': 'Batch 2094-2095',
+            'code': 'BATCH2094',
+            'date_debut': date(2094, 9, 1),
+            'date_fin': date(2095, 7, 31),
+        })
+        filiere = self.env['ensiasd.filiere'].create({'name': 'Filière batch', 'code': 'FBATCH'})
+        self.student = self.env['ensiasd.student'].create({
+            'name': 'Étudiant batch',
+            'cne': 'BATCHTEST01',
+            'filiere_id': filiere.id,
+            'niveau': '2',
+            'annee_inscription': annee.id,
+            'annee_courante_id': annee.id,
+            'api_enabled': False,
+        })
+        config = self.env['ensiasd.api.config'].sudo().get_config()
+        config.write({'rate_limit_backend': 'memory', 'max_requests_per_minute': 1000})
+        self.api_key = self.env['ensiasd.api.config'].get_config_values()['api_key']
+        self.token = self.env['ensiasd.api.token'].sudo().create_token(self.student.id)['token']
+
+    def _batch(self, sub_requests):
+        response = self.url_open(
+            '/api/v1/batch',
+            data=json.dumps({'requests': sub_requests}),
+            headers={
+                'Content-Type': 'application/json',
+                'X-API-Key': self.api_key,
+                'Authorization': f'Bearer {self.token}',
+            },
+        )
+        return response.status_code, response.json()
+
+    def test_batch_handlers(self):
+        status, body = self._batch([
+            {'id': 'profil', 'path': '/me'},
+            {'path': '/notes/summary'},
+            {'path': '/inconnu'},
+        ])
+        self.assertEqual(status, 200)
+        results = body['data']
+        self.assertEqual([result['status'] for result in results], [200, 200, 404])
+        self.assertEqual(results[0]['id'], 'profil')
+        self.assertEqual(results[0]['body']['data']['id'], self.student.id)
+
+    def test_batch_sql_error_isolated(self):
+        """Une erreur SQL d'une sous-requête n'interrompt pas les suivantes"""
+        def broken_annees(controller, params):
+            request.env.cr.execute("SELECT 1 / 0")
+
+        with patch.object(EnsiasdApiController, '_api_annees', broken_annees):
+            status, body = self._batch([{'path': '/annees'}, {'path': '/me'}])
+        self.assertEqual(status, 200)
+        self.assertEqual([result['status'] for result in body['data']], [500, 200])
+
+    def test_batch_rate_limit_counts_sub_requests(self):
+        """Chaque sous-requête compte pour la limite par étudiant"""
+        self.env['ensiasd.api.config'].sudo().get_config().write({'max_requests_per_minute': 3})
+        status, _body = self._batch([{'path': '/me'}] * 4)
+        self.assertEqual(status, 429)
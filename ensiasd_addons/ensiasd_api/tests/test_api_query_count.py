@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from datetime import date, timedelta
+
+from odoo.tests import TransactionCase, tagged
+
+from ..models import student_api_mixin
+
+
+@tagged('post_install', '-at_install')
+class TestApiQueryCount(TransactionCase):
+    """
+    Le nombre de requêtes des lectures de l'API ne doit pas dépendre du
+    nombre d'enregistrements: chaque test mesure une lecture sur un jeu de
+    données minimal, puis vérifie que la même lecture sur un jeu onze fois
+    plus grand n'en fait pas davantage (pas de N+1).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('ensiasd_absence.auto_notify_student', 'False')
+
+        cls.annee = cls.env['ensiasd.annee'].create({
+            'name': 'API 2090-2091',
+            'code': 'API2090',
+            'date_debut': date(2090, 9, 1),
+            'date_fin': date(2091, 7, 31),
+        })
+        cls.filiere = cls.env['ensiasd.filiere'].create({'name': 'Filière API', 'code': 'FAPI'})
+        cls.groupe = cls.env['ensiasd.groupe'].create({
+            'name': 'Groupe API',
+            'code': 'GAPI',
+            'niveau': '2',
+            'annee_id': cls.annee.id,
+        })
+        cls.salle = cls.env['ensiasd.salle'].create({'name': 'Salle API', 'code': 'SAPI'})
+        cls.enseignant = cls.env['hr.employee'].create({'name': 'Enseignant API', 'is_enseignant': True})
+        cls.session = cls.env['ensiasd.session'].create({
+            'code': 'SAPI-S3',
+            'annee_id': cls.annee.id,
+            'semestre': 'S3',
+            'date_debut': date(2091, 1, 10),
+            'date_fin': date(2091, 1, 30),
+        })
+        cls.student = cls.env['ensiasd.student'].create({
+            'name': 'Étudiant API',
+            'cne': 'APITEST001',
+            'filiere_id': cls.filiere.id,
+            'groupe_id': cls.groupe.id,
+            'niveau': '2',
+            'annee_inscription': cls.annee.id,
+            'annee_courante_id': cls.annee.id,
+            'api_enabled': False,
+        })
+        cls.module_count = 0
+        cls._add_modules(1)
+
+    @classmethod
+    def _add_modules(cls, count):
+        """Ajoute `count` modules avec élément, inscription, note, séance et absence"""
+        for _i in range(count):
+            cls.module_count += 1
+            index = cls.module_count
+            module = cls.env['ensiasd.module'].create({
+                'name': f'Module API {index}',
+                'code': f'MAPI{index}',
+                'filiere_id': cls.filiere.id,
+                'semestre': 'S3',
+            })
+            element = cls.env['ensiasd.element'].create({
+                'name': f'Élément API {index}',
+                'module_id': module.id,
+                'type_element': 'cm',
+                'enseignant_id': cls.enseignant.id,
+            })
+            inscription = cls.env['ensiasd.inscription'].create({
+                'student_id': cls.student.id,
+                'module_id': module.id,
+                'annee_id': cls.annee.id,
+                'state': 'validated',
+            })
+            cls.env['ensiasd.note'].create({
+                'inscription_id': inscription.id,
+                'session_id': cls.session.id,
+                'note_examen': 12.0,
+            })
+            seance = cls.env['ensiasd.seance'].create({
+                'element_id': element.id,
+                'date': date(2090, 10, 1) + timedelta(days=index),
+                'heure_debut': 8.5,
+                'heure_fin': 10.5,
+                'salle_id': cls.salle.id,
+                'enseignant_id': cls.enseignant.id,
+                'groupe_ids': [(6, 0, cls.groupe.ids)],
+            })
+            cls.env['ensiasd.absence'].create({
+                'student_id': cls.student.id,
+                'seance_id': seance.id,
+            })
+
+    def _count_queries(self, func):
+        self.env.flush_all()
+        self.env.invalidate_all()
+        count0 = self.cr.sql_log_count
+        func()
+        self.env.flush_all()
+        return self.cr.sql_log_count - count0
+
+    def assertConstantQueryCount(self, func):
+        """`func` ne fait pas plus de requêtes sur 11 modules que sur un seul"""
+        # Premier appel: caches du registre (configuration, droits, vues)
+        func()
+        student_api_mixin._notes_summary_cache.clear()
+        expected = self._count_queries(func)
+
+        self._add_modules(10)
+        student_api_mixin._notes_summary_cache.clear()
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(expected):
+            result = func()
+        return result
+
+    # ========== DÉTAIL ==========
+
+    def test_profile(self):
+        data = self.assertConstantQueryCount(
+            lambda: self.student.to_api_dict(include_details=True))
+        self.assertEqual(data['groupe']['id'], self.groupe.id)
+        self.assertEqual(data['annee_courante']['id'], self.annee.id)
+
+    # ========== LISTES ==========
+
+    def test_notes_page(self):
+        page = self.assertConstantQueryCount(lambda: self.student.get_notes_page_api())
+        self.assertEqual(len(page['data']), 11)
+        self.assertTrue(all(item['module'] for item in page['data']))
+
+    def test_notes_page_projection(self):
+        """Une projection ne lit pas les modules: moins de requêtes"""
+        full = self._count_queries(lambda: self.student.get_notes_page_api())
+        projected = self._count_queries(
+            lambda: self.student.get_notes_page_api(fields=['valeur']))
+        self.assertLess(projected, full)
+
+        page = self.assertConstantQueryCount(
+            lambda: self.student.get_notes_page_api(fields=['valeur']))
+        self.assertEqual(set(page['data'][0]), {'id', 'valeur'})
+
+    def test_notes_summary(self):
+        summary = self.assertConstantQueryCount(lambda: self.student.get_notes_summary_api())
+        self.assertEqual(len(summary), 11)
+
+    def test_absences_page(self):
+        page = self.assertConstantQueryCount(lambda: self.student.get_absences_page_api())
+        self.assertEqual(len(page['data']), 11)
+        self.assertTrue(all(item['seance'] for item in page['data']))
+
+    def test_emploi_temps_page(self):
+        page = self.assertConstantQueryCount(lambda: self.student.get_emploi_temps_page_api())
+        self.assertEqual(len(page['data']), 11)
+        self.assertTrue(all(item['module'] and item['salle'] for item in page['data']))
+
+    def test_inscriptions(self):
+        inscriptions = self.assertConstantQueryCount(lambda: self.student.get_inscriptions_api())
+        self.assertEqual(len(inscriptions), 11)
+
+    # ========== BATCH ==========
+
+    def test_batch_home_screen(self):
+        """Lectures de l'écran d'accueil regroupées par /batch, dans un même environnement"""
+        def home_screen():
+            return (
+                self.student.to_api_dict(include_details=True),
+                self.student.get_notes_summary_api(),
+                self.student.get_absences_summary_api(),
+                self.student.get_emploi_temps_page_api(),
+            )
+
+        profile, notes_summary, absences_summary, emploi_temps = \
+            self.assertConstantQueryCount(home_screen)
+        self.assertEqual(profile['id'], self.student.id)
+        self.assertEqual(len(notes_summary), 11)
+        self.assertEqual(absences_summary['total'], 11)
+        self.assertEqual(len(emploi_temps['data']), 11)
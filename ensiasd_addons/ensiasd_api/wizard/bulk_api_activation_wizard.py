@@ -63,7 +63,8 @@ class BulkApiActivationWizard(models.TransientModel):
         for wizard in self:
             wizard.total_students = len(wizard.student_ids)
             wizard.with_cne_cin = len(wizard.student_ids.filtered(lambda s: s.cne and s.cin))
-            wizard.without_password = len(wizard.student_ids.filtered(lambda s: not s.api_password_hash))
+            wizard.without_password = len(wizard.student_ids.filtered(
+                lambda s: not s.api_password_hash and not s.api_password_auto))
             wizard.already_active = len(wizard.student_ids.filtered(lambda s: s.api_enabled))
 
     def action_activate(self):
@@ -97,18 +98,18 @@ class BulkApiActivationWizard(models.TransientModel):
                 if self.regenerate_passwords:
                     if self.only_missing_passwords:
                         # Seulement si pas de mot de passe
-                        should_generate = not student.api_password_hash
+                        should_generate = not student.api_password_hash and not student.api_password_auto
                     else:
                         # Toujours régénérer
                         should_generate = True
 
                 if should_generate:
-                    password = student._generate_auto_password(student.cne, student.cin)
-                    student.set_api_password(password)
+                    # Mot de passe par défaut, haché à la première connexion
+                    student.reset_api_password()
 
                     # Logger dans le chatter
                     student.message_post(
-                        body=f"Mot de passe API généré automatiquement (CNE+CIN)",
+                        body=f"Mot de passe API par défaut activé (CNE+CIN)",
                         subject="Activation API en masse"
                     )
 
@@ -173,7 +174,7 @@ class BulkApiActivationWizard(models.TransientModel):
                 student.email or '',
                 student.cne,  # Login = CNE
                 password,
-                'Actif' if student.api_password_hash else 'Non configuré'
+                'Actif' if student.api_password_hash or student.api_password_auto else 'Non configuré'
             ])
 
         # Créer le fichier
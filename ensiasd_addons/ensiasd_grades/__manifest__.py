@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'ENSIASD Notes & Évaluations',
-    'version': '17.0.2.0.1',
+    'version': '17.0.2.0.2',
     'category': 'Education',
     'summary': 'Gestion complète des notes, moyennes, délibérations et bulletins',
     'description': """
@@ -41,6 +41,7 @@ Ce module offre une gestion complète du système de notation :
         # Data
         'data/sequence_data.xml',
         'data/grades_data.xml',
+        'data/cron_data.xml',
         # Views
         'views/ensiasd_session_views.xml',
         'views/ensiasd_bareme_views.xml',
@@ -49,6 +50,9 @@ Ce module offre une gestion complète du système de notation :
         'views/ensiasd_resultat_views.xml',
         'views/ensiasd_deliberation_views.xml',
         'views/ensiasd_bulletin_views.xml',
+        'views/ensiasd_bulletin_job_views.xml',
+        'views/ensiasd_report_print_job_views.xml',
+        'views/ensiasd_grade_stat_views.xml',
         'views/dashboard_views.xml',
         'views/ensiasd_menu.xml',
         # Wizards
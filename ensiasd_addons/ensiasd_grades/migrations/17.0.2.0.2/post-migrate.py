@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from odoo import api, SUPERUSER_ID
+from odoo.tools import split_every
+
+from odoo.addons.ensiasd_grades.models.ensiasd_note import ELEMENT_AGGREGATE_TYPES
+
+BATCH_SIZE = 1000
+
+
+def migrate(cr, version):
+    """
+    Initialise une seule fois les agrégats des notes par élément (cc_sum,
+    cc_count, ..., absent_count) de toutes les notes existantes, en SQL et
+    sans recalcul: les variations appliquées ensuite par les saisies partent
+    ainsi des bons agrégats, y compris sur une note verrouillée ou délibérée
+    rouverte plus tard.
+
+    Les notes CC, finale, résultat et mention ne sont ensuite recalculées que
+    pour les notes dont les agrégats ont changé, non verrouillées et d'un
+    résultat ni validé ni verrouillé: les notes délibérées restent celles
+    du jury.
+    """
+    if not version:
+        return
+
+    aggregates = []
+    for group, types in ELEMENT_AGGREGATE_TYPES.items():
+        condition = cr.mogrify("e.type_eval IN %s", (types,)).decode()
+        aggregates += [
+            f"ROUND(COALESCE(SUM(e.valeur) FILTER (WHERE {condition}), 0)::numeric, 6) AS {group}_sum",
+            f"COUNT(e.id) FILTER (WHERE {condition}) AS {group}_count",
+        ]
+    aggregates.append("COUNT(e.id) FILTER (WHERE e.is_absent) AS absent_count")
+    names = [f'{group}_{kind}' for group in ELEMENT_AGGREGATE_TYPES for kind in ('sum', 'count')]
+    names.append('absent_count')
+
+    cr.execute(f"""
+        UPDATE ensiasd_note n
+           SET {', '.join(f'{name} = a.{name}' for name in names)}
+          FROM (
+              SELECT n.id, {', '.join(aggregates)}
+                FROM ensiasd_note n
+                LEFT JOIN ensiasd_note_element e ON e.inscription_id = n.inscription_id
+               GROUP BY n.id
+          ) a
+         WHERE n.id = a.id
+           AND ({' OR '.join(f'n.{name} IS DISTINCT FROM a.{name}' for name in names)})
+     RETURNING n.id
+    """)
+    changed_ids = tuple(row[0] for row in cr.fetchall())
+    if not changed_ids:
+        return
+
+    cr.execute("""
+        SELECT n.id
+          FROM ensiasd_note n
+         WHERE n.id IN %s
+           AND COALESCE(n.state, 'draft') != 'locked'
+           AND NOT EXISTS (
+                   SELECT 1
+                     FROM resultat_note_rel rel
+                     JOIN ensiasd_resultat r ON r.id = rel.resultat_id
+                    WHERE rel.note_id = n.id
+                      AND r.state IN ('validated', 'locked')
+               )
+         ORDER BY n.id
+    """, (changed_ids,))
+    note_ids = [row[0] for row in cr.fetchall()]
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Note = env['ensiasd.note'].with_context(tracking_disable=True)
+    for batch_ids in split_every(BATCH_SIZE, note_ids):
+        Note.browse(batch_ids).modified(names)
+        env.flush_all()
+        env.invalidate_all()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+from . import ensiasd_report_cache
 from . import ensiasd_session
 from . import ensiasd_bareme
 from . import ensiasd_note_element
@@ -7,5 +8,9 @@ from . import ensiasd_note
 from . import ensiasd_resultat
 from . import ensiasd_deliberation
 from . import ensiasd_bulletin
+from . import ensiasd_grade_stat
+from . import ensiasd_bulletin_job
+from . import ensiasd_report_print_job
 from . import ensiasd_inscription_extend
 from . import ensiasd_student_extend
+from . import ir_actions_report
@@ -1,7 +1,18 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError
 
+# Champs du barème utilisés par le calcul des notes
+BAREME_VALUE_FIELDS = (
+    'poids_cc',
+    'poids_examen',
+    'poids_tp',
+    'poids_projet',
+    'note_eliminatoire',
+    'note_validation',
+    'note_rattrapage_remplace',
+)
+
 
 class EnsiasdBareme(models.Model):
     """
@@ -146,6 +157,100 @@ class EnsiasdBareme(models.Model):
             })
         return bareme
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if set(vals) & set(BAREME_VALUE_FIELDS + ('module_id', 'annee_id', 'active')):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache('annee_id')
+    def _get_bareme_values_by_annee(self, annee_id):
+        """
+        Valeurs des barèmes actifs d'une année, par module, mises en cache par
+        worker. Le cache est vidé via le registre (signalé à tous les workers)
+        à chaque création, modification ou suppression d'un barème. Le
+        dictionnaire retourné est partagé: il ne doit pas être modifié.
+        """
+        rows = self.sudo().search_read(
+            [('annee_id', '=', annee_id)],
+            ['module_id', *BAREME_VALUE_FIELDS],
+            load=None,
+        )
+        return {row['module_id']: row for row in rows}
+
+    @api.model
+    def _get_default_bareme_values(self):
+        """Valeurs d'un barème par défaut, sans le créer"""
+        return {
+            name: self._fields[name].default(self) if self._fields[name].default else False
+            for name in BAREME_VALUE_FIELDS
+        }
+
+    @api.model
+    def get_bareme_values_map(self, keys):
+        """
+        Valeurs des barèmes pour un ensemble de couples (module_id, annee_id).
+
+        Lecture seule: un module sans barème pour l'année prend les valeurs
+        par défaut, sans création (voir seed_default_baremes). Une requête au
+        plus par année absente du cache.
+
+        Returns:
+            dict: (module_id, annee_id) -> {champ: valeur} (BAREME_VALUE_FIELDS)
+        """
+        result = {}
+        defaults = None
+        for module_id, annee_id in set(keys):
+            values = self._get_bareme_values_by_annee(annee_id).get(module_id)
+            if values is None:
+                if defaults is None:
+                    defaults = self._get_default_bareme_values()
+                values = defaults
+            result[(module_id, annee_id)] = values
+        return result
+
+    @api.model
+    def seed_default_baremes(self, annee_ids):
+        """
+        Crée en une passe les barèmes par défaut manquants des modules ayant
+        des inscriptions sur ces années. À appeler avant la saisie, pour que
+        le calcul des notes n'ait jamais à écrire de barème.
+
+        Returns:
+            ensiasd.bareme: les barèmes créés
+        """
+        annee_ids = list(annee_ids)
+        if not annee_ids:
+            return self.browse()
+
+        pairs = self.env['ensiasd.inscription'].sudo()._read_group(
+            [('annee_id', 'in', annee_ids), ('module_id', '!=', False)],
+            ['module_id', 'annee_id'],
+        )
+        # Les barèmes archivés comptent: la contrainte d'unicité les inclut
+        existing = {
+            (row['module_id'], row['annee_id'])
+            for row in self.sudo().with_context(active_test=False).search_read(
+                [('annee_id', 'in', annee_ids)], ['module_id', 'annee_id'], load=None)
+        }
+        return self.sudo().create([{
+            'name': f"Barème {module.code}",
+            'module_id': module.id,
+            'annee_id': annee.id,
+        } for module, annee in pairs if (module.id, annee.id) not in existing])
+
     def copy_to_next_year(self, new_annee_id):
         """Copier le barème pour une nouvelle année"""
         return self.copy({
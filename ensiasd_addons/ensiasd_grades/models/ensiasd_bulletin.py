@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 
@@ -10,7 +12,7 @@ class EnsiasdBulletin(models.Model):
     """
     _name = 'ensiasd.bulletin'
     _description = 'Bulletin de notes'
-    _inherit = ['mail.thread']
+    _inherit = ['mail.thread', 'ensiasd.report.cache.mixin']
     _order = 'date_generation desc, student_id'
 
     name = fields.Char(
@@ -162,46 +164,53 @@ class EnsiasdBulletin(models.Model):
 
     @api.depends('student_id', 'annee_id', 'type_bulletin')
     def _compute_resultat(self):
-        """Trouver le résultat correspondant"""
+        """Trouver le résultat correspondant (une requête pour tout le lot)"""
+        records = self.filtered(lambda r: r.student_id and r.annee_id and r.type_bulletin)
+        resultats = {}
+        if records:
+            for resultat in self.env['ensiasd.resultat'].search([
+                ('student_id', 'in', records.student_id.ids),
+                ('annee_id', 'in', records.annee_id.ids),
+                ('type_resultat', 'in', list({
+                    r.type_bulletin if r.type_bulletin != 'annuel' else 'annee' for r in records
+                })),
+            ]):
+                key = (resultat.student_id.id, resultat.annee_id.id, resultat.type_resultat)
+                resultats.setdefault(key, resultat)
+        
         for record in self:
-            if not all([record.student_id, record.annee_id, record.type_bulletin]):
+            if record not in records:
                 record.resultat_id = False
                 continue
-            
             type_res = record.type_bulletin if record.type_bulletin != 'annuel' else 'annee'
-            resultat = self.env['ensiasd.resultat'].search([
-                ('student_id', '=', record.student_id.id),
-                ('annee_id', '=', record.annee_id.id),
-                ('type_resultat', '=', type_res),
-            ], limit=1)
-            record.resultat_id = resultat
+            record.resultat_id = resultats.get(
+                (record.student_id.id, record.annee_id.id, type_res), False)
 
     @api.depends('student_id', 'annee_id', 'type_bulletin', 'filiere_id')
     def _compute_lines(self):
-        """Générer les lignes du bulletin"""
-        for record in self:
-            if not all([record.student_id, record.annee_id, record.type_bulletin]):
-                continue
-            
-            # Supprimer les anciennes lignes
-            record.line_ids.unlink()
-            
-            # Rechercher les notes
-            domain = [
-                ('student_id', '=', record.student_id.id),
-                ('annee_id', '=', record.annee_id.id),
-            ]
-            
-            if record.type_bulletin != 'annuel':
-                domain.append(('semestre', '=', record.type_bulletin))
-            
-            if record.filiere_id:
-                domain.append(('filiere_id', '=', record.filiere_id.id))
-            
-            notes = self.env['ensiasd.note'].search(domain)
-            
+        """Générer les lignes du bulletin (une recherche de notes pour tout le lot)"""
+        records = self.filtered(lambda r: r.student_id and r.annee_id and r.type_bulletin)
+        if not records:
+            return
+        
+        # Supprimer les anciennes lignes
+        records.line_ids.unlink()
+        
+        # Rechercher les notes de tous les bulletins
+        notes_by_student = defaultdict(list)
+        for note in self.env['ensiasd.note'].search([
+            ('student_id', 'in', records.student_id.ids),
+            ('annee_id', 'in', records.annee_id.ids),
+        ]):
+            notes_by_student[(note.student_id.id, note.annee_id.id)].append(note)
+        
+        for record in records:
             lines = []
-            for note in notes:
+            for note in notes_by_student[(record.student_id.id, record.annee_id.id)]:
+                if record.type_bulletin != 'annuel' and note.semestre != record.type_bulletin:
+                    continue
+                if record.filiere_id and note.filiere_id != record.filiere_id:
+                    continue
                 lines.append((0, 0, {
                     'bulletin_id': record.id,
                     'note_id': note.id,
@@ -271,9 +280,10 @@ class EnsiasdBulletin(models.Model):
         self._compute_mention()
         
         # Récupérer la décision du résultat
-        if self.resultat_id:
-            self.decision = self.resultat_id.decision
-            self.rang = self.resultat_id.rang
+        for record in self:
+            if record.resultat_id:
+                record.decision = record.resultat_id.decision
+                record.rang = record.resultat_id.rang
         
         self.write({
             'state': 'generated',
@@ -286,49 +296,77 @@ class EnsiasdBulletin(models.Model):
 
     def action_print(self):
         """Imprimer le bulletin"""
-        self.write({'state': 'printed'})
+        # Ne pas réécrire un bulletin déjà imprimé: son PDF en cache reste valide
+        self.filtered(lambda r: r.state != 'printed').write({'state': 'printed'})
         return self.env.ref('ensiasd_grades.action_report_bulletin').report_action(self)
 
+    def _get_report_cache_sources(self):
+        """Le bulletin, ses lignes et les notes, modules et résultat imprimés"""
+        return [
+            self,
+            self.student_id,
+            self.resultat_id,
+            self.line_ids,
+            self.line_ids.note_id,
+            self.line_ids.module_id,
+        ]
+
     def action_reset_draft(self):
         """Remettre en brouillon"""
         self.write({'state': 'draft'})
 
     @api.model
-    def generate_bulletins_batch(self, annee_id, type_bulletin, filiere_id=None):
-        """Générer les bulletins en lot"""
-        domain = [
+    def _get_batch_students(self, annee_id, filiere_id=None):
+        """Étudiants concernés par une génération en lot"""
+        students = self.env['ensiasd.student'].search([
             ('annee_courante_id', '=', annee_id),
             ('state', '=', 'actif'),
-        ]
-        
-        students = self.env['ensiasd.student'].search(domain)
-        bulletins = self.env['ensiasd.bulletin']
+        ])
+        if not filiere_id:
+            return students
+        return students.filtered(lambda student: not (
+            hasattr(student.groupe_id, 'filiere_id')
+            and student.groupe_id.filiere_id
+            and student.groupe_id.filiere_id.id != filiere_id
+        ))
+
+    @api.model
+    def _generate_bulletins_for_students(self, students, annee_id, type_bulletin, filiere_id=None):
+        """
+        Crée les bulletins manquants de ces étudiants et (re)génère tous leurs
+        bulletins. Idempotent: relancer sur les mêmes étudiants ne crée pas de
+        doublon.
+        """
+        existing = {}
+        for bulletin in self.search([
+            ('student_id', 'in', students.ids),
+            ('annee_id', '=', annee_id),
+            ('type_bulletin', '=', type_bulletin),
+        ]):
+            existing.setdefault(bulletin.student_id.id, bulletin)
         
+        vals_list = []
         for student in students:
-            filiere = student.groupe_id.filiere_id if hasattr(student.groupe_id, 'filiere_id') else False
-            if filiere_id and filiere and filiere.id != filiere_id:
+            if student.id in existing:
                 continue
-            
-            existing = self.search([
-                ('student_id', '=', student.id),
-                ('annee_id', '=', annee_id),
-                ('type_bulletin', '=', type_bulletin),
-            ], limit=1)
-            
-            if not existing:
-                bulletin = self.create({
-                    'student_id': student.id,
-                    'annee_id': annee_id,
-                    'type_bulletin': type_bulletin,
-                    'filiere_id': filiere.id if filiere else filiere_id,
-                })
-                bulletins |= bulletin
-            else:
-                bulletins |= existing
+            filiere = student.groupe_id.filiere_id if hasattr(student.groupe_id, 'filiere_id') else False
+            vals_list.append({
+                'student_id': student.id,
+                'annee_id': annee_id,
+                'type_bulletin': type_bulletin,
+                'filiere_id': filiere.id if filiere else filiere_id,
+            })
         
+        bulletins = self.browse([bulletin.id for bulletin in existing.values()]) | self.create(vals_list)
         bulletins.action_generate()
         return bulletins
 
+    @api.model
+    def generate_bulletins_batch(self, annee_id, type_bulletin, filiere_id=None):
+        """Générer les bulletins en lot (synchrone, voir ensiasd.bulletin.job)"""
+        students = self._get_batch_students(annee_id, filiere_id)
+        return self._generate_bulletins_for_students(students, annee_id, type_bulletin, filiere_id)
+
 
 class EnsiasdBulletinLine(models.Model):
     """
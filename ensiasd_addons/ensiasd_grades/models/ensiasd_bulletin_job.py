@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# Nombre d'étudiants par lot
+BULLETIN_CHUNK_SIZE = 50
+
+# Crons de génération: chacun réserve et traite les lots un à un (SKIP
+# LOCKED); les workers cron d'Odoo (max_cron_threads, des processus en mode
+# prefork) les exécutent en parallèle, sans partager le GIL d'un processus
+BULLETIN_JOB_CRONS = (
+    'ensiasd_grades.ir_cron_process_bulletin_jobs',
+    'ensiasd_grades.ir_cron_process_bulletin_jobs_2',
+    'ensiasd_grades.ir_cron_process_bulletin_jobs_3',
+    'ensiasd_grades.ir_cron_process_bulletin_jobs_4',
+)
+
+# Durée maximale d'une exécution du cron; le cron se relance s'il reste du travail
+BULLETIN_JOB_TIME_LIMIT = 240
+
+# Un lot « en cours » depuis plus longtemps est considéré abandonné (worker
+# arrêté) et remis en attente
+BULLETIN_CHUNK_TIMEOUT = 900
+
+# Nombre de tentatives avant de marquer un lot en échec
+BULLETIN_CHUNK_MAX_ATTEMPTS = 3
+
+
+class EnsiasdBulletinJob(models.Model):
+    """
+    Génération de bulletins en arrière-plan
+
+    Les étudiants sont répartis en lots traités par les crons de génération,
+    en parallèle (un processus cron par cron), chacun dans sa propre
+    transaction. Un lot terminé n'est pas refait: une
+    génération interrompue reprend là où elle s'est arrêtée.
+    """
+    _name = 'ensiasd.bulletin.job'
+    _description = 'Génération de bulletins en arrière-plan'
+    _inherit = ['mail.thread']
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Nom', compute='_compute_name', store=True)
+
+    annee_id = fields.Many2one(
+        'ensiasd.annee',
+        string='Année académique',
+        required=True
+    )
+
+    filiere_id = fields.Many2one(
+        'ensiasd.filiere',
+        string='Filière'
+    )
+
+    type_bulletin = fields.Selection([
+        ('S1', 'Semestre 1'),
+        ('S2', 'Semestre 2'),
+        ('S3', 'Semestre 3'),
+        ('S4', 'Semestre 4'),
+        ('S5', 'Semestre 5'),
+        ('S6', 'Semestre 6'),
+        ('annuel', 'Annuel'),
+    ], string='Type', required=True)
+
+    state = fields.Selection([
+        ('draft', 'Brouillon'),
+        ('queued', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'En échec'),
+    ], string='État', default='draft', tracking=True)
+
+    chunk_ids = fields.One2many(
+        'ensiasd.bulletin.job.chunk',
+        'job_id',
+        string='Lots'
+    )
+
+    student_count = fields.Integer(string='Étudiants', readonly=True)
+    chunk_count = fields.Integer(string='Lots', compute='_compute_progress')
+    chunk_done_count = fields.Integer(string='Lots terminés', compute='_compute_progress')
+    bulletin_count = fields.Integer(string='Bulletins générés', compute='_compute_progress')
+    progress = fields.Float(string='Progression (%)', compute='_compute_progress')
+
+    date_start = fields.Datetime(string='Début', readonly=True)
+    date_end = fields.Datetime(string='Fin', readonly=True)
+
+    @api.depends('annee_id', 'filiere_id', 'type_bulletin')
+    def _compute_name(self):
+        for record in self:
+            parts = [record.annee_id.name, record.filiere_id.name, record.type_bulletin]
+            record.name = " - ".join(part for part in parts if part) or "Nouvelle génération"
+
+    @api.depends('chunk_ids.state', 'chunk_ids.bulletin_count')
+    def _compute_progress(self):
+        for record in self:
+            chunks = record.chunk_ids
+            done = chunks.filtered(lambda c: c.state == 'done')
+            record.chunk_count = len(chunks)
+            record.chunk_done_count = len(done)
+            record.bulletin_count = sum(done.mapped('bulletin_count'))
+            record.progress = 100.0 * len(done) / len(chunks) if chunks else 0.0
+
+    def action_start(self):
+        """Découper en lots (une seule fois) et mettre en file d'attente"""
+        for record in self:
+            if record.state not in ('draft', 'failed'):
+                raise UserError("Cette génération est déjà lancée!")
+
+            if not record.chunk_ids:
+                students = self.env['ensiasd.bulletin']._get_batch_students(
+                    record.annee_id.id, record.filiere_id.id)
+                ids = students.ids
+                self.env['ensiasd.bulletin.job.chunk'].create([{
+                    'job_id': record.id,
+                    'sequence': index,
+                    'student_ids': [(6, 0, ids[start:start + BULLETIN_CHUNK_SIZE])],
+                } for index, start in enumerate(range(0, len(ids), BULLETIN_CHUNK_SIZE))])
+                record.student_count = len(ids)
+            else:
+                # Reprise: seuls les lots non terminés sont relancés
+                record.chunk_ids.filtered(lambda c: c.state == 'failed').write({
+                    'state': 'pending',
+                    'attempts': 0,
+                    'error': False,
+                })
+
+        self.write({'state': 'queued', 'date_end': False})
+        self.filtered(lambda r: not r.chunk_ids.filtered(lambda c: c.state != 'done'))._update_state()
+        self._trigger_crons()
+
+    @api.model
+    def _trigger_crons(self):
+        """Déclenche tous les crons de génération"""
+        for xmlid in BULLETIN_JOB_CRONS:
+            cron = self.env.ref(xmlid, raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    def action_view_bulletins(self):
+        """Afficher les bulletins de la génération"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Bulletins générés',
+            'res_model': 'ensiasd.bulletin',
+            'view_mode': 'tree,form',
+            'domain': [
+                ('student_id', 'in', self.chunk_ids.student_ids.ids),
+                ('annee_id', '=', self.annee_id.id),
+                ('type_bulletin', '=', self.type_bulletin),
+            ],
+            'target': 'current',
+        }
+
+    def _update_state(self):
+        """Met à jour l'état des générations selon celui de leurs lots"""
+        for record in self:
+            states = set(record.chunk_ids.mapped('state'))
+            if states <= {'done'}:
+                record.write({'state': 'done', 'date_end': fields.Datetime.now()})
+            elif states <= {'done', 'failed'}:
+                record.write({'state': 'failed', 'date_end': fields.Datetime.now()})
+            elif 'running' in states or 'done' in states:
+                if record.state != 'running':
+                    record.write({'state': 'running', 'date_start': record.date_start or fields.Datetime.now()})
+
+    @api.model
+    def _cron_process_jobs(self):
+        """
+        Traite les lots en attente, un à la fois, jusqu'à épuisement ou
+        BULLETIN_JOB_TIME_LIMIT; se relance s'il en reste. Exécuté par
+        chacun des crons de BULLETIN_JOB_CRONS en parallèle.
+        """
+        Chunk = self.env['ensiasd.bulletin.job.chunk']
+        cr = self.env.cr
+        started = time.monotonic()
+
+        # Lots abandonnés par un worker arrêté en cours de traitement (mémoire,
+        # limite de temps): remis en attente, ou en échec après
+        # BULLETIN_CHUNK_MAX_ATTEMPTS tentatives pour ne pas relancer
+        # indéfiniment un lot qui arrête son worker
+        cr.execute("""
+            UPDATE ensiasd_bulletin_job_chunk
+               SET state = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+                   error = CASE WHEN attempts >= %(max_attempts)s
+                                THEN 'Traitement interrompu (worker arrêté)' ELSE error END,
+                   date_end = CASE WHEN attempts >= %(max_attempts)s
+                                   THEN NOW() AT TIME ZONE 'UTC' ELSE date_end END
+             WHERE state = 'running'
+               AND date_start < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => %(timeout)s)
+         RETURNING job_id
+        """, {'max_attempts': BULLETIN_CHUNK_MAX_ATTEMPTS, 'timeout': BULLETIN_CHUNK_TIMEOUT})
+        stale_jobs = self.browse({row[0] for row in cr.fetchall()})
+        if stale_jobs:
+            Chunk.invalidate_model(['state', 'error', 'date_end'])
+            stale_jobs._update_state()
+        cr.commit()
+
+        dbname, uid, context = cr.dbname, self.env.uid, dict(self.env.context)
+        while time.monotonic() - started < BULLETIN_JOB_TIME_LIMIT:
+            chunk_ids = Chunk._claim(1)
+            if not chunk_ids:
+                break
+            job = Chunk.browse(chunk_ids).job_id
+            job._update_state()
+            cr.commit()
+
+            Chunk._process_in_new_cursor(dbname, uid, context, chunk_ids[0])
+
+            job.invalidate_recordset()
+            job.chunk_ids.invalidate_recordset()
+            job._update_state()
+            cr.commit()
+
+        if Chunk.search_count([('state', '=', 'pending')]):
+            self._trigger_crons()
+
+
+class EnsiasdBulletinJobChunk(models.Model):
+    """
+    Lot d'étudiants d'une génération de bulletins
+    """
+    _name = 'ensiasd.bulletin.job.chunk'
+    _description = 'Lot de génération de bulletins'
+    _order = 'job_id, sequence'
+
+    job_id = fields.Many2one(
+        'ensiasd.bulletin.job',
+        string='Génération',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    sequence = fields.Integer(string='Séquence')
+
+    student_ids = fields.Many2many(
+        'ensiasd.student',
+        'ensiasd_bulletin_job_chunk_student_rel',
+        'chunk_id',
+        'student_id',
+        string='Étudiants'
+    )
+
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'En échec'),
+    ], string='État', default='pending', required=True, index=True)
+
+    attempts = fields.Integer(string='Tentatives', default=0)
+    bulletin_count = fields.Integer(string='Bulletins', default=0)
+    error = fields.Text(string='Erreur')
+    date_start = fields.Datetime(string='Début')
+    date_end = fields.Datetime(string='Fin')
+
+    @api.model
+    def _claim(self, limit):
+        """
+        Réserve jusqu'à `limit` lots en attente. SKIP LOCKED: deux exécutions
+        concurrentes ne réservent jamais le même lot.
+        """
+        self.env.cr.execute("""
+            UPDATE ensiasd_bulletin_job_chunk
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   date_start = NOW() AT TIME ZONE 'UTC'
+             WHERE id IN (
+                 SELECT c.id
+                   FROM ensiasd_bulletin_job_chunk c
+                   JOIN ensiasd_bulletin_job j ON j.id = c.job_id
+                  WHERE c.state = 'pending'
+                    AND j.state IN ('queued', 'running')
+                  ORDER BY c.job_id, c.sequence
+                  LIMIT %s
+                    FOR UPDATE OF c SKIP LOCKED
+             )
+         RETURNING id
+        """, (limit,))
+        chunk_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.browse(chunk_ids).invalidate_recordset(['state', 'attempts', 'date_start'])
+        return chunk_ids
+
+    @api.model
+    def _process_in_new_cursor(self, dbname, uid, context, chunk_id):
+        """
+        Traite un lot dans sa propre transaction.
+
+        Ne lève jamais: une erreur du traitement comme du commit (conflit de
+        sérialisation, par exemple) annule la transaction du lot et est
+        enregistrée dans une nouvelle transaction, pour que le lot ne reste
+        pas « en cours » jusqu'à BULLETIN_CHUNK_TIMEOUT.
+        """
+        try:
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                env['ensiasd.bulletin.job.chunk'].browse(chunk_id)._process()
+        except Exception as e:
+            _logger.exception("Génération de bulletins: échec du lot %s", chunk_id)
+            self._record_failure(dbname, uid, context, chunk_id, e)
+
+    @api.model
+    def _record_failure(self, dbname, uid, context, chunk_id, error):
+        """Remet le lot en attente (ou en échec) dans une nouvelle transaction"""
+        try:
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                chunk = env['ensiasd.bulletin.job.chunk'].browse(chunk_id)
+                chunk.write({
+                    'state': 'failed' if chunk.attempts >= BULLETIN_CHUNK_MAX_ATTEMPTS else 'pending',
+                    'error': str(error),
+                    'date_end': fields.Datetime.now(),
+                })
+        except Exception:
+            # Le lot sera remis en attente après BULLETIN_CHUNK_TIMEOUT
+            _logger.exception("Génération de bulletins: impossible d'enregistrer l'échec du lot %s", chunk_id)
+
+    def _process(self):
+        """Génère les bulletins des étudiants du lot"""
+        self.ensure_one()
+        job = self.job_id
+        bulletins = self.env['ensiasd.bulletin']._generate_bulletins_for_students(
+            self.student_ids,
+            job.annee_id.id,
+            job.type_bulletin,
+            job.filiere_id.id or None,
+        )
+        self.write({
+            'state': 'done',
+            'bulletin_count': len(bulletins),
+            'error': False,
+            'date_end': fields.Datetime.now(),
+        })
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 from datetime import datetime
@@ -173,41 +175,49 @@ class EnsiasdDeliberation(models.Model):
 
     @api.depends('resultat_ids', 'resultat_ids.note_ids')
     def _compute_notes(self):
-        """Récupérer les notes liées aux résultats"""
+        """Récupérer les notes liées aux résultats (une requête)"""
+        note_ids = {record.id: [] for record in self}
+        deliberation_ids = tuple(record.id for record in self if isinstance(record.id, int))
+        if deliberation_ids:
+            self.env['ensiasd.resultat'].flush_model(['deliberation_id', 'note_ids'])
+            self.env.cr.execute("""
+                SELECT DISTINCT r.deliberation_id, rel.note_id
+                  FROM ensiasd_resultat r
+                  JOIN resultat_note_rel rel ON rel.resultat_id = r.id
+                 WHERE r.deliberation_id IN %s
+            """, (deliberation_ids,))
+            for deliberation_id, note_id in self.env.cr.fetchall():
+                note_ids[deliberation_id].append(note_id)
         for record in self:
-            notes = self.env['ensiasd.note']
-            for resultat in record.resultat_ids:
-                notes |= resultat.note_ids
-            record.note_ids = notes
+            record.note_ids = self.env['ensiasd.note'].browse(note_ids[record.id])
 
     @api.depends('resultat_ids', 'resultat_ids.decision', 'resultat_ids.moyenne_ponderee')
     def _compute_statistics(self):
-        """Calculer les statistiques"""
-        for record in self:
-            resultats = record.resultat_ids
-            if not resultats:
-                record.nb_etudiants = 0
-                record.nb_admis = 0
-                record.nb_ajournes = 0
-                record.nb_rattrapage = 0
-                record.taux_reussite = 0.0
-                record.moyenne_promo = 0.0
-                continue
+        """Calculer les statistiques (une requête groupée pour toutes les délibérations)"""
+        stats = defaultdict(lambda: {'count': 0, 'sum': 0.0, 'decisions': defaultdict(int)})
+        deliberation_ids = [record.id for record in self if isinstance(record.id, int)]
+        if deliberation_ids:
+            for deliberation, decision, count, moyenne_sum in self.env['ensiasd.resultat']._read_group(
+                [('deliberation_id', 'in', deliberation_ids)],
+                ['deliberation_id', 'decision'],
+                ['__count', 'moyenne_ponderee:sum'],
+            ):
+                data = stats[deliberation.id]
+                data['count'] += count
+                data['sum'] += moyenne_sum
+                data['decisions'][decision] += count
 
-            record.nb_etudiants = len(resultats)
-            record.nb_admis = len(resultats.filtered(
-                lambda r: r.decision in ['admis', 'admis_compensation']
-            ))
-            record.nb_ajournes = len(resultats.filtered(
-                lambda r: r.decision in ['ajourne', 'redoublant', 'exclus']
-            ))
-            record.nb_rattrapage = len(resultats.filtered(
-                lambda r: r.decision == 'rattrapage'
-            ))
+        for record in self:
+            data = stats[record.id] if isinstance(record.id, int) else stats[None]
+            decisions = data['decisions']
+            record.nb_etudiants = data['count']
+            record.nb_admis = decisions['admis'] + decisions['admis_compensation']
+            record.nb_ajournes = decisions['ajourne'] + decisions['redoublant'] + decisions['exclus']
+            record.nb_rattrapage = decisions['rattrapage']
 
             if record.nb_etudiants > 0:
                 record.taux_reussite = (record.nb_admis / record.nb_etudiants) * 100
-                record.moyenne_promo = sum(resultats.mapped('moyenne_ponderee')) / len(resultats)
+                record.moyenne_promo = data['sum'] / record.nb_etudiants
             else:
                 record.taux_reussite = 0.0
                 record.moyenne_promo = 0.0
@@ -291,19 +301,55 @@ class EnsiasdDeliberation(models.Model):
         # Calculer le classement
         resultats.compute_ranking()
 
-        # Créer les lignes de délibération
-        self.deliberation_line_ids.unlink()
+        self._sync_deliberation_lines(resultats)
+
+        self.resultat_ids = resultats
+
+    def _sync_deliberation_lines(self, resultats):
+        """
+        Met les lignes de délibération en accord avec les résultats, par
+        différence: les lignes des résultats retirés sont supprimées, les
+        nouvelles créées en un seul appel, les autres mises à jour seulement
+        si nécessaire. Une décision finale modifiée par le jury et les
+        observations sont conservées.
+        """
+        self.ensure_one()
+        Line = self.env['ensiasd.deliberation.line']
+        lines = {line.resultat_id.id: line for line in self.deliberation_line_ids}
+
+        kept = set(resultats.ids)
+        self.deliberation_line_ids.filtered(lambda line: line.resultat_id.id not in kept).unlink()
+
+        vals_list = []
+        updates = {}
         for resultat in resultats:
-            self.env['ensiasd.deliberation.line'].create({
-                'deliberation_id': self.id,
-                'resultat_id': resultat.id,
+            vals = {
                 'student_id': resultat.student_id.id,
                 'moyenne': resultat.moyenne_ponderee,
                 'decision_auto': resultat.decision,
-                'decision_finale': resultat.decision,
-            })
-
-        self.resultat_ids = resultats
+            }
+            line = lines.get(resultat.id)
+            if not line:
+                vals_list.append(dict(
+                    vals,
+                    deliberation_id=self.id,
+                    resultat_id=resultat.id,
+                    decision_finale=resultat.decision,
+                ))
+                continue
+            if not line.is_modified:
+                vals['decision_finale'] = resultat.decision
+            changed = {
+                name: value for name, value in vals.items()
+                if Line._fields[name].convert_to_write(line[name], line) != value
+            }
+            if changed:
+                updates.setdefault(tuple(sorted(changed.items())), []).append(line.id)
+
+        Line.create(vals_list)
+        # Une écriture par jeu de valeurs
+        for vals, line_ids in updates.items():
+            Line.browse(line_ids).write(dict(vals))
 
     def action_generate_pv(self):
         """Générer le PV de délibération"""
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+# Clé des données du précommit: statistiques à rafraîchir dans la transaction
+PRECOMMIT_KEY = 'ensiasd.grade.stat.keys'
+
+# Une note compte comme saisie si elle n'est plus en brouillon, si l'étudiant
+# est absent à l'examen, si elle a des notes par élément, ou si l'examen ou le
+# rattrapage est noté. Les champs Float stockent 0.0 et jamais NULL: un 0 saisi
+# sur une note en brouillon sans élément reste compté manquant jusqu'à sa
+# confirmation.
+GRADED_CONDITION = """(
+    COALESCE(n.state, 'draft') != 'draft'
+    OR n.is_absent_examen
+    OR n.cc_count + n.tp_count + n.projet_count + n.absent_count > 0
+    OR COALESCE(n.note_examen, 0) != 0
+    OR COALESCE(n.note_rattrapage, 0) != 0
+)"""
+
+
+class EnsiasdGradeStat(models.Model):
+    """
+    Statistiques des notes par (session, filière, module)
+
+    Table matérialisée: chaque ligne est recalculée par une requête SQL
+    (INSERT ... ON CONFLICT). Une transaction qui modifie des notes ajoute
+    leurs clés à la file ensiasd_grade_stat_dirty (insertions seules, sans
+    conflit entre transactions); le cron de rafraîchissement, déclenché à la
+    validation, vide la file et recalcule ces clés. Toutes les lignes peuvent
+    aussi être recalculées à la demande. Les tableaux de bord lisent ces
+    lignes sans parcourir les notes.
+    """
+    _name = 'ensiasd.grade.stat'
+    _description = 'Statistiques des notes'
+    _order = 'session_id desc, filiere_id, module_id'
+
+    session_id = fields.Many2one('ensiasd.session', string='Session', required=True, ondelete='cascade', index=True)
+    filiere_id = fields.Many2one('ensiasd.filiere', string='Filière', ondelete='cascade')
+    module_id = fields.Many2one('ensiasd.module', string='Module', required=True, ondelete='cascade')
+    annee_id = fields.Many2one('ensiasd.annee', string='Année académique', readonly=True)
+    semestre = fields.Char(string='Semestre', readonly=True)
+
+    note_count = fields.Integer(string='Inscrits', readonly=True)
+    graded_count = fields.Integer(string='Notes saisies', readonly=True)
+    missing_count = fields.Integer(string='Notes manquantes', readonly=True)
+    absent_count = fields.Integer(string='Absents', readonly=True)
+    passed_count = fields.Integer(string='Validés', readonly=True)
+    note_sum = fields.Float(string='Somme des notes', readonly=True, group_operator='sum')
+
+    moyenne = fields.Float(string='Moyenne', digits=(4, 2), readonly=True, group_operator='avg')
+    ecart_type = fields.Float(string='Écart-type', digits=(4, 2), readonly=True, group_operator='avg')
+    note_min = fields.Float(string='Minimum', digits=(4, 2), readonly=True, group_operator='min')
+    note_max = fields.Float(string='Maximum', digits=(4, 2), readonly=True, group_operator='max')
+    q1 = fields.Float(string='1er quartile', digits=(4, 2), readonly=True, group_operator='avg')
+    mediane = fields.Float(string='Médiane', digits=(4, 2), readonly=True, group_operator='avg')
+    q3 = fields.Float(string='3e quartile', digits=(4, 2), readonly=True, group_operator='avg')
+    taux_reussite = fields.Float(string='Taux de réussite (%)', digits=(5, 2), readonly=True, group_operator='avg')
+
+    date_refresh = fields.Datetime(string='Mise à jour', readonly=True)
+
+    def init(self):
+        # Une ligne par clé, la filière pouvant être vide
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ensiasd_grade_stat_key_uniq
+                ON ensiasd_grade_stat (session_id, (COALESCE(filiere_id, 0)), module_id)
+        """)
+        # File des clés à rafraîchir, doublons permis
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS ensiasd_grade_stat_dirty (
+                id SERIAL PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                filiere_id INTEGER NOT NULL,
+                module_id INTEGER NOT NULL
+            )
+        """)
+
+    @api.model
+    def _mark_dirty(self, notes):
+        """
+        Ajoute les clés de ces notes à la file de rafraîchissement à la
+        validation de la transaction (une seule insertion quel que soit le
+        nombre de modifications) et déclenche le cron qui la traite
+        """
+        keys = {
+            (note.session_id.id, note.filiere_id.id or 0, note.module_id.id)
+            for note in notes
+            if note.session_id and note.module_id
+        }
+        if not keys:
+            return
+        precommit = self.env.cr.precommit
+        if PRECOMMIT_KEY not in precommit.data:
+            precommit.data[PRECOMMIT_KEY] = set()
+            precommit.add(self._queue_dirty)
+            cron = self.env.ref('ensiasd_grades.ir_cron_refresh_dirty_grade_stats', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        precommit.data[PRECOMMIT_KEY] |= keys
+
+    @api.model
+    def _queue_dirty(self):
+        keys = self.env.cr.precommit.data.pop(PRECOMMIT_KEY, set())
+        if keys:
+            self.env.cr.execute(
+                "INSERT INTO ensiasd_grade_stat_dirty (session_id, filiere_id, module_id) VALUES "
+                + ", ".join(["%s"] * len(keys)),
+                list(keys),
+            )
+
+    @api.model
+    def _refresh(self, keys=None):
+        """
+        Recalcule les statistiques des clés (session, filière ou 0, module)
+        données, ou de toutes les clés. Deux requêtes quel que soit le volume.
+        """
+        self.env['ensiasd.note'].flush_model()
+        self.flush_model()
+
+        if keys is not None:
+            keys = tuple(keys)
+            if not keys:
+                return
+            note_filter = "AND (n.session_id, COALESCE(n.filiere_id, 0), n.module_id) IN %(keys)s"
+            stat_filter = "AND (s.session_id, COALESCE(s.filiere_id, 0), s.module_id) IN %(keys)s"
+        else:
+            note_filter = stat_filter = ""
+
+        cr = self.env.cr
+        cr.execute(f"""
+            INSERT INTO ensiasd_grade_stat (
+                session_id, filiere_id, module_id, annee_id, semestre,
+                note_count, graded_count, missing_count, absent_count, passed_count, note_sum,
+                moyenne, ecart_type, note_min, note_max, q1, mediane, q3, taux_reussite,
+                date_refresh, create_uid, create_date, write_uid, write_date
+            )
+            SELECT n.session_id, n.filiere_id, n.module_id,
+                   MAX(n.annee_id), MAX(n.semestre),
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE {GRADED_CONDITION}),
+                   COUNT(*) FILTER (WHERE NOT {GRADED_CONDITION}),
+                   COUNT(*) FILTER (WHERE n.is_absent_examen OR n.resultat = 'absent'),
+                   COUNT(*) FILTER (WHERE n.resultat IN ('valide', 'compense')),
+                   COALESCE(SUM(n.note_finale) FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(AVG(n.note_finale) FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(STDDEV_POP(n.note_finale) FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(MIN(n.note_finale) FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(MAX(n.note_finale) FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY n.note_finale)
+                            FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY n.note_finale)
+                            FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY n.note_finale)
+                            FILTER (WHERE {GRADED_CONDITION}), 0),
+                   COALESCE(100.0 * COUNT(*) FILTER (WHERE n.resultat IN ('valide', 'compense'))
+                            / NULLIF(COUNT(*) FILTER (WHERE {GRADED_CONDITION}), 0), 0),
+                   NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC',
+                   %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM ensiasd_note n
+             WHERE n.session_id IS NOT NULL
+               AND n.module_id IS NOT NULL
+               {note_filter}
+             GROUP BY n.session_id, n.filiere_id, n.module_id
+            ON CONFLICT (session_id, (COALESCE(filiere_id, 0)), module_id) DO UPDATE SET
+                annee_id = EXCLUDED.annee_id,
+                semestre = EXCLUDED.semestre,
+                note_count = EXCLUDED.note_count,
+                graded_count = EXCLUDED.graded_count,
+                missing_count = EXCLUDED.missing_count,
+                absent_count = EXCLUDED.absent_count,
+                passed_count = EXCLUDED.passed_count,
+                note_sum = EXCLUDED.note_sum,
+                moyenne = EXCLUDED.moyenne,
+                ecart_type = EXCLUDED.ecart_type,
+                note_min = EXCLUDED.note_min,
+                note_max = EXCLUDED.note_max,
+                q1 = EXCLUDED.q1,
+                mediane = EXCLUDED.mediane,
+                q3 = EXCLUDED.q3,
+                taux_reussite = EXCLUDED.taux_reussite,
+                date_refresh = EXCLUDED.date_refresh,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+        """, {'keys': keys, 'uid': self.env.uid})
+
+        # Clés sans note (notes supprimées ou déplacées)
+        cr.execute(f"""
+            DELETE FROM ensiasd_grade_stat s
+             WHERE NOT EXISTS (
+                       SELECT 1 FROM ensiasd_note n
+                        WHERE n.session_id = s.session_id
+                          AND n.module_id = s.module_id
+                          AND n.filiere_id IS NOT DISTINCT FROM s.filiere_id
+                   )
+               {stat_filter}
+        """, {'keys': keys})
+
+        self.invalidate_model()
+
+    @api.model
+    def action_refresh_all(self):
+        """Recalcule toutes les statistiques"""
+        self.sudo()._refresh()
+
+    @api.model
+    def _cron_refresh_all(self):
+        self._refresh()
+
+    @api.model
+    def _cron_refresh_dirty(self):
+        """Vide la file et recalcule les statistiques des clés modifiées"""
+        self.env.cr.execute("""
+            DELETE FROM ensiasd_grade_stat_dirty
+            RETURNING session_id, filiere_id, module_id
+        """)
+        keys = set(self.env.cr.fetchall())
+        if keys:
+            self._refresh(keys)
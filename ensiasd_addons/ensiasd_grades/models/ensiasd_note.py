@@ -2,6 +2,22 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+# Agrégats des notes par élément tenus à jour sur chaque note de module:
+# groupe -> types d'évaluation comptés (moyenne = somme / nombre)
+ELEMENT_AGGREGATE_TYPES = {
+    'cc': ('cc1', 'cc2', 'cc3'),
+    'tp': ('tp',),
+    'projet': ('projet',),
+}
+
+# Champs d'agrégats correspondants sur ensiasd.note
+ELEMENT_AGGREGATE_FIELDS = tuple(
+    f'{group}_{kind}' for group in ELEMENT_AGGREGATE_TYPES for kind in ('sum', 'count')
+) + ('absent_count',)
+
+# Champs qui changent la clé des statistiques (ensiasd.grade.stat) d'une note
+STAT_KEY_FIELDS = {'inscription_id', 'session_id', 'filiere_id', 'module_id'}
+
 
 class EnsiasdNote(models.Model):
     """
@@ -176,6 +192,17 @@ class EnsiasdNote(models.Model):
         domain="[('inscription_id', '=', inscription_id)]"
     )
     
+    # Sommes et nombres des notes par élément de l'inscription, par groupe de
+    # type (voir ELEMENT_AGGREGATE_TYPES), mis à jour par delta à chaque
+    # création, modification ou suppression d'une note par élément
+    cc_sum = fields.Float(string='Somme des CC', default=0.0, readonly=True)
+    cc_count = fields.Integer(string='Nombre de CC', default=0, readonly=True)
+    tp_sum = fields.Float(string='Somme des TP', default=0.0, readonly=True)
+    tp_count = fields.Integer(string='Nombre de TP', default=0, readonly=True)
+    projet_sum = fields.Float(string='Somme des projets', default=0.0, readonly=True)
+    projet_count = fields.Integer(string='Nombre de projets', default=0, readonly=True)
+    absent_count = fields.Integer(string='Absences aux évaluations', default=0, readonly=True)
+    
     observations = fields.Text(string='Observations')
     
     # Pour délibération
@@ -200,72 +227,180 @@ class EnsiasdNote(models.Model):
             else:
                 record.display_name = "Nouvelle note"
 
-    @api.depends('note_element_ids', 'note_element_ids.valeur', 'note_element_ids.type_eval')
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._rebuild_element_aggregates()
+        self.env['ensiasd.grade.stat']._mark_dirty(records)
+        return records
+
+    def write(self, vals):
+        if STAT_KEY_FIELDS.intersection(vals):
+            self.env['ensiasd.grade.stat']._mark_dirty(self)
+        res = super().write(vals)
+        if 'inscription_id' in vals:
+            self._rebuild_element_aggregates()
+        self.env['ensiasd.grade.stat']._mark_dirty(self)
+        return res
+
+    def unlink(self):
+        self.env['ensiasd.grade.stat']._mark_dirty(self)
+        return super().unlink()
+
+    def _rebuild_element_aggregates(self):
+        """
+        Recalcule les agrégats des notes par élément à partir de zéro
+        (création d'une note, changement d'inscription, réparation).
+        """
+        if not self:
+            return
+        inscriptions = self.mapped('inscription_id')
+        totals = {}
+        for inscription, type_eval, is_absent, valeur_sum, count in self.env['ensiasd.note.element']._read_group(
+            [('inscription_id', 'in', inscriptions.ids)],
+            ['inscription_id', 'type_eval', 'is_absent'],
+            ['valeur:sum', '__count'],
+        ):
+            vals = totals.setdefault(inscription.id, self._empty_element_aggregates())
+            for group, types in ELEMENT_AGGREGATE_TYPES.items():
+                if type_eval in types:
+                    vals[f'{group}_sum'] += valeur_sum or 0.0
+                    vals[f'{group}_count'] += count
+            if is_absent:
+                vals['absent_count'] += count
+
+        # Une écriture par jeu de valeurs, pour les seules notes dont les
+        # agrégats changent (les notes sans élément restent inchangées)
+        groups = {}
+        empty = self._empty_element_aggregates()
+        for record in self:
+            vals = totals.get(record.inscription_id.id) or empty
+            if all(record[name] == value for name, value in vals.items()):
+                continue
+            groups.setdefault(tuple(sorted(vals.items())), []).append(record.id)
+        for vals, ids in groups.items():
+            self.browse(ids).write(dict(vals))
+
+    @api.model
+    def _empty_element_aggregates(self):
+        vals = {'absent_count': 0}
+        for group in ELEMENT_AGGREGATE_TYPES:
+            vals[f'{group}_sum'] = 0.0
+            vals[f'{group}_count'] = 0
+        return vals
+
+    @api.model
+    def _apply_element_aggregate_deltas(self, deltas):
+        """
+        Applique des variations d'agrégats aux notes des inscriptions, en un
+        seul UPDATE atomique (col = col + variation): pas de lecture préalable,
+        et des saisies simultanées sur une même note s'additionnent.
+
+        Args:
+            deltas (dict): inscription_id -> {champ d'agrégat: variation}
+        """
+        rows = [
+            (inscription_id, *(delta.get(name, 0) for name in ELEMENT_AGGREGATE_FIELDS))
+            for inscription_id, delta in deltas.items()
+            if any(delta.values())
+        ]
+        if not rows:
+            return
+
+        self.flush_model(('inscription_id',) + ELEMENT_AGGREGATE_FIELDS)
+        casts = ', '.join(
+            '%s::float8' if name.endswith('_sum') else '%s::int4'
+            for name in ELEMENT_AGGREGATE_FIELDS
+        )
+        assignments = ', '.join(
+            f"{name} = ROUND((COALESCE(n.{name}, 0) + v.{name})::numeric, 6)"
+            if name.endswith('_sum') else
+            f"{name} = COALESCE(n.{name}, 0) + v.{name}"
+            for name in ELEMENT_AGGREGATE_FIELDS
+        )
+        values = ', '.join([f"(%s::int4, {casts})"] * len(rows))
+        self.env.cr.execute(f"""
+            UPDATE ensiasd_note n
+               SET {assignments}
+              FROM (VALUES {values}) AS v(inscription_id, {', '.join(ELEMENT_AGGREGATE_FIELDS)})
+             WHERE n.inscription_id = v.inscription_id
+         RETURNING n.id
+        """, [value for row in rows for value in row])
+
+        notes = self.browse([row[0] for row in self.env.cr.fetchall()])
+        notes.invalidate_recordset(ELEMENT_AGGREGATE_FIELDS)
+        # Notes par type, finale, résultat... à recalculer
+        notes.modified(ELEMENT_AGGREGATE_FIELDS)
+        # Recalculées par flush et non par write(): statistiques à rafraîchir ici
+        self.env['ensiasd.grade.stat']._mark_dirty(notes)
+
+    @api.depends('cc_sum', 'cc_count', 'tp_sum', 'tp_count', 'projet_sum', 'projet_count')
     def _compute_notes(self):
-        """Calculer les notes par type à partir des notes éléments"""
+        """Calculer les notes par type à partir des agrégats des notes éléments"""
         for record in self:
-            elements = record.note_element_ids
-            
             # Note CC (moyenne des CC)
-            cc_notes = elements.filtered(lambda n: n.type_eval in ['cc1', 'cc2', 'cc3'])
-            if cc_notes:
-                record.note_cc = sum(cc_notes.mapped('valeur')) / len(cc_notes)
+            if record.cc_count:
+                record.note_cc = record.cc_sum / record.cc_count
             
             # Note TP
-            tp_notes = elements.filtered(lambda n: n.type_eval == 'tp')
-            if tp_notes:
-                record.note_tp = sum(tp_notes.mapped('valeur')) / len(tp_notes)
+            if record.tp_count:
+                record.note_tp = record.tp_sum / record.tp_count
             
             # Note Projet
-            projet_notes = elements.filtered(lambda n: n.type_eval == 'projet')
-            if projet_notes:
-                record.note_projet = sum(projet_notes.mapped('valeur')) / len(projet_notes)
+            if record.projet_count:
+                record.note_projet = record.projet_sum / record.projet_count
+
+    def _get_bareme_values_map(self):
+        """Barèmes de toutes les notes du recordset, chargés en une fois"""
+        return self.env['ensiasd.bareme'].get_bareme_values_map({
+            (record.module_id.id, record.annee_id.id)
+            for record in self
+            if record.module_id and record.annee_id
+        })
 
     @api.depends('note_cc', 'note_tp', 'note_projet', 'note_examen', 
                  'note_rattrapage', 'bonus', 'malus', 'session_id', 'module_id', 'annee_id')
     def _compute_note_finale(self):
         """Calculer la note finale selon le barème"""
+        baremes = self._get_bareme_values_map()
+        note_max = self.env['ensiasd.config'].get_config().note_max
         for record in self:
             if not record.module_id or not record.annee_id:
                 record.note_finale = 0.0
                 record.note_finale_20 = 0.0
                 continue
             
-            # Récupérer le barème
-            bareme = self.env['ensiasd.bareme'].get_bareme(
-                record.module_id.id,
-                record.annee_id.id
-            )
+            bareme = baremes[(record.module_id.id, record.annee_id.id)]
+            mode_rattrapage = bareme['note_rattrapage_remplace']
             
             # Calcul pondéré
             note = 0.0
-            if bareme.poids_cc > 0 and record.note_cc:
-                note += (record.note_cc * bareme.poids_cc / 100)
-            if bareme.poids_tp > 0 and record.note_tp:
-                note += (record.note_tp * bareme.poids_tp / 100)
-            if bareme.poids_projet > 0 and record.note_projet:
-                note += (record.note_projet * bareme.poids_projet / 100)
-            if bareme.poids_examen > 0:
+            if bareme['poids_cc'] > 0 and record.note_cc:
+                note += (record.note_cc * bareme['poids_cc'] / 100)
+            if bareme['poids_tp'] > 0 and record.note_tp:
+                note += (record.note_tp * bareme['poids_tp'] / 100)
+            if bareme['poids_projet'] > 0 and record.note_projet:
+                note += (record.note_projet * bareme['poids_projet'] / 100)
+            if bareme['poids_examen'] > 0:
                 # Gérer le rattrapage
                 note_exam = record.note_examen or 0.0
                 if record.note_rattrapage:
-                    if bareme.note_rattrapage_remplace == 'examen':
+                    if mode_rattrapage == 'examen':
                         note_exam = record.note_rattrapage
-                    elif bareme.note_rattrapage_remplace == 'meilleure':
+                    elif mode_rattrapage == 'meilleure':
                         note_exam = max(note_exam, record.note_rattrapage)
-                    elif bareme.note_rattrapage_remplace == 'total':
+                    elif mode_rattrapage == 'total':
                         # Le rattrapage remplace tout
                         note = record.note_rattrapage
                 
-                if bareme.note_rattrapage_remplace != 'total':
-                    note += (note_exam * bareme.poids_examen / 100)
+                if mode_rattrapage != 'total':
+                    note += (note_exam * bareme['poids_examen'] / 100)
             
             # Appliquer bonus/malus
             note = note + record.bonus - record.malus
             
             # Limiter au maximum
-            config = self.env['ensiasd.config'].get_config()
-            note = min(max(0, note), config.note_max)
+            note = min(max(0, note), note_max)
             
             record.note_finale = note
             record.note_finale_20 = note  # Déjà sur 20
@@ -273,6 +408,7 @@ class EnsiasdNote(models.Model):
     @api.depends('note_finale', 'module_id', 'annee_id', 'is_absent_examen')
     def _compute_resultat(self):
         """Déterminer le résultat (validé, non validé, etc.)"""
+        baremes = self._get_bareme_values_map()
         for record in self:
             if record.is_absent_examen and not record.note_rattrapage:
                 record.resultat = 'absent'
@@ -282,16 +418,13 @@ class EnsiasdNote(models.Model):
                 record.resultat = 'en_cours'
                 continue
             
-            bareme = self.env['ensiasd.bareme'].get_bareme(
-                record.module_id.id,
-                record.annee_id.id
-            )
+            bareme = baremes[(record.module_id.id, record.annee_id.id)]
             
-            if record.note_finale < bareme.note_eliminatoire:
+            if record.note_finale < bareme['note_eliminatoire']:
                 record.resultat = 'elimine'
-            elif record.note_finale >= bareme.note_validation:
+            elif record.note_finale >= bareme['note_validation']:
                 record.resultat = 'valide'
-            elif record.note_finale >= bareme.note_eliminatoire:
+            elif record.note_finale >= bareme['note_eliminatoire']:
                 # Entre éliminatoire et validation
                 if record.session_id and record.session_id.type_session == 'normale':
                     record.resultat = 'rattrapage'
@@ -320,11 +453,11 @@ class EnsiasdNote(models.Model):
             else:
                 record.mention = 'excellent'
 
-    @api.depends('note_element_ids', 'note_element_ids.is_absent')
+    @api.depends('absent_count')
     def _compute_absences(self):
         """Compter les absences"""
         for record in self:
-            record.nb_absences = len(record.note_element_ids.filtered('is_absent'))
+            record.nb_absences = record.absent_count
 
     @api.constrains('note_cc', 'note_tp', 'note_projet', 'note_examen', 'note_rattrapage')
     def _check_notes(self):
@@ -365,6 +498,7 @@ class EnsiasdNote(models.Model):
 
     def action_recalculate(self):
         """Forcer le recalcul des notes"""
+        self._rebuild_element_aggregates()
         self._compute_notes()
         self._compute_note_finale()
         self._compute_resultat()
@@ -1,7 +1,21 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from psycopg2 import errors as pg_errors
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+from .ensiasd_note import ELEMENT_AGGREGATE_TYPES
+
+# Champs de la note: leur modification incrémente la version
+VERSIONED_FIELDS = {'valeur', 'is_absent', 'type_eval', 'inscription_id', 'session_id'}
+
+# Raisons d'un conflit de saisie
+CONFLICT_LOCKED = 'locked'
+CONFLICT_MODIFIED = 'modified'
+CONFLICT_CREATED = 'created'
+
 
 class EnsiasdNoteElement(models.Model):
     """
@@ -107,6 +121,9 @@ class EnsiasdNoteElement(models.Model):
     ], string='État', default='draft', tracking=True)
     
     observations = fields.Text(string='Observations')
+    
+    # Verrouillage optimiste: incrémentée à chaque modification de la note
+    version = fields.Integer(string='Version', default=0, readonly=True, copy=False)
 
     _sql_constraints = [
         ('unique_note_element',
@@ -133,6 +150,168 @@ class EnsiasdNoteElement(models.Model):
                         f"La note doit être comprise entre 0 et {config.note_max}!"
                     )
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['ensiasd.note']._apply_element_aggregate_deltas(
+            records._get_note_aggregate_deltas(1))
+        return records
+
+    def write(self, vals):
+        tracked = {'inscription_id', 'type_eval', 'valeur', 'is_absent'} & set(vals)
+        if tracked:
+            deltas = self._get_note_aggregate_deltas(-1)
+        res = super().write(vals)
+        if tracked:
+            # Variation nette (après - avant), appliquée en une seule fois
+            self.env['ensiasd.note']._apply_element_aggregate_deltas(
+                self._get_note_aggregate_deltas(1, deltas))
+        if VERSIONED_FIELDS.intersection(vals) and self.ids:
+            self.env.cr.execute(
+                "UPDATE ensiasd_note_element SET version = version + 1 WHERE id IN %s",
+                (tuple(self.ids),)
+            )
+            self.invalidate_recordset(['version'])
+        return res
+
+    def unlink(self):
+        deltas = self._get_note_aggregate_deltas(-1)
+        res = super().unlink()
+        self.env['ensiasd.note']._apply_element_aggregate_deltas(deltas)
+        return res
+
+    @api.model
+    def _save_versioned(self, updates):
+        """
+        Écrit des notes existantes avec verrouillage optimiste.
+
+        Les lignes sont verrouillées par SELECT ... FOR UPDATE SKIP LOCKED:
+        une note en cours d'écriture par une autre transaction n'est pas
+        attendue mais signalée en conflit, de même qu'une note dont la
+        version a changé depuis son chargement. Les autres sont écrites
+        groupées par valeurs identiques.
+
+        Args:
+            updates (dict): id de note -> (valeurs, version chargée ou None
+                pour ne pas la vérifier)
+
+        Returns:
+            dict: id de note -> CONFLICT_LOCKED ou CONFLICT_MODIFIED
+        """
+        if not updates:
+            return {}
+        self.flush_model(['version'])
+        self.env.cr.execute("""
+            SELECT id, version
+              FROM ensiasd_note_element
+             WHERE id IN %s
+             ORDER BY id
+               FOR UPDATE SKIP LOCKED
+        """, (tuple(updates),))
+        locked = dict(self.env.cr.fetchall())
+        
+        conflicts = {}
+        groups = defaultdict(list)
+        for element_id, (vals, version) in updates.items():
+            if element_id not in locked:
+                conflicts[element_id] = CONFLICT_LOCKED
+            elif version is not None and locked[element_id] != version:
+                conflicts[element_id] = CONFLICT_MODIFIED
+            else:
+                groups[tuple(sorted(vals.items()))].append(element_id)
+        
+        for vals, element_ids in groups.items():
+            self.browse(element_ids).write(dict(vals))
+        return conflicts
+
+    @api.model
+    def _create_unless_exists(self, vals_list):
+        """
+        Crée ces notes, sauf celles créées entre-temps par une autre saisie
+        (contrainte d'unicité).
+
+        Les notes sont créées en une fois; en cas de doublon, les notes déjà
+        existantes (visibles) sont écartées et les autres recréées en une
+        fois, puis une à une si une note validée après le début de la
+        transaction (invisible en REPEATABLE READ) est encore en conflit.
+
+        Returns:
+            tuple: (notes créées, indices dans vals_list des notes déjà
+            existantes) pour que l'appelant ne signale que ces conflits
+        """
+        if not vals_list:
+            return self.browse(), set()
+        try:
+            with self.env.cr.savepoint():
+                return self.create(vals_list), set()
+        except pg_errors.UniqueViolation:
+            pass
+
+        existing = self._get_existing_keys(vals_list)
+        remaining = [
+            index for index, vals in enumerate(vals_list)
+            if self._get_unique_key(vals) not in existing
+        ]
+        duplicates = set(range(len(vals_list))) - set(remaining)
+        try:
+            with self.env.cr.savepoint():
+                return self.create([vals_list[index] for index in remaining]), duplicates
+        except pg_errors.UniqueViolation:
+            pass
+
+        created = self.browse()
+        for index in remaining:
+            try:
+                with self.env.cr.savepoint():
+                    created |= self.create(vals_list[index])
+            except pg_errors.UniqueViolation:
+                duplicates.add(index)
+        return created, duplicates
+
+    @api.model
+    def _get_unique_key(self, vals):
+        """Clé d'unicité (inscription, élément, type, session) de valeurs de création"""
+        return (
+            vals.get('inscription_id'),
+            vals.get('element_id'),
+            vals.get('type_eval'),
+            vals.get('session_id') or False,
+        )
+
+    @api.model
+    def _get_existing_keys(self, vals_list):
+        """Clés d'unicité de ces valeurs de création qui existent déjà"""
+        keys = {self._get_unique_key(vals) for vals in vals_list}
+        notes = self.search([
+            ('inscription_id', 'in', list({key[0] for key in keys})),
+            ('element_id', 'in', list({key[1] for key in keys})),
+            ('type_eval', 'in', list({key[2] for key in keys})),
+        ])
+        return keys & {
+            (note.inscription_id.id, note.element_id.id, note.type_eval, note.session_id.id)
+            for note in notes
+        }
+
+    def _get_note_aggregate_deltas(self, sign, deltas=None):
+        """
+        Ajoute à `deltas` (inscription_id -> {champ: variation}) la
+        contribution de ces notes aux agrégats des notes de module de leurs
+        inscriptions, comptée positivement (sign=1) ou négativement (sign=-1).
+        """
+        Note = self.env['ensiasd.note']
+        deltas = {} if deltas is None else deltas
+        for record in self:
+            if not record.inscription_id:
+                continue
+            delta = deltas.setdefault(record.inscription_id.id, Note._empty_element_aggregates())
+            for group, types in ELEMENT_AGGREGATE_TYPES.items():
+                if record.type_eval in types:
+                    delta[f'{group}_sum'] += sign * (record.valeur or 0.0)
+                    delta[f'{group}_count'] += sign
+            if record.is_absent:
+                delta['absent_count'] += sign
+        return deltas
+
     @api.onchange('is_absent')
     def _onchange_is_absent(self):
         if self.is_absent:
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+
+from odoo import models, fields
+
+# Marqueur (description) des PDF mis en cache, suivi du nom du template
+REPORT_CACHE_MARKER = 'ensiasd_report_cache:'
+
+
+class EnsiasdReportCacheMixin(models.AbstractModel):
+    """
+    Cache des PDF imprimés
+
+    Le nom de la pièce jointe d'un rapport (champ `attachment`, avec
+    `attachment_use`) contient une empreinte des versions (write_date) des
+    enregistrements imprimés et du template. Tant que rien ne change, Odoo
+    sert la pièce jointe existante sans QWeb ni wkhtmltopdf; la modification
+    d'une note ou d'un résultat change l'empreinte et donc le document.
+    """
+    _name = 'ensiasd.report.cache.mixin'
+    _description = 'Cache des documents PDF'
+
+    def _get_report_cache_sources(self):
+        """Enregistrements dont dépend le document imprimé (à surcharger)"""
+        return [self]
+
+    def _get_report_cache_name(self, basename, template, dated=False):
+        """
+        Nom de la pièce jointe: `basename` suivi de l'empreinte du document.
+        `dated` pour un template qui imprime la date du jour: le document
+        n'est alors servi depuis le cache que le jour de son impression.
+        """
+        self.ensure_one()
+        versions = [self._get_report_template_version(template)]
+        if dated:
+            versions.append(str(fields.Date.context_today(self)))
+        for records in self._get_report_cache_sources():
+            versions += sorted(
+                (record._name, record.id, str(record.write_date))
+                for record in records
+            )
+        digest = hashlib.sha1(json.dumps(versions).encode()).hexdigest()[:16]
+        return f'{basename}_{digest}.pdf'
+
+    def _get_report_template_version(self, template):
+        """Version du template (et de ses vues héritées) et de la société"""
+        View = self.env['ir.ui.view'].sudo()
+        views = View.search([('key', '=', template)])
+        views |= View.search([('inherit_id', 'in', views.ids)])
+        return [
+            template,
+            str(max(views.mapped('write_date'), default='')),
+            str(self.env.company.write_date),
+        ]
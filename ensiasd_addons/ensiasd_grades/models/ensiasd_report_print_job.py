@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+from odoo.tools.safe_eval import safe_eval
+from odoo.addons.base.models.ir_actions_report import _get_wkhtmltopdf_bin
+
+_logger = logging.getLogger(__name__)
+
+# Rapports imprimables en lot
+BATCH_REPORTS = (
+    'ensiasd_grades.action_report_bulletin',
+    'ensiasd_grades.action_report_releve_notes',
+    'ensiasd_grades.action_report_pv_deliberation',
+)
+
+# Documents rendus en HTML (QWeb) à la fois; la progression est enregistrée
+# après chaque tranche
+PRINT_SLICE_SIZE = 50
+
+# Processus wkhtmltopdf simultanés (un document par processus)
+PRINT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Durée maximale d'un processus wkhtmltopdf pour un document
+PRINT_DOCUMENT_TIMEOUT = 120
+
+# Durée maximale d'une exécution du cron; le cron se relance s'il reste du travail
+PRINT_JOB_TIME_LIMIT = 240
+
+# Une impression « en cours » sans progression depuis plus longtemps est
+# considérée abandonnée (worker arrêté) et remise en attente
+PRINT_JOB_TIMEOUT = 900
+
+# Marqueur (description) des PDF convertis d'une impression, suivi de l'id
+# du document: conservés jusqu'à l'assemblage pour reprendre une impression
+# interrompue sans reconvertir
+PRINT_DOCUMENT_MARKER = 'ensiasd_print_document:'
+
+
+class EnsiasdReportPrintJob(models.Model):
+    """
+    Impression en lot (bulletins, relevés, PV)
+
+    Chaque document est converti en PDF par son propre processus wkhtmltopdf,
+    PRINT_WORKERS à la fois. L'en-tête et le pied de page, identiques pour
+    tous les documents, sont rendus et écrits une seule fois. Les PDF de
+    chaque tranche sont enregistrés en pièces jointes et validés: une
+    impression interrompue (limite de temps, échec, worker arrêté) reprend
+    aux documents non convertis. Le résultat (PDF fusionné ou archive ZIP)
+    est joint à l'impression.
+    """
+    _name = 'ensiasd.report.print.job'
+    _description = 'Impression en lot'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Nom', required=True)
+
+    report_id = fields.Many2one(
+        'ir.actions.report',
+        string='Rapport',
+        required=True,
+        ondelete='cascade'
+    )
+
+    res_model = fields.Char(related='report_id.model', string='Modèle')
+    res_ids = fields.Text(string='Documents (ids)', required=True, default='[]')
+
+    output = fields.Selection([
+        ('pdf', 'PDF unique'),
+        ('zip', 'Archive ZIP (un PDF par document)'),
+    ], string='Format', default='pdf', required=True)
+
+    state = fields.Selection([
+        ('queued', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'En échec'),
+    ], string='État', default='queued', required=True)
+
+    total_count = fields.Integer(string='Documents', readonly=True)
+    done_count = fields.Integer(string='Documents imprimés', readonly=True)
+    progress = fields.Float(string='Progression (%)', compute='_compute_progress')
+
+    attachment_id = fields.Many2one('ir.attachment', string='Fichier', readonly=True)
+    error = fields.Text(string='Erreur', readonly=True)
+    date_end = fields.Datetime(string='Fin', readonly=True)
+
+    @api.depends('total_count', 'done_count')
+    def _compute_progress(self):
+        for record in self:
+            record.progress = 100.0 * record.done_count / record.total_count if record.total_count else 0.0
+
+    @api.model
+    def action_print_records(self, report_xmlid, records, output='pdf'):
+        """Crée une impression en lot pour ces enregistrements et l'ouvre"""
+        if report_xmlid not in BATCH_REPORTS:
+            raise UserError("Ce rapport ne peut pas être imprimé en lot!")
+        if not records:
+            raise UserError("Aucun document à imprimer!")
+        report = self.env.ref(report_xmlid)
+        job = self.create({
+            'name': f"{report.name} ({len(records)})",
+            'report_id': report.id,
+            'res_ids': json.dumps(records.ids),
+            'output': output,
+            'total_count': len(records),
+        })
+        self.env.ref('ensiasd_grades.ir_cron_process_report_print_jobs')._trigger()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Impression en lot',
+            'res_model': self._name,
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
+
+    def action_retry(self):
+        """
+        Relancer une impression en échec, ou bloquée en cours sans
+        progression depuis PRINT_JOB_TIMEOUT. Les documents déjà convertis
+        sont conservés.
+        """
+        stale = fields.Datetime.now() - timedelta(seconds=PRINT_JOB_TIMEOUT)
+        if any(job.state == 'running' and job.write_date > stale for job in self):
+            raise UserError("Cette impression est en cours de traitement.")
+        self.write({'state': 'queued', 'error': False})
+        self.env.ref('ensiasd_grades.ir_cron_process_report_print_jobs')._trigger()
+
+    def unlink(self):
+        self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+        ]).unlink()
+        return super().unlink()
+
+    def action_download(self):
+        """Télécharger le fichier produit"""
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError("Le fichier n'est pas encore disponible!")
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
+    @api.model
+    def _cron_process_jobs(self):
+        """
+        Traite les impressions en attente, une à la fois, jusqu'à épuisement
+        ou PRINT_JOB_TIME_LIMIT; se relance s'il en reste.
+        """
+        cr = self.env.cr
+        deadline = time.monotonic() + PRINT_JOB_TIME_LIMIT
+
+        # Impressions abandonnées par un worker arrêté en cours de traitement
+        # (write_date est mise à jour à chaque tranche convertie)
+        cr.execute("""
+            UPDATE ensiasd_report_print_job
+               SET state = 'queued'
+             WHERE state = 'running'
+               AND write_date < (NOW() AT TIME ZONE 'UTC') - make_interval(secs => %s)
+        """, (PRINT_JOB_TIMEOUT,))
+        cr.commit()
+
+        for job in self.search([('state', '=', 'queued')], order='id'):
+            if time.monotonic() >= deadline:
+                break
+            job.write({'state': 'running'})
+            cr.commit()
+            try:
+                finished = job._run(deadline)
+            except Exception as e:
+                _logger.exception("Impression en lot %s en échec", job.id)
+                cr.rollback()
+                job.write({'state': 'failed', 'error': str(e), 'date_end': fields.Datetime.now()})
+            else:
+                if not finished:
+                    job.write({'state': 'queued'})
+            cr.commit()
+
+        if self.search_count([('state', '=', 'queued')]):
+            self.env.ref('ensiasd_grades.ir_cron_process_report_print_jobs')._trigger()
+
+    def _run(self, deadline):
+        """
+        Rend et convertit en parallèle les documents non encore convertis,
+        tranche par tranche, puis les assemble. Retourne False si `deadline`
+        est atteinte avant la fin: les tranches converties sont conservées.
+        """
+        self.ensure_one()
+        report = self.report_id
+        records = self.env[report.model].browse(json.loads(self.res_ids)).exists()
+        converted_ids = set(self._get_document_attachments())
+        done_count = len(converted_ids)
+        remaining = records.filtered(lambda record: record.id not in converted_ids)
+        workdir = tempfile.mkdtemp(prefix='ensiasd_print_')
+        try:
+            command = header_footer = None
+
+            with ThreadPoolExecutor(max_workers=PRINT_WORKERS) as executor:
+                for start in range(0, len(remaining), PRINT_SLICE_SIZE):
+                    if time.monotonic() >= deadline:
+                        return False
+
+                    chunk = remaining[start:start + PRINT_SLICE_SIZE]
+                    html = report._render_qweb_html(report.report_name, chunk.ids)[0]
+                    bodies, res_ids, header, footer, specific_args = report._prepare_html(
+                        html, report_model=report.model)
+
+                    # En-tête, pied de page et options: préparés une seule fois pour tout le lot
+                    if command is None:
+                        command = self._get_wkhtmltopdf_command(report, specific_args)
+                        header_footer = self._write_header_footer(workdir, header, footer)
+
+                    jobs = []
+                    for index, body in enumerate(bodies):
+                        res_id = res_ids[index] if index < len(res_ids) and res_ids[index] else chunk.ids[index]
+                        body_path = os.path.join(workdir, f'body_{res_id}.html')
+                        with open(body_path, 'wb') as body_file:
+                            body_file.write(body.encode() if isinstance(body, str) else body)
+                        jobs.append((res_id, body_path, os.path.join(workdir, f'doc_{res_id}.pdf')))
+
+                    converted = list(executor.map(
+                        lambda job: self._convert(command, header_footer, *job), jobs
+                    ))
+                    self._save_documents(converted)
+                    done_count += len(converted)
+                    self.write({'done_count': done_count})
+                    self.env.cr.commit()
+
+            documents = self._get_document_attachments()
+            ordered = [(record, documents[record.id]) for record in records if record.id in documents]
+            self._store_output(report, ordered, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return True
+
+    def _get_document_attachments(self):
+        """PDF convertis de l'impression: id du document -> pièce jointe"""
+        self.ensure_one()
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('description', '=like', PRINT_DOCUMENT_MARKER + '%'),
+        ])
+        return {
+            int(attachment.description[len(PRINT_DOCUMENT_MARKER):]): attachment
+            for attachment in attachments
+        }
+
+    def _save_documents(self, converted):
+        """Enregistre les PDF convertis d'une tranche en pièces jointes"""
+        self.ensure_one()
+        vals_list = []
+        for res_id, pdf_path in converted:
+            with open(pdf_path, 'rb') as pdf_file:
+                vals_list.append({
+                    'name': f'doc_{res_id}.pdf',
+                    'raw': pdf_file.read(),
+                    'mimetype': 'application/pdf',
+                    'description': f'{PRINT_DOCUMENT_MARKER}{res_id}',
+                    'res_model': self._name,
+                    'res_id': self.id,
+                })
+            os.unlink(pdf_path)
+        attachments = self.env['ir.attachment'].sudo().create(vals_list)
+        # Ne pas garder les contenus dans le cache de l'ORM
+        attachments.invalidate_recordset(['raw', 'datas'])
+
+    @api.model
+    def _get_wkhtmltopdf_command(self, report, specific_args):
+        args = report._build_wkhtmltopdf_args(
+            report.get_paperformat(),
+            False,
+            specific_paperformat_args=specific_args,
+            set_viewport_size=False,
+        )
+        return [_get_wkhtmltopdf_bin()] + args
+
+    @api.model
+    def _write_header_footer(self, workdir, header, footer):
+        args = []
+        for option, content in (('--header-html', header), ('--footer-html', footer)):
+            if content:
+                path = os.path.join(workdir, option.strip('-') + '.html')
+                with open(path, 'wb') as html_file:
+                    html_file.write(content.encode() if isinstance(content, str) else content)
+                args += [option, path]
+        return args
+
+    @api.model
+    def _convert(self, command, header_footer, res_id, body_path, pdf_path):
+        """Convertit un document (exécuté dans un thread, sans accès à la base)"""
+        process = subprocess.run(
+            command + header_footer + [body_path, pdf_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=PRINT_DOCUMENT_TIMEOUT,
+        )
+        if process.returncode not in (0, 1) or not os.path.exists(pdf_path):
+            raise UserError(
+                f"wkhtmltopdf a échoué (code {process.returncode}): "
+                f"{process.stderr.decode(errors='replace')[-1000:]}"
+            )
+        return res_id, pdf_path
+
+    def _store_output(self, report, documents, workdir):
+        """
+        Assemble les PDF convertis (liste de (document, pièce jointe)) en un
+        fichier joint à l'impression, puis supprime les PDF intermédiaires.
+
+        La fusion et l'archive sont écrites dans un fichier, document par
+        document, sans charger tous les PDF en mémoire. Le fichier produit
+        est lu une fois pour créer la pièce jointe (raw, sans base64):
+        ir.attachment n'accepte pas de flux.
+        """
+        self.ensure_one()
+        paths = [
+            (record, self._get_document_path(attachment, workdir))
+            for record, attachment in documents
+        ]
+        if self.output == 'zip':
+            output_path = os.path.join(workdir, 'output.zip')
+            with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for record, pdf_path in paths:
+                    name = self._get_document_name(report, record).replace('/', '_')
+                    archive.write(pdf_path, f'{name}_{record.id}.pdf')
+            filename, mimetype = f'{self.name}.zip', 'application/zip'
+        else:
+            output_path = os.path.join(workdir, 'output.pdf')
+            self._merge_pdf_files([pdf_path for _record, pdf_path in paths], output_path)
+            filename, mimetype = f'{self.name}.pdf', 'application/pdf'
+
+        with open(output_path, 'rb') as output_file:
+            attachment = self.env['ir.attachment'].create({
+                'name': filename,
+                'raw': output_file.read(),
+                'mimetype': mimetype,
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+        attachment.invalidate_recordset(['raw', 'datas'])
+
+        for _record, document in documents:
+            document.unlink()
+        self.write({
+            'state': 'done',
+            'attachment_id': attachment.id,
+            'done_count': len(documents),
+            'date_end': fields.Datetime.now(),
+        })
+
+    @api.model
+    def _get_document_path(self, attachment, workdir):
+        """Chemin d'un PDF converti: fichier du filestore, ou copie dans `workdir`"""
+        if attachment.store_fname:
+            return attachment._full_path(attachment.store_fname)
+        pdf_path = os.path.join(workdir, f'stored_{attachment.id}.pdf')
+        with open(pdf_path, 'wb') as pdf_file:
+            pdf_file.write(attachment.raw)
+        attachment.invalidate_recordset(['raw', 'datas'])
+        return pdf_path
+
+    @api.model
+    def _merge_pdf_files(self, pdf_paths, output_path):
+        """Fusionne des fichiers PDF dans `output_path` (pages lues depuis les fichiers)"""
+        writer = PdfFileWriter()
+        streams = []
+        try:
+            for pdf_path in pdf_paths:
+                stream = open(pdf_path, 'rb')
+                streams.append(stream)
+                reader = PdfFileReader(stream, strict=False)
+                for page in range(reader.getNumPages()):
+                    writer.addPage(reader.getPage(page))
+            with open(output_path, 'wb') as output_file:
+                writer.write(output_file)
+        finally:
+            for stream in streams:
+                stream.close()
+
+    @api.model
+    def _get_document_name(self, report, record):
+        if report.print_report_name:
+            try:
+                return str(safe_eval(report.print_report_name, {'object': record, 'time': time}))
+            except Exception:
+                _logger.warning("Nom de document invalide pour %s", record)
+        return f'{record._name.replace(".", "_")}'
@@ -2,6 +2,29 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+# Gestion des ex aequo du classement (paramètre ensiasd_grades.ranking_method):
+# rank = 1, 1, 3 / dense_rank = 1, 1, 2 / row_number = 1, 2, 3
+RANKING_FUNCTIONS = {
+    'rank': 'RANK()',
+    'dense_rank': 'DENSE_RANK()',
+    'row_number': 'ROW_NUMBER()',
+}
+
+# Champs calculés remplis en SQL par _compute_from_notes_sql()
+SQL_COMPUTED_FIELDS = (
+    'note_ids',
+    'moyenne_generale',
+    'moyenne_ponderee',
+    'total_credits',
+    'credits_valides',
+    'credits_non_valides',
+    'nb_modules',
+    'nb_modules_valides',
+    'nb_modules_non_valides',
+    'nb_modules_rattrapage',
+    'mention',
+)
+
 
 class EnsiasdResultat(models.Model):
     """
@@ -259,11 +282,103 @@ class EnsiasdResultat(models.Model):
 
     def action_calculate(self):
         """Recalculer les résultats"""
-        self._compute_notes()
-        self._compute_resultats()
-        self._compute_mention()
+        self._compute_from_notes_sql()
         self.write({'state': 'calculated'})
 
+    def _compute_from_notes_sql(self):
+        """
+        Équivalent ensembliste de _compute_notes, _compute_resultats et
+        _compute_mention: la table resultat_note_rel et les colonnes agrégées
+        sont remplies par deux requêtes groupées sur ensiasd_note et
+        ensiasd_module, quel que soit le nombre de résultats.
+        """
+        if not self:
+            return
+        self.env['ensiasd.note'].flush_model([
+            'student_id', 'annee_id', 'semestre', 'filiere_id', 'module_id',
+            'note_finale', 'resultat',
+        ])
+        self.env['ensiasd.module'].flush_model(['credits_ects', 'coefficient'])
+        self.flush_recordset(['student_id', 'annee_id', 'type_resultat', 'filiere_id'])
+
+        ids = tuple(self.ids)
+        cr = self.env.cr
+        cr.execute("DELETE FROM resultat_note_rel WHERE resultat_id IN %s", (ids,))
+        cr.execute("""
+            INSERT INTO resultat_note_rel (resultat_id, note_id)
+            SELECT r.id, n.id
+              FROM ensiasd_resultat r
+              JOIN ensiasd_note n
+                ON n.student_id = r.student_id
+               AND n.annee_id = r.annee_id
+               AND (r.type_resultat = 'annee' OR n.semestre = r.type_resultat)
+               AND (r.filiere_id IS NULL OR n.filiere_id = r.filiere_id)
+             WHERE r.id IN %s
+        """, (ids,))
+        cr.execute("""
+            WITH agg AS (
+                SELECT rel.resultat_id,
+                       COUNT(*) AS nb_modules,
+                       COUNT(*) FILTER (WHERE n.resultat = 'valide') AS nb_valides,
+                       COUNT(*) FILTER (WHERE n.resultat IN ('non_valide', 'elimine')) AS nb_non_valides,
+                       COUNT(*) FILTER (WHERE n.resultat = 'rattrapage') AS nb_rattrapage,
+                       COALESCE(SUM(m.credits_ects), 0) AS total_credits,
+                       COALESCE(SUM(m.credits_ects) FILTER (
+                           WHERE n.resultat IN ('valide', 'compense')), 0) AS credits_valides,
+                       AVG(COALESCE(n.note_finale, 0)) AS moyenne_generale,
+                       SUM(COALESCE(m.coefficient, 0)) AS total_coef,
+                       SUM(COALESCE(n.note_finale, 0) * COALESCE(m.coefficient, 0)) AS somme_ponderee
+                  FROM resultat_note_rel rel
+                  JOIN ensiasd_note n ON n.id = rel.note_id
+                  LEFT JOIN ensiasd_module m ON m.id = n.module_id
+                 WHERE rel.resultat_id IN %(ids)s
+                 GROUP BY rel.resultat_id
+            ), stats AS (
+                SELECT r.id,
+                       COALESCE(agg.nb_modules, 0) AS nb_modules,
+                       COALESCE(agg.nb_valides, 0) AS nb_valides,
+                       COALESCE(agg.nb_non_valides, 0) AS nb_non_valides,
+                       COALESCE(agg.nb_rattrapage, 0) AS nb_rattrapage,
+                       COALESCE(agg.total_credits, 0) AS total_credits,
+                       COALESCE(agg.credits_valides, 0) AS credits_valides,
+                       ROUND(COALESCE(agg.moyenne_generale, 0)::numeric, 2) AS moyenne_generale,
+                       ROUND(COALESCE(CASE WHEN agg.total_coef > 0
+                                           THEN agg.somme_ponderee / agg.total_coef
+                                           ELSE agg.moyenne_generale END, 0)::numeric, 2) AS moyenne_ponderee
+                  FROM ensiasd_resultat r
+                  LEFT JOIN agg ON agg.resultat_id = r.id
+                 WHERE r.id IN %(ids)s
+            )
+            UPDATE ensiasd_resultat r
+               SET nb_modules = s.nb_modules,
+                   nb_modules_valides = s.nb_valides,
+                   nb_modules_non_valides = s.nb_non_valides,
+                   nb_modules_rattrapage = s.nb_rattrapage,
+                   total_credits = s.total_credits,
+                   credits_valides = s.credits_valides,
+                   credits_non_valides = s.total_credits - s.credits_valides,
+                   moyenne_generale = s.moyenne_generale,
+                   moyenne_ponderee = s.moyenne_ponderee,
+                   mention = CASE WHEN s.moyenne_ponderee < 12 THEN 'passable'
+                                  WHEN s.moyenne_ponderee < 14 THEN 'ab'
+                                  WHEN s.moyenne_ponderee < 16 THEN 'bien'
+                                  WHEN s.moyenne_ponderee < 18 THEN 'tb'
+                                  ELSE 'excellent' END,
+                   write_uid = %(uid)s,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM stats s
+             WHERE s.id = r.id
+        """, {'ids': ids, 'uid': self.env.uid})
+
+        # Les valeurs sont en base: cache à relire, et dépendances stockées
+        # (délibération: note_ids, nb_etudiants, taux_reussite, moyenne_promo,
+        # décision...) à recalculer comme après une écriture ORM
+        self.invalidate_recordset(SQL_COMPUTED_FIELDS + ('write_uid', 'write_date'))
+        self.modified(SQL_COMPUTED_FIELDS)
+        # ... sauf les champs remplis ci-dessus (mention dépend de moyenne_ponderee)
+        for fname in SQL_COMPUTED_FIELDS:
+            self.env.remove_to_compute(self._fields[fname], self)
+
     def action_validate(self):
         """Valider le résultat"""
         self.write({'state': 'validated'})
@@ -283,18 +398,24 @@ class EnsiasdResultat(models.Model):
 
     def determine_decision(self):
         """Déterminer la décision automatique"""
+        config = self.env['ensiasd.config'].get_config()
+        decisions = {}
         for record in self:
-            config = self.env['ensiasd.config'].get_config()
-            
             if record.nb_modules_non_valides == 0:
-                record.decision = 'admis'
+                decision = 'admis'
             elif record.moyenne_ponderee >= config.note_validation:
                 # Compensation possible
-                record.decision = 'admis_compensation'
+                decision = 'admis_compensation'
             elif record.nb_modules_rattrapage > 0:
-                record.decision = 'rattrapage'
+                decision = 'rattrapage'
             else:
-                record.decision = 'ajourne'
+                decision = 'ajourne'
+            if record.decision != decision:
+                decisions.setdefault(decision, []).append(record.id)
+        
+        # Une écriture par décision
+        for decision, ids in decisions.items():
+            self.browse(ids).write({'decision': decision})
 
     @api.model
     def generate_resultats_semestre(self, annee_id, semestre, filiere_id=None):
@@ -306,44 +427,99 @@ class EnsiasdResultat(models.Model):
         if filiere_id:
             domain.append(('filiere_id', '=', filiere_id))
         
-        inscriptions = self.env['ensiasd.inscription'].search(domain)
-        students = inscriptions.mapped('student_id')
+        students = self.env['ensiasd.student'].browse([
+            student.id for [student] in self.env['ensiasd.inscription']._read_group(domain, ['student_id'])
+            if student
+        ])
+        
+        # Résultats existants: une requête
+        existing = {}
+        for resultat in self.search([
+            ('student_id', 'in', students.ids),
+            ('annee_id', '=', annee_id),
+            ('type_resultat', '=', semestre),
+        ]):
+            existing.setdefault(resultat.student_id.id, resultat)
         
-        resultats = self.env['ensiasd.resultat']
+        # Résultats manquants: un seul create
+        vals_list = []
         for student in students:
-            existing = self.search([
-                ('student_id', '=', student.id),
-                ('annee_id', '=', annee_id),
-                ('type_resultat', '=', semestre),
-            ], limit=1)
-            
-            if not existing:
-                filiere = student.groupe_id.filiere_id if hasattr(student.groupe_id, 'filiere_id') else False
-                resultat = self.create({
-                    'student_id': student.id,
-                    'annee_id': annee_id,
-                    'type_resultat': semestre,
-                    'filiere_id': filiere.id if filiere else filiere_id,
-                })
-                resultats |= resultat
-            else:
-                resultats |= existing
+            if student.id in existing:
+                continue
+            filiere = student.groupe_id.filiere_id if hasattr(student.groupe_id, 'filiere_id') else False
+            vals_list.append({
+                'student_id': student.id,
+                'annee_id': annee_id,
+                'type_resultat': semestre,
+                'filiere_id': filiere.id if filiere else filiere_id,
+            })
+        created = self.create(vals_list)
         
+        resultats = self.browse([resultat.id for resultat in existing.values()]) | created
         resultats.action_calculate()
         return resultats
 
     def compute_ranking(self):
-        """Calculer le classement"""
-        # Grouper par filière et type
-        groups = {}
-        for record in self:
-            key = (record.filiere_id.id, record.type_resultat, record.annee_id.id)
-            if key not in groups:
-                groups[key] = []
-            groups[key].append(record)
-        
-        for key, resultats in groups.items():
-            # Trier par moyenne pondérée décroissante
-            sorted_resultats = sorted(resultats, key=lambda r: r.moyenne_ponderee, reverse=True)
-            for i, resultat in enumerate(sorted_resultats, 1):
-                resultat.rang = i
+        """Calculer le classement, par filière, type et année, parmi ces résultats"""
+        if self:
+            self._update_ranking("r.id IN %s", (tuple(self.ids),))
+
+    @api.model
+    def compute_ranking_annee(self, annee_id):
+        """Calculer le classement de tous les résultats d'une année"""
+        self._update_ranking("r.annee_id = %s", (annee_id,))
+
+    @api.model
+    def _update_ranking(self, where, params):
+        """
+        Met à jour le rang des résultats filtrés par `where` avec une fonction
+        de fenêtrage, puis le rang des lignes de délibération liées, en deux
+        requêtes quel que soit le nombre de résultats.
+        """
+        method = self.env['ir.config_parameter'].sudo().get_param(
+            'ensiasd_grades.ranking_method', 'rank')
+        if method not in RANKING_FUNCTIONS:
+            method = 'rank'
+        function = RANKING_FUNCTIONS[method]
+        # Les ex aequo doivent rester pairs pour RANK() et DENSE_RANK(): l'id
+        # ne départage que la numérotation continue
+        order = "r.moyenne_ponderee DESC NULLS LAST"
+        if method == 'row_number':
+            order += ", r.id"
+
+        self.flush_model(['filiere_id', 'type_resultat', 'annee_id', 'moyenne_ponderee', 'rang'])
+        self.env['ensiasd.deliberation.line'].flush_model(['resultat_id', 'rang'])
+
+        cr = self.env.cr
+        cr.execute(f"""
+            UPDATE ensiasd_resultat r
+               SET rang = ranked.rang,
+                   write_date = NOW() AT TIME ZONE 'UTC'
+              FROM (
+                  SELECT r.id,
+                         {function} OVER (
+                             PARTITION BY r.filiere_id, r.type_resultat, r.annee_id
+                             ORDER BY {order}
+                         ) AS rang
+                    FROM ensiasd_resultat r
+                   WHERE {where}
+              ) ranked
+             WHERE r.id = ranked.id
+               AND r.rang IS DISTINCT FROM ranked.rang
+         RETURNING r.id
+        """, params)
+        resultat_ids = tuple(row[0] for row in cr.fetchall())
+
+        # Champ lié stocké des lignes de délibération, mis à jour sans l'ORM
+        if resultat_ids:
+            cr.execute("""
+                UPDATE ensiasd_deliberation_line l
+                   SET rang = r.rang,
+                       write_date = NOW() AT TIME ZONE 'UTC'
+                  FROM ensiasd_resultat r
+                 WHERE l.resultat_id = r.id
+                   AND r.id IN %s
+            """, (resultat_ids,))
+
+        self.invalidate_model(['rang', 'write_date'])
+        self.env['ensiasd.deliberation.line'].invalidate_model(['rang', 'write_date'])
@@ -56,7 +56,14 @@ class EnsiasdSession(models.Model):
     ], string='État', default='draft', tracking=True)
     
     note_ids = fields.One2many('ensiasd.note', 'session_id', string='Notes')
-    note_count = fields.Integer(compute='_compute_note_count', string='Nombre de notes')
+    
+    # Statistiques lues dans ensiasd.grade.stat (une requête pour toutes les sessions)
+    stat_ids = fields.One2many('ensiasd.grade.stat', 'session_id', string='Statistiques')
+    note_count = fields.Integer(compute='_compute_statistics', string='Nombre de notes')
+    graded_count = fields.Integer(compute='_compute_statistics', string='Notes saisies')
+    missing_count = fields.Integer(compute='_compute_statistics', string='Notes manquantes')
+    moyenne = fields.Float(compute='_compute_statistics', string='Moyenne', digits=(4, 2))
+    taux_reussite = fields.Float(compute='_compute_statistics', string='Taux de réussite (%)', digits=(5, 2))
     
     filiere_ids = fields.Many2many(
         'ensiasd.filiere',
@@ -90,10 +97,23 @@ class EnsiasdSession(models.Model):
             else:
                 record.name = "Nouvelle session"
 
-    @api.depends('note_ids')
-    def _compute_note_count(self):
+    def _compute_statistics(self):
+        stats = {
+            session.id: (note_count, graded_count, missing_count, passed_count, note_sum)
+            for session, note_count, graded_count, missing_count, passed_count, note_sum
+            in self.env['ensiasd.grade.stat']._read_group(
+                [('session_id', 'in', self.ids)],
+                ['session_id'],
+                ['note_count:sum', 'graded_count:sum', 'missing_count:sum', 'passed_count:sum', 'note_sum:sum'],
+            )
+        }
         for record in self:
-            record.note_count = len(record.note_ids)
+            note_count, graded_count, missing_count, passed_count, note_sum = stats.get(record.id, (0, 0, 0, 0, 0.0))
+            record.note_count = note_count
+            record.graded_count = graded_count
+            record.missing_count = missing_count
+            record.moyenne = note_sum / graded_count if graded_count else 0.0
+            record.taux_reussite = 100.0 * passed_count / graded_count if graded_count else 0.0
 
     @api.constrains('date_debut', 'date_fin')
     def _check_dates(self):
@@ -104,6 +124,7 @@ class EnsiasdSession(models.Model):
 
     def action_open(self):
         """Ouvrir la session pour la saisie des notes"""
+        self.env['ensiasd.bareme'].seed_default_baremes(self.mapped('annee_id').ids)
         self.write({'state': 'open'})
         
     def action_start_saisie(self):
@@ -137,6 +158,16 @@ class EnsiasdSession(models.Model):
             'context': {'default_session_id': self.id},
         }
 
+    def action_view_statistics(self):
+        """Afficher les statistiques par module de cette session"""
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f'Statistiques - {self.name}',
+            'res_model': 'ensiasd.grade.stat',
+            'view_mode': 'tree,pivot,graph',
+            'domain': [('session_id', '=', self.id)],
+        }
+
     @api.model
     def get_current_session(self, semestre=None):
         """Récupérer la session en cours"""
@@ -7,7 +7,8 @@ class EnsiasdStudentExtend(models.Model):
     Extension du modèle Étudiant pour le module grades
     Ajoute les champs liés aux notes et résultats
     """
-    _inherit = 'ensiasd.student'
+    _name = 'ensiasd.student'
+    _inherit = ['ensiasd.student', 'ensiasd.report.cache.mixin']
 
     # Notes et résultats
     note_ids = fields.One2many(
@@ -55,6 +56,17 @@ class EnsiasdStudentExtend(models.Model):
         string='Crédits cumulés'
     )
 
+    def _get_report_cache_sources(self):
+        """L'étudiant, ses résultats et les notes et modules du relevé"""
+        return [
+            self,
+            self.annee_courante_id,
+            self.groupe_id,
+            self.resultat_ids,
+            self.resultat_ids.note_ids,
+            self.resultat_ids.note_ids.module_id,
+        ]
+
     @api.depends('note_ids', 'resultat_ids', 'bulletin_ids')
     def _compute_grades_stats(self):
         for record in self:
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+from .ensiasd_report_cache import REPORT_CACHE_MARKER
+
+
+class IrActionsReport(models.Model):
+    _inherit = 'ir.actions.report'
+
+    def _prepare_pdf_report_attachment_vals_list(self, report, streams):
+        """
+        Marque les PDF mis en cache (ensiasd.report.cache.mixin) et supprime
+        les versions précédentes des mêmes documents
+        """
+        vals_list = super()._prepare_pdf_report_attachment_vals_list(report, streams)
+        if not vals_list or not issubclass(self.pool[report.model], self.pool['ensiasd.report.cache.mixin']):
+            return vals_list
+
+        marker = REPORT_CACHE_MARKER + report.report_name
+        for vals in vals_list:
+            vals['description'] = marker
+
+        stale = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', report.model),
+            ('res_id', 'in', [vals['res_id'] for vals in vals_list]),
+            ('description', '=', marker),
+        ])
+        stale.unlink()
+        return vals_list
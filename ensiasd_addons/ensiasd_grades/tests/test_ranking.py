@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestRanking(TransactionCase):
+    """
+    Classement des résultats selon ensiasd_grades.ranking_method: deux
+    moyennes égales sont ex aequo pour rank et dense_rank, départagées par
+    l'id pour row_number.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.annee = cls.env['ensiasd.annee'].create({
+            'name': 'Classement 2092-2093',
+            'code': 'RANK2092',
+            'date_debut': date(2092, 9, 1),
+            'date_fin': date(2093, 7, 31),
+        })
+        cls.filiere = cls.env['ensiasd.filiere'].create({'name': 'Filière classement', 'code': 'FRANK'})
+        cls.resultats = cls.env['ensiasd.resultat']
+        for index, moyenne in enumerate((15.0, 15.0, 12.0), start=1):
+            student = cls.env['ensiasd.student'].create({
+                'name': f'Étudiant classement {index}',
+                'cne': f'RANKTEST00{index}',
+                'filiere_id': cls.filiere.id,
+                'niveau': '2',
+                'annee_inscription': cls.annee.id,
+                'annee_courante_id': cls.annee.id,
+            })
+            cls.resultats |= cls.env['ensiasd.resultat'].create({
+                'student_id': student.id,
+                'annee_id': cls.annee.id,
+                'filiere_id': cls.filiere.id,
+                'type_resultat': 'S3',
+            })
+            # Moyenne fixée directement: le classement ne lit que la colonne
+            cls.env.flush_all()
+            cls.env.cr.execute(
+                "UPDATE ensiasd_resultat SET moyenne_ponderee = %s WHERE id = %s",
+                (moyenne, cls.resultats[-1].id),
+            )
+        cls.resultats.invalidate_recordset(['moyenne_ponderee'])
+
+    def _get_ranks(self, method):
+        self.env['ir.config_parameter'].sudo().set_param('ensiasd_grades.ranking_method', method)
+        self.resultats.compute_ranking()
+        return self.resultats.mapped('rang')
+
+    def test_rank(self):
+        self.assertEqual(self._get_ranks('rank'), [1, 1, 3])
+
+    def test_dense_rank(self):
+        self.assertEqual(self._get_ranks('dense_rank'), [1, 1, 2])
+
+    def test_row_number(self):
+        self.assertEqual(self._get_ranks('row_number'), [1, 2, 3])
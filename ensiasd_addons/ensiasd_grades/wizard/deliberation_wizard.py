@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, Command
 from odoo.exceptions import UserError
 
 
@@ -63,16 +63,35 @@ class DeliberationWizard(models.TransientModel):
         domain=[('is_enseignant', '=', True)]
     )
     
-    # Statistiques prévisionnelles
+    # Statistiques prévisionnelles: stockées sur l'assistant et recalculées
+    # uniquement quand l'année, la filière ou le type changent
     nb_etudiants = fields.Integer(
         string='Étudiants concernés',
         compute='_compute_preview',
+        store=True,
         readonly=True
     )
     
     nb_notes_manquantes = fields.Integer(
         string='Notes manquantes',
         compute='_compute_preview',
+        store=True,
+        readonly=True
+    )
+    
+    nb_notes_non_validees = fields.Integer(
+        string='Notes non validées',
+        compute='_compute_preview',
+        store=True,
+        readonly=True
+    )
+    
+    preview_line_ids = fields.One2many(
+        'ensiasd.deliberation.wizard.line',
+        'wizard_id',
+        string='Aperçu par module',
+        compute='_compute_preview',
+        store=True,
         readonly=True
     )
 
@@ -86,33 +105,71 @@ class DeliberationWizard(models.TransientModel):
             if not all([record.annee_id, record.filiere_id, record.type_deliberation]):
                 record.nb_etudiants = 0
                 record.nb_notes_manquantes = 0
+                record.nb_notes_non_validees = 0
+                record.preview_line_ids = [Command.clear()]
                 continue
             
-            # Compter les inscriptions
-            domain = [
-                ('annee_id', '=', record.annee_id.id),
-                ('module_id.filiere_id', '=', record.filiere_id.id),
-                ('state', '=', 'validated'),
-            ]
-            
-            if record.type_deliberation != 'annee':
-                domain.append(('module_id.semestre', '=', record.type_deliberation))
-            
-            inscriptions = self.env['ensiasd.inscription'].search(domain)
-            students = inscriptions.mapped('student_id')
-            record.nb_etudiants = len(students)
-            
-            # Compter les notes manquantes
-            missing = 0
-            for inscription in inscriptions:
-                notes = self.env['ensiasd.note'].search([
-                    ('inscription_id', '=', inscription.id),
-                    ('state', 'in', ['validated', 'locked']),
-                ])
-                if not notes:
-                    missing += 1
-            
-            record.nb_notes_manquantes = missing
+            nb_etudiants, rows = record._get_preview_breakdown()
+            record.nb_etudiants = nb_etudiants
+            record.nb_notes_manquantes = sum(row['nb_notes_manquantes'] for row in rows)
+            record.nb_notes_non_validees = sum(row['nb_notes_non_validees'] for row in rows)
+            record.preview_line_ids = [Command.clear()] + [Command.create(row) for row in rows]
+
+    def _get_preview_breakdown(self):
+        """
+        Compte, en une seule requête, les inscriptions validées de la filière
+        (et du semestre) par module: inscriptions sans note et inscriptions
+        dont aucune note n'est validée ou verrouillée. Retourne le nombre
+        d'étudiants distincts et une liste de valeurs par module.
+        """
+        self.ensure_one()
+        for model in ('ensiasd.inscription', 'ensiasd.module', 'ensiasd.note'):
+            self.env[model].flush_model()
+
+        semestre_filter = ""
+        if self.type_deliberation != 'annee':
+            semestre_filter = "AND m.semestre = %(semestre)s"
+
+        self.env.cr.execute(f"""
+            WITH ins AS (
+                SELECT i.id, i.student_id, i.module_id,
+                       COUNT(n.id) AS note_count,
+                       COUNT(n.id) FILTER (WHERE n.state IN ('validated', 'locked')) AS validated_count
+                  FROM ensiasd_inscription i
+                  JOIN ensiasd_module m ON m.id = i.module_id
+                  LEFT JOIN ensiasd_note n ON n.inscription_id = i.id
+                 WHERE i.annee_id = %(annee_id)s
+                   AND m.filiere_id = %(filiere_id)s
+                   AND i.state = 'validated'
+                   {semestre_filter}
+                 GROUP BY i.id
+            )
+            SELECT module_id,
+                   COUNT(DISTINCT student_id),
+                   COUNT(*) FILTER (WHERE note_count = 0),
+                   COUNT(*) FILTER (WHERE note_count > 0 AND validated_count = 0)
+              FROM ins
+             GROUP BY GROUPING SETS ((module_id), ())
+        """, {
+            'annee_id': self.annee_id.id,
+            'filiere_id': self.filiere_id.id,
+            'semestre': self.type_deliberation,
+        })
+
+        nb_etudiants = 0
+        rows = []
+        for module_id, students, missing, unvalidated in self.env.cr.fetchall():
+            if module_id is None:
+                # Ligne de total (ensemble de regroupement vide)
+                nb_etudiants = students
+                continue
+            rows.append({
+                'module_id': module_id,
+                'nb_etudiants': students,
+                'nb_notes_manquantes': missing,
+                'nb_notes_non_validees': unvalidated,
+            })
+        return nb_etudiants, rows
 
     def action_create_deliberation(self):
         """Créer la délibération"""
@@ -124,6 +181,11 @@ class DeliberationWizard(models.TransientModel):
                 f"Il manque {self.nb_notes_manquantes} notes. "
                 "Veuillez compléter la saisie avant de créer la délibération."
             )
+        if self.nb_notes_non_validees > 0:
+            raise UserError(
+                f"{self.nb_notes_non_validees} notes ne sont pas encore validées. "
+                "Veuillez les valider avant de créer la délibération."
+            )
         
         # Créer la délibération
         deliberation = self.env['ensiasd.deliberation'].create({
@@ -148,6 +210,27 @@ class DeliberationWizard(models.TransientModel):
         }
 
 
+class DeliberationWizardLine(models.TransientModel):
+    """
+    Ligne de l'aperçu d'une délibération (par module)
+    """
+    _name = 'ensiasd.deliberation.wizard.line'
+    _description = 'Ligne d\'aperçu de délibération'
+    _order = 'module_id'
+
+    wizard_id = fields.Many2one(
+        'ensiasd.deliberation.wizard',
+        string='Assistant',
+        required=True,
+        ondelete='cascade'
+    )
+    
+    module_id = fields.Many2one('ensiasd.module', string='Module')
+    nb_etudiants = fields.Integer(string='Étudiants')
+    nb_notes_manquantes = fields.Integer(string='Notes manquantes')
+    nb_notes_non_validees = fields.Integer(string='Notes non validées')
+
+
 class BulletinWizard(models.TransientModel):
     """
     Assistant de génération de bulletins
@@ -193,6 +276,13 @@ class BulletinWizard(models.TransientModel):
         domain="[('annee_id', '=', annee_id)]"
     )
 
+    background = fields.Boolean(
+        string='En arrière-plan',
+        default=True,
+        help="Générer les bulletins par lots en arrière-plan (recommandé pour "
+             "les grandes promotions)"
+    )
+
     def _default_annee(self):
         config = self.env['ensiasd.config'].get_config()
         return config.annee_courante_id
@@ -231,6 +321,22 @@ class BulletinWizard(models.TransientModel):
             if not self.filiere_id:
                 raise UserError("Veuillez sélectionner une filière pour la génération en lot!")
             
+            if self.background:
+                job = self.env['ensiasd.bulletin.job'].create({
+                    'annee_id': self.annee_id.id,
+                    'filiere_id': self.filiere_id.id,
+                    'type_bulletin': self.type_bulletin,
+                })
+                job.action_start()
+                return {
+                    'type': 'ir.actions.act_window',
+                    'name': 'Génération de bulletins',
+                    'res_model': 'ensiasd.bulletin.job',
+                    'res_id': job.id,
+                    'view_mode': 'form',
+                    'target': 'current',
+                }
+            
             bulletins = self.env['ensiasd.bulletin'].generate_bulletins_batch(
                 self.annee_id.id,
                 self.type_bulletin,
@@ -1,9 +1,35 @@
 # -*- coding: utf-8 -*-
 import base64
+import csv
+import hashlib
 import io
+import json
+import zlib
+from collections import defaultdict
+from itertools import islice
+
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 
+from ..models.ensiasd_note_element import CONFLICT_LOCKED, CONFLICT_CREATED
+
+# Lignes du fichier traitées ensemble: une requête par modèle et par lot
+IMPORT_BATCH_SIZE = 1000
+
+# Classification des lignes du fichier par l'aperçu
+ROW_STATUSES = [
+    ('new', 'Nouvelle note'),
+    ('updated', 'Note modifiée'),
+    ('unchanged', 'Note inchangée'),
+    ('unknown_cne', 'CNE inconnu'),
+    ('no_inscription', 'Sans inscription'),
+    ('out_of_range', 'Hors barème'),
+    ('invalid', 'Ligne invalide'),
+]
+
+# Lignes écrites par l'import
+IMPORTABLE_STATUSES = ('new', 'updated')
+
 
 class NoteImportWizard(models.TransientModel):
     """
@@ -67,6 +93,22 @@ class NoteImportWizard(models.TransientModel):
         help="Numéro de la colonne contenant la note"
     )
     
+    # Aperçu: lignes classées, conservées compressées pour l'import
+    parsed_data = fields.Binary(string='Lignes analysées', attachment=False, readonly=True)
+    parsed_checksum = fields.Char(readonly=True)
+    
+    line_ids = fields.One2many(
+        'ensiasd.note.import.wizard.line',
+        'wizard_id',
+        string='Aperçu',
+        readonly=True
+    )
+    
+    new_count = fields.Integer(string='Nouvelles', readonly=True)
+    updated_count = fields.Integer(string='Modifiées', readonly=True)
+    unchanged_count = fields.Integer(string='Inchangées', readonly=True)
+    rejected_count = fields.Integer(string='Rejetées', readonly=True)
+    
     # Résultats
     import_count = fields.Integer(
         string='Notes importées',
@@ -90,26 +132,48 @@ class NoteImportWizard(models.TransientModel):
     ], string='État', default='draft')
 
     def action_preview(self):
-        """Aperçu des données à importer"""
+        """
+        Aperçu des données à importer (sans rien écrire)
+
+        Le fichier est lu une seule fois: chaque ligne est classée (nouvelle,
+        modifiée, inchangée ou rejetée avec sa raison) avec des recherches
+        groupées, et le résultat est conservé sur l'assistant pour l'import.
+        """
         self.ensure_one()
         
         if not self.file:
             raise UserError("Veuillez sélectionner un fichier!")
         
-        # Lire le fichier
-        file_content = base64.b64decode(self.file)
+        rows = list(self._iter_classified_rows())
+        counts = defaultdict(int)
+        for row in rows:
+            counts[row[3]] += 1
         
-        try:
-            if self.file_type == 'csv':
-                data = self._parse_csv(file_content)
-            else:
-                data = self._parse_xlsx(file_content)
-        except Exception as e:
-            raise UserError(f"Erreur lors de la lecture du fichier: {str(e)}")
+        # Remplace l'aperçu précédent
+        self.line_ids.unlink()
+        self.env['ensiasd.note.import.wizard.line'].create([{
+            'wizard_id': self.id,
+            'line_number': line_number,
+            'cne': cne,
+            'valeur': note_value,
+            'old_valeur': old_value,
+            'status': status,
+        } for line_number, cne, note_value, status, _inscription_id, old_value in rows])
         
-        # Afficher un aperçu
-        self.error_log = f"Fichier lu avec succès.\n{len(data)} lignes trouvées."
-        self.state = 'preview'
+        rejected = sum(
+            count for status, count in counts.items()
+            if status not in IMPORTABLE_STATUSES and status != 'unchanged'
+        )
+        self.write({
+            'parsed_data': base64.b64encode(zlib.compress(json.dumps(rows).encode())),
+            'parsed_checksum': self._get_parsed_checksum(),
+            'new_count': counts['new'],
+            'updated_count': counts['updated'],
+            'unchanged_count': counts['unchanged'],
+            'rejected_count': rejected,
+            'error_log': self._format_errors(rows) or f"Fichier lu avec succès.\n{len(rows)} lignes trouvées.",
+            'state': 'preview',
+        })
         
         return {
             'type': 'ir.actions.act_window',
@@ -120,84 +184,62 @@ class NoteImportWizard(models.TransientModel):
         }
 
     def action_import(self):
-        """Importer les notes"""
+        """
+        Importer les notes
+
+        Reprend les lignes classées par l'aperçu si le fichier et les
+        paramètres n'ont pas changé; sinon le fichier est lu au fil de l'eau,
+        par lots de IMPORT_BATCH_SIZE lignes. Les notes sont créées et mises
+        à jour en lot, sans suivi de messages; les notes de module sont
+        recalculées une seule fois, à la fin.
+        """
         self.ensure_one()
         
         if not self.file:
             raise UserError("Veuillez sélectionner un fichier!")
         
-        # Lire le fichier
-        file_content = base64.b64decode(self.file)
-        
-        try:
-            if self.file_type == 'csv':
-                data = self._parse_csv(file_content)
-            else:
-                data = self._parse_xlsx(file_content)
-        except Exception as e:
-            raise UserError(f"Erreur lors de la lecture du fichier: {str(e)}")
+        if self.parsed_data and self.parsed_checksum == self._get_parsed_checksum():
+            rows = json.loads(zlib.decompress(base64.b64decode(self.parsed_data)))
+        else:
+            rows = self._iter_classified_rows()
         
-        # Importer les notes
+        wizard = self.with_context(tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
         imported = 0
-        errors = []
-        
-        for i, row in enumerate(data, start=1):
-            try:
-                cne = str(row[self.column_cne - 1]).strip()
-                note_value = row[self.column_note - 1]
-                
-                # Chercher l'étudiant
-                student = self.env['ensiasd.student'].search([('cne', '=', cne)], limit=1)
-                if not student:
-                    errors.append(f"Ligne {i}: CNE '{cne}' non trouvé")
-                    continue
-                
-                # Chercher l'inscription
-                inscription = self.env['ensiasd.inscription'].search([
-                    ('student_id', '=', student.id),
-                    ('module_id', '=', self.module_id.id),
-                    ('annee_id', '=', self.session_id.annee_id.id),
-                ], limit=1)
-                
-                if not inscription:
-                    errors.append(f"Ligne {i}: Pas d'inscription pour {cne} au module {self.module_id.code}")
-                    continue
-                
-                # Convertir la note
-                try:
-                    note_value = float(str(note_value).replace(',', '.'))
-                except:
-                    errors.append(f"Ligne {i}: Note invalide '{note_value}'")
-                    continue
-                
-                # Créer ou mettre à jour la note
-                existing = self.env['ensiasd.note.element'].search([
-                    ('inscription_id', '=', inscription.id),
-                    ('type_eval', '=', self.type_eval),
-                    ('session_id', '=', self.session_id.id),
-                ], limit=1)
-                
-                if existing:
-                    existing.write({'valeur': note_value})
+        rejected = []
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, IMPORT_BATCH_SIZE))
+            if not batch:
+                break
+            values = {}
+            rows_by_inscription = {}
+            for row in batch:
+                line_number, _cne, note_value, status, inscription_id, _old_value = row
+                # Une note inchangée à l'aperçu a pu être modifiée depuis: elle
+                # est comparée à nouveau, et réécrite si besoin
+                if status in IMPORTABLE_STATUSES or status == 'unchanged':
+                    # La dernière ligne d'un même étudiant l'emporte
+                    values[inscription_id] = (line_number, note_value)
+                    rows_by_inscription[inscription_id] = row
                 else:
-                    self.env['ensiasd.note.element'].create({
-                        'inscription_id': inscription.id,
-                        'element_id': self.module_id.element_ids[0].id if self.module_id.element_ids else False,
-                        'type_eval': self.type_eval,
-                        'session_id': self.session_id.id,
-                        'valeur': note_value,
-                    })
-                
-                imported += 1
-                
-            except Exception as e:
-                errors.append(f"Ligne {i}: Erreur - {str(e)}")
+                    rejected.append(row)
+            # Les notes existantes sont recherchées à nouveau: elles ont pu
+            # changer depuis l'aperçu
+            conflicts = wizard._upsert_note_elements(values)
+            imported += len(values) - len(conflicts)
+            for inscription_id, reason in conflicts.items():
+                line_number, cne, note_value, _status, _inscription_id, old_value = rows_by_inscription[inscription_id]
+                rejected.append((line_number, cne, note_value, reason, inscription_id, old_value))
+        
+        # Recalcul des notes de module, en une fois pour tout le fichier
+        self.env.flush_all()
         
         # Mettre à jour le wizard
         self.write({
             'import_count': imported,
-            'error_count': len(errors),
-            'error_log': '\n'.join(errors) if errors else 'Import réussi sans erreur.',
+            'error_count': len(rejected),
+            'error_log': self._format_errors(rejected) or 'Import réussi sans erreur.',
+            'parsed_data': False,
             'state': 'done',
         })
         
@@ -209,36 +251,209 @@ class NoteImportWizard(models.TransientModel):
             'target': 'new',
         }
 
-    def _parse_csv(self, file_content):
-        """Parser un fichier CSV"""
-        import csv
+    def action_back(self):
+        """Revenir à la configuration (corriger le fichier puis relancer l'aperçu)"""
+        self.ensure_one()
+        self.line_ids.unlink()
+        self.write({'state': 'draft', 'parsed_data': False, 'error_log': False})
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _get_parsed_checksum(self):
+        """Empreinte du fichier et des paramètres dont dépend l'aperçu"""
+        self.ensure_one()
+        key = [
+            self.file.decode() if isinstance(self.file, bytes) else self.file,
+            self.session_id.id, self.module_id.id, self.type_eval, self.file_type,
+            self.delimiter, self.skip_header, self.column_cne, self.column_note,
+        ]
+        return hashlib.sha1(json.dumps(key).encode()).hexdigest()
+
+    def _format_errors(self, rows):
+        """Log des lignes rejetées"""
+        messages = {
+            'unknown_cne': "CNE '{cne}' non trouvé",
+            'no_inscription': f"Pas d'inscription pour {{cne}} au module {self.module_id.code}",
+            'out_of_range': "La note '{value}' est hors barème",
+            'invalid': "Note invalide ou colonnes manquantes",
+            CONFLICT_LOCKED: "Note en cours de modification par une autre saisie, non importée",
+            CONFLICT_CREATED: "Note créée entre-temps par une autre saisie, non importée",
+        }
+        return '\n'.join(
+            f"Ligne {line_number}: " + messages[status].format(cne=cne, value=note_value)
+            for line_number, cne, note_value, status, _inscription_id, _old_value in rows
+            if status in messages
+        )
+
+    def _iter_classified_rows(self):
+        """
+        Lignes du fichier classées, lot par lot:
+        (numéro, CNE, note, statut, inscription, note actuelle)
+        """
+        rows = self._iter_rows(base64.b64decode(self.file))
+        while True:
+            try:
+                batch = list(islice(rows, IMPORT_BATCH_SIZE))
+            except UserError:
+                raise
+            except Exception as e:
+                raise UserError(f"Erreur lors de la lecture du fichier: {str(e)}")
+            if not batch:
+                break
+            yield from self._classify_batch(batch)
+
+    def _classify_batch(self, batch):
+        """
+        Classe un lot de lignes (numéro de ligne, valeurs) avec une requête
+        par modèle: étudiants, inscriptions et notes existantes
+        """
+        note_max = self.env['ensiasd.config'].get_config().note_max
+        parsed = []
+        for i, row in batch:
+            try:
+                cne = str(row[self.column_cne - 1] or '').strip()
+                note_value = row[self.column_note - 1]
+            except IndexError:
+                parsed.append([i, '', None, 'invalid'])
+                continue
+            try:
+                note_value = float(str(note_value).replace(',', '.'))
+            except (TypeError, ValueError):
+                parsed.append([i, cne, None, 'invalid'])
+                continue
+            if note_value < 0 or note_value > note_max:
+                parsed.append([i, cne, note_value, 'out_of_range'])
+                continue
+            parsed.append([i, cne, note_value, None])
         
-        content = file_content.decode('utf-8-sig')
-        reader = csv.reader(io.StringIO(content), delimiter=self.delimiter)
+        cnes = list({row[1] for row in parsed if row[3] is None})
+        students = {
+            student['cne']: student['id']
+            for student in self.env['ensiasd.student'].search_read([('cne', 'in', cnes)], ['cne'])
+        } if cnes else {}
+        inscriptions = {}
+        if students:
+            for inscription in self.env['ensiasd.inscription'].search_read([
+                ('student_id', 'in', list(students.values())),
+                ('module_id', '=', self.module_id.id),
+                ('annee_id', '=', self.session_id.annee_id.id),
+            ], ['student_id'], load=None):
+                inscriptions.setdefault(inscription['student_id'], inscription['id'])
+        existing = {}
+        if inscriptions:
+            existing = {
+                element['inscription_id']: element['valeur']
+                for element in self.env['ensiasd.note.element'].search_read([
+                    ('inscription_id', 'in', list(inscriptions.values())),
+                    ('type_eval', '=', self.type_eval),
+                    ('session_id', '=', self.session_id.id),
+                ], ['inscription_id', 'valeur'], load=None)
+            }
         
-        data = list(reader)
-        if self.skip_header and data:
-            data = data[1:]
+        result = []
+        for i, cne, note_value, status in parsed:
+            inscription_id = old_value = None
+            if status is None:
+                if cne not in students:
+                    status = 'unknown_cne'
+                elif students[cne] not in inscriptions:
+                    status = 'no_inscription'
+                else:
+                    inscription_id = inscriptions[students[cne]]
+                    if inscription_id not in existing:
+                        status = 'new'
+                    else:
+                        old_value = existing[inscription_id]
+                        status = 'unchanged' if old_value == note_value else 'updated'
+            result.append((i, cne, note_value, status, inscription_id, old_value))
+        return result
+
+    def _upsert_note_elements(self, values):
+        """
+        Crée ou met à jour les notes par élément de ces inscriptions: une
+        recherche, une création en lot et une écriture par valeur distincte.
+        Les notes en cours de modification par une autre saisie ne sont pas
+        attendues (voir ensiasd.note.element._save_versioned).
+
+        Args:
+            values (dict): inscription_id -> (numéro de ligne, note)
+
+        Returns:
+            dict: inscription_id -> raison du conflit, pour les notes non écrites
+        """
+        if not values:
+            return {}
+        NoteElement = self.env['ensiasd.note.element']
+        existing = {
+            element['inscription_id']: (element['id'], element['valeur'])
+            for element in NoteElement.search_read([
+                ('inscription_id', 'in', list(values)),
+                ('type_eval', '=', self.type_eval),
+                ('session_id', '=', self.session_id.id),
+            ], ['inscription_id', 'valeur'], load=None)
+        }
+        
+        element_id = self.module_id.element_ids[:1].id
+        vals_list = []
+        updates = {}
+        inscription_by_element = {}
+        for inscription_id, (_i, note_value) in values.items():
+            if inscription_id in existing:
+                record_id, valeur = existing[inscription_id]
+                if valeur != note_value:
+                    # L'import remplace la note: pas de contrôle de version
+                    updates[record_id] = ({'valeur': note_value}, None)
+                    inscription_by_element[record_id] = inscription_id
+            else:
+                vals_list.append({
+                    'inscription_id': inscription_id,
+                    'element_id': element_id,
+                    'type_eval': self.type_eval,
+                    'session_id': self.session_id.id,
+                    'valeur': note_value,
+                })
         
-        return data
+        conflicts = {
+            inscription_by_element[record_id]: reason
+            for record_id, reason in NoteElement._save_versioned(updates).items()
+        }
+        _created, duplicates = NoteElement._create_unless_exists(vals_list)
+        conflicts.update({vals_list[index]['inscription_id']: CONFLICT_CREATED for index in duplicates})
+        return conflicts
+
+    def _iter_rows(self, file_content):
+        """Lignes du fichier (numéro, valeurs), lues au fil de l'eau"""
+        if self.file_type == 'csv':
+            rows = self._iter_csv(file_content)
+        else:
+            rows = self._iter_xlsx(file_content)
+        for i, row in enumerate(rows, start=1):
+            if self.skip_header and i == 1:
+                continue
+            if not row or not any(value not in (None, '') for value in row):
+                continue
+            yield i, row
 
-    def _parse_xlsx(self, file_content):
-        """Parser un fichier Excel"""
+    def _iter_csv(self, file_content):
+        stream = io.TextIOWrapper(io.BytesIO(file_content), encoding='utf-8-sig', newline='')
+        yield from csv.reader(stream, delimiter=self.delimiter)
+
+    def _iter_xlsx(self, file_content):
         try:
             import openpyxl
         except ImportError:
             raise UserError("Le module openpyxl n'est pas installé. Veuillez l'installer pour lire les fichiers Excel.")
         
-        workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True)
-        sheet = workbook.active
-        
-        data = []
-        for i, row in enumerate(sheet.iter_rows(values_only=True), start=1):
-            if self.skip_header and i == 1:
-                continue
-            data.append(list(row))
-        
-        return data
+        workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
 
     def action_download_template(self):
         """Télécharger un modèle de fichier"""
@@ -270,3 +485,25 @@ class NoteImportWizard(models.TransientModel):
             'url': f'/web/content/{attachment.id}?download=true',
             'target': 'self',
         }
+
+
+class NoteImportWizardLine(models.TransientModel):
+    """
+    Ligne de l'aperçu d'un import de notes
+    """
+    _name = 'ensiasd.note.import.wizard.line'
+    _description = 'Ligne d\'aperçu d\'import de notes'
+    _order = 'line_number'
+
+    wizard_id = fields.Many2one(
+        'ensiasd.note.import.wizard',
+        string='Assistant',
+        required=True,
+        ondelete='cascade'
+    )
+    
+    line_number = fields.Integer(string='Ligne')
+    cne = fields.Char(string='CNE')
+    valeur = fields.Float(string='Note', digits=(4, 2))
+    old_valeur = fields.Float(string='Note actuelle', digits=(4, 2))
+    status = fields.Selection(ROW_STATUSES, string='Statut')
@@ -2,6 +2,8 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError, ValidationError
 
+from ..models.ensiasd_note_element import CONFLICT_LOCKED, CONFLICT_MODIFIED, CONFLICT_CREATED
+
 
 class NoteSaisieWizard(models.TransientModel):
     """
@@ -87,7 +89,7 @@ class NoteSaisieWizard(models.TransientModel):
                 record.average = 0.0
 
     def action_load_students(self):
-        """Charger les étudiants inscrits au module"""
+        """Charger les étudiants inscrits au module (notes existantes en une requête)"""
         self.ensure_one()
         
         if not self.module_id or not self.session_id:
@@ -106,31 +108,35 @@ class NoteSaisieWizard(models.TransientModel):
         if not inscriptions:
             raise UserError("Aucun étudiant inscrit à ce module pour cette année!")
         
-        # Créer les lignes
-        lines = []
+        # Notes existantes de toutes les inscriptions, par inscription
+        existing_notes = {}
+        for element in self.env['ensiasd.note.element'].search_read([
+            ('inscription_id', 'in', inscriptions.ids),
+            ('type_eval', '=', self.type_eval),
+            ('session_id', '=', self.session_id.id),
+        ], ['inscription_id', 'valeur', 'is_absent', 'version'], load=None):
+            existing_notes.setdefault(element['inscription_id'], element)
+        
+        # Créer les lignes (en une fois)
+        vals_list = []
         for inscription in inscriptions:
-            # Vérifier s'il existe déjà une note
-            existing_note = self.env['ensiasd.note.element'].search([
-                ('inscription_id', '=', inscription.id),
-                ('type_eval', '=', self.type_eval),
-                ('session_id', '=', self.session_id.id),
-            ], limit=1)
-            
-            lines.append((0, 0, {
+            existing_note = existing_notes.get(inscription.id, {})
+            vals_list.append({
                 'wizard_id': self.id,
                 'inscription_id': inscription.id,
                 'student_id': inscription.student_id.id,
                 'student_cne': inscription.student_id.cne,
                 'student_name': inscription.student_id.name,
-                'note': existing_note.valeur if existing_note else 0.0,
-                'is_absent': existing_note.is_absent if existing_note else False,
-                'existing_note_id': existing_note.id if existing_note else False,
-            }))
+                'note': existing_note.get('valeur', 0.0),
+                'is_absent': existing_note.get('is_absent', False),
+                'loaded_note': existing_note.get('valeur', 0.0),
+                'loaded_is_absent': existing_note.get('is_absent', False),
+                'loaded_version': existing_note.get('version', 0),
+                'existing_note_id': existing_note.get('id', False),
+            })
+        self.env['ensiasd.note.saisie.wizard.line'].create(vals_list)
         
-        self.write({
-            'line_ids': lines,
-            'state': 'saisie',
-        })
+        self.state = 'saisie'
         
         return {
             'type': 'ir.actions.act_window',
@@ -141,31 +147,84 @@ class NoteSaisieWizard(models.TransientModel):
         }
 
     def action_save_notes(self):
-        """Enregistrer toutes les notes"""
+        """
+        Enregistrer les notes modifiées
+
+        Seules les lignes qui diffèrent des valeurs chargées sont écrites: une
+        création en lot pour les nouvelles notes et une écriture par valeur
+        distincte pour les autres, sans suivi de messages. Une note modifiée
+        entre-temps par une autre saisie (ou en cours de modification) n'est
+        pas écrasée: la ligne est signalée en conflit avec la valeur actuelle.
+        """
         self.ensure_one()
         
-        saved = 0
+        NoteElement = self.env['ensiasd.note.element'].with_context(
+            tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+        element_id = self.element_id.id or self.module_id.element_ids[:1].id
+        
+        # Notes créées par une autre saisie depuis le chargement
+        created_meanwhile = {
+            element['inscription_id']
+            for element in NoteElement.search_read([
+                ('inscription_id', 'in', self.line_ids.filtered(lambda l: not l.existing_note_id).inscription_id.ids),
+                ('type_eval', '=', self.type_eval),
+                ('session_id', '=', self.session_id.id),
+            ], ['inscription_id'], load=None)
+        }
+        
+        updates = {}
+        lines_by_element = {}
+        new_lines = []
+        vals_list = []
+        conflicts = {}
+        unchanged = 0
         for line in self.line_ids:
-            if line.note > 0 or line.is_absent:
-                if line.existing_note_id:
-                    # Mettre à jour la note existante
-                    line.existing_note_id.write({
-                        'valeur': line.note if not line.is_absent else 0.0,
-                        'is_absent': line.is_absent,
-                    })
-                else:
-                    # Créer une nouvelle note
-                    self.env['ensiasd.note.element'].create({
-                        'inscription_id': line.inscription_id.id,
-                        'element_id': self.element_id.id if self.element_id else 
-                                     (self.module_id.element_ids[0].id if self.module_id.element_ids else False),
-                        'type_eval': self.type_eval,
-                        'session_id': self.session_id.id,
-                        'valeur': line.note if not line.is_absent else 0.0,
-                        'is_absent': line.is_absent,
-                        'date_eval': self.date_eval,
-                    })
-                saved += 1
+            if not (line.note > 0 or line.is_absent):
+                continue
+            valeur = line.note if not line.is_absent else 0.0
+            if not line.existing_note_id and line.inscription_id.id in created_meanwhile:
+                conflicts[line] = CONFLICT_CREATED
+            elif line.existing_note_id:
+                if (valeur, line.is_absent) == (line.loaded_note, line.loaded_is_absent):
+                    unchanged += 1
+                    continue
+                updates[line.existing_note_id.id] = (
+                    {'valeur': valeur, 'is_absent': line.is_absent}, line.loaded_version)
+                lines_by_element[line.existing_note_id.id] = line
+            else:
+                new_lines.append(line)
+                vals_list.append({
+                    'inscription_id': line.inscription_id.id,
+                    'element_id': element_id,
+                    'type_eval': self.type_eval,
+                    'session_id': self.session_id.id,
+                    'valeur': valeur,
+                    'is_absent': line.is_absent,
+                    'date_eval': self.date_eval,
+                })
+        
+        update_conflicts = NoteElement._save_versioned(updates)
+        conflicts.update({
+            lines_by_element[element_id]: reason
+            for element_id, reason in update_conflicts.items()
+        })
+        created, duplicates = NoteElement._create_unless_exists(vals_list)
+        conflicts.update({new_lines[index]: CONFLICT_CREATED for index in duplicates})
+        
+        # Recalcul des notes de module, en une fois
+        self.env.flush_all()
+        
+        saved = len(updates) - len(update_conflicts) + len(created)
+        if conflicts:
+            self._report_conflicts(conflicts)
+            return {
+                'type': 'ir.actions.act_window',
+                'name': f'{saved} notes enregistrées, {len(conflicts)} en conflit',
+                'res_model': self._name,
+                'res_id': self.id,
+                'view_mode': 'form',
+                'target': 'new',
+            }
         
         self.state = 'done'
         
@@ -174,12 +233,44 @@ class NoteSaisieWizard(models.TransientModel):
             'tag': 'display_notification',
             'params': {
                 'title': 'Notes enregistrées',
-                'message': f'{saved} notes ont été enregistrées avec succès.',
+                'message': f'{saved} notes ont été enregistrées avec succès ({unchanged} inchangées).',
                 'type': 'success',
                 'sticky': False,
             }
         }
 
+    def _report_conflicts(self, conflicts):
+        """
+        Recharge les valeurs actuelles des lignes. Les lignes en conflit
+        affichent la raison et la note actuelle, la saisie étant conservée:
+        enregistrer à nouveau l'applique en connaissance de cause.
+        """
+        existing = {
+            element['inscription_id']: element
+            for element in self.env['ensiasd.note.element'].search_read([
+                ('inscription_id', 'in', self.line_ids.inscription_id.ids),
+                ('type_eval', '=', self.type_eval),
+                ('session_id', '=', self.session_id.id),
+            ], ['inscription_id', 'valeur', 'is_absent', 'version'], load=None)
+        }
+        messages = {
+            CONFLICT_LOCKED: "En cours de modification par une autre saisie",
+            CONFLICT_MODIFIED: "Modifiée par une autre saisie",
+            CONFLICT_CREATED: "Créée entre-temps par une autre saisie",
+        }
+        for line in self.line_ids:
+            element = existing.get(line.inscription_id.id)
+            vals = {'conflict': messages.get(conflicts.get(line), False)}
+            if element:
+                vals.update({
+                    'existing_note_id': element['id'],
+                    'loaded_note': element['valeur'],
+                    'loaded_is_absent': element['is_absent'],
+                    'loaded_version': element['version'],
+                    'current_note': element['valeur'],
+                })
+            line.write(vals)
+
     def action_back(self):
         """Retour à la configuration"""
         self.state = 'config'
@@ -244,6 +335,16 @@ class NoteSaisieWizardLine(models.TransientModel):
         'ensiasd.note.element',
         string='Note existante'
     )
+    
+    # Valeurs au chargement: seules les lignes modifiées sont enregistrées, et
+    # uniquement si la note n'a pas changé de version depuis
+    loaded_note = fields.Float(digits=(4, 2), readonly=True)
+    loaded_is_absent = fields.Boolean(readonly=True)
+    loaded_version = fields.Integer(readonly=True)
+    
+    # Conflit lors du dernier enregistrement
+    conflict = fields.Char(string='Conflit', readonly=True)
+    current_note = fields.Float(string='Note actuelle', digits=(4, 2), readonly=True)
 
     @api.constrains('note')
     def _check_note(self):